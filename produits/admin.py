@@ -4,7 +4,7 @@ from django.utils.html import format_html
 from .models import (
     Category, Brand, ProductType, Product, ProductImage,
     ProductAttribute, ProductAttributeOption, ProductAttributeValue,
-    Warehouse, Stock
+    Warehouse, Stock, StockReservation, StockReservationLine
 )
 from unfold.admin import ModelAdmin ,TabularInline
 
@@ -52,12 +52,14 @@ class ProductImageInline(TabularInline):
 class StockInline(TabularInline):
     model = Stock
     extra = 1
-    fields = ('warehouse', 'units', 'units_sold')
+    fields = ('warehouse', 'units', 'units_sold', 'units_reserved')
+    readonly_fields = ('units_reserved',)
     autocomplete_fields = ['warehouse']
 
 @admin.register(Product)
 class ProductAdmin(ModelAdmin):
-    list_display = ('name', 'category', 'brand', 'product_type', 'price', 'stock_summary', 'is_active')
+    list_display = ('name', 'category', 'brand', 'product_type', 'price', 'stock_summary', 'available_units', 'is_active')
+    list_select_related = ('category', 'brand', 'product_type', 'availability')
     list_filter = ('category', 'brand', 'product_type', 'is_active')
     search_fields = ('name', 'description')
     prepopulated_fields = {'slug': ('name',)}
@@ -67,19 +69,27 @@ class ProductAdmin(ModelAdmin):
     inlines = [ProductImageInline, ProductAttributeValueInline, StockInline]
 
     def stock_summary(self, obj):
-        stocks = obj.stock_set.all()
-        if not stocks.exists():
+        # Disponibilité dénormalisée : aucune requête par ligne
+        availability = getattr(obj, 'availability', None)
+        if availability is None or not availability.per_warehouse:
             return "-"
-        total_units = sum(stock.units for stock in stocks)
-        per_warehouse = ", ".join(f"{stock.warehouse.name}: {stock.units}" for stock in stocks)
+        per_warehouse = ", ".join(
+            f"{stock['warehouse']}: {stock['units']}" for stock in availability.per_warehouse
+        )
         return format_html(
             "<strong>{}</strong> unités<br/><small>{}</small>",
-            total_units,
+            availability.units,
             per_warehouse
         )
     stock_summary.short_description = "Stock par entrepôt"
     stock_summary.allow_tags = True
 
+    def available_units(self, obj):
+        availability = getattr(obj, 'availability', None)
+        return availability.available_units if availability else 0
+    available_units.short_description = "Disponible"
+    available_units.admin_order_field = 'availability__available_units'
+
 @admin.register(Warehouse)
 class WarehouseAdmin(ModelAdmin):
     list_display = ('name', 'location')
@@ -87,7 +97,23 @@ class WarehouseAdmin(ModelAdmin):
 
 @admin.register(Stock)
 class StockAdmin(ModelAdmin):
-    list_display = ('product', 'warehouse', 'units', 'units_sold')
+    list_display = ('product', 'warehouse', 'units', 'units_sold', 'units_reserved')
+    list_select_related = ('product', 'warehouse')
     list_filter = ('warehouse',)
     search_fields = ('product__name',)
+    readonly_fields = ('units_reserved',)
     autocomplete_fields = ['product', 'warehouse']
+
+class StockReservationLineInline(TabularInline):
+    model = StockReservationLine
+    extra = 0
+    fields = ('stock', 'quantity')
+    readonly_fields = ('stock', 'quantity')
+    can_delete = False
+
+@admin.register(StockReservation)
+class StockReservationAdmin(ModelAdmin):
+    list_display = ('id', 'user', 'status', 'created_at', 'expires_at')
+    list_filter = ('status',)
+    readonly_fields = ('user', 'status', 'created_at', 'expires_at')
+    inlines = [StockReservationLineInline]
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class ProduitsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'produits'
+
+    def ready(self):
+        from . import signals  # noqa: F401
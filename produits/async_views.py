@@ -0,0 +1,204 @@
+import asyncio
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections
+from django.http import Http404, HttpResponse, StreamingHttpResponse
+from django.views import View
+from rest_framework import exceptions
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+
+from storer.renderers import FastJSONRenderer
+from .fastpath import PRODUCT_COLUMNS, ProductListing
+from .models import Brand, Category, Product
+from .views import filter_category_tree
+
+# Lectures du catalogue en vues asynchrones (servies nativement sous ASGI).
+#
+# Vues Django asynchrones, pas DRF (dont les vues sont synchrones) : la
+# même authentification et les mêmes permissions que l'API, appliquées dans
+# un thread (cache d'identité, cf. CachedTokenAuthentication), et la même
+# représentation que ProductSerializer, BrandSerializer et CategorySerializer
+# (cf. produits.fastpath). Pendant les attentes de la base, le processus sert
+# d'autres requêtes au lieu de bloquer un thread par requête.
+#
+# Les listes sont lues par blocs (aiterator) et envoyées au fil de l'eau en
+# tableau JSON. Les trois requêtes filles d'un bloc de produits (attributs,
+# images, stocks) sont indépendantes : avec PRODUITS_ASYNC_FANOUT, elles
+# partent en même temps, chacune sur sa connexion dans un thread du pool,
+# au lieu de se suivre sur la connexion de la requête.
+
+DEFAULT_CHUNK_SIZE = 200
+MAX_CHUNK_SIZE = 2000
+
+
+def fanout_enabled():
+    return getattr(settings, 'PRODUITS_ASYNC_FANOUT', True)
+
+
+def _read(queryset):
+    try:
+        return list(queryset)
+    finally:
+        # Threads du pool : connexions rendues selon CONN_MAX_AGE, comme en fin de requête
+        close_old_connections()
+
+
+async def fetch(queryset):
+    """Lignes du queryset, lues dans un thread du pool (fan-out) ou par l'ORM asynchrone."""
+    if fanout_enabled():
+        return await sync_to_async(_read, thread_sensitive=False)(queryset)
+    return [row async for row in queryset]
+
+
+async def build_products(listing, rows):
+    """Comme ProductListing.build, requêtes filles lancées ensemble."""
+    grouped = await asyncio.gather(*(fetch(queryset) for queryset in listing.child_querysets([row[0] for row in rows])))
+    attributes, pictures, stocks = listing.group(*grouped)
+    return [listing.product(row, attributes, pictures, stocks) for row in rows]
+
+
+def lazy_rows(queryset):
+    # aiterator() sur values_list() exécuterait la requête dans la boucle
+    # d'événements (ValuesListIterable n'est pas un générateur) ; les tuples
+    # nommés sont lus paresseusement et se déballent comme des tuples
+    return queryset.values_list(*queryset._fields, named=True)
+
+
+async def product_chunks(listing, queryset, chunk_size):
+    rows = []
+    async for row in lazy_rows(queryset).aiterator(chunk_size=chunk_size):
+        rows.append(row)
+        if len(rows) == chunk_size:
+            yield await build_products(listing, rows)
+            rows = []
+    if rows:
+        yield await build_products(listing, rows)
+
+
+async def row_chunks(queryset, build, chunk_size):
+    items = []
+    async for row in lazy_rows(queryset).aiterator(chunk_size=chunk_size):
+        items.append(build(row))
+        if len(items) == chunk_size:
+            yield items
+            items = []
+    if items:
+        yield items
+
+
+async def stream_array(chunks):
+    """Tableau JSON encodé bloc par bloc (FastJSONRenderer)."""
+    renderer = FastJSONRenderer()
+    yield b'['
+    first = True
+    async for items in chunks:
+        # Sortie compacte : « [a,b] » -> « a,b »
+        body = renderer.render(items)[1:-1]
+        yield body if first else b',' + body
+        first = False
+    yield b']'
+
+
+class AsyncAPIView(View):
+    """
+    Vue asynchrone en lecture : authentification et permissions de DRF,
+    erreurs au format de l'API ({"detail": ...}).
+    """
+    http_method_names = ['get', 'head', 'options']
+    authentication_classes = api_settings.DEFAULT_AUTHENTICATION_CLASSES
+    permission_classes = api_settings.DEFAULT_PERMISSION_CLASSES
+    content_type = 'application/json'
+
+    async def dispatch(self, request, *args, **kwargs):
+        try:
+            request.user = await sync_to_async(self.check_access)(request)
+            return await super().dispatch(request, *args, **kwargs)
+        except Http404:
+            return self.error(exceptions.NotFound())
+        except exceptions.APIException as exc:
+            return self.error(exc)
+
+    def check_access(self, request):
+        """Comme APIView.check_permissions ; renvoie l'utilisateur authentifié."""
+        drf_request = Request(request, authenticators=[auth() for auth in self.authentication_classes])
+        for permission in (cls() for cls in self.permission_classes):
+            if not permission.has_permission(drf_request, self):
+                if drf_request.authenticators and not drf_request.successful_authenticator:
+                    raise exceptions.NotAuthenticated()
+                raise exceptions.PermissionDenied(getattr(permission, 'message', None))
+        return drf_request.user
+
+    def error(self, exc):
+        response = HttpResponse(
+            FastJSONRenderer().render({'detail': exc.detail} if isinstance(exc.detail, str) else exc.detail),
+            status=exc.status_code, content_type=self.content_type,
+        )
+        if isinstance(exc, (exceptions.NotAuthenticated, exceptions.AuthenticationFailed)):
+            header = self.authentication_classes[0]().authenticate_header(None) if self.authentication_classes else None
+            if header:
+                response['WWW-Authenticate'] = header
+            else:
+                response.status_code = 403
+        return response
+
+    def chunk_size(self, request):
+        try:
+            chunk_size = int(request.GET.get('chunk_size', DEFAULT_CHUNK_SIZE))
+        except ValueError:
+            raise exceptions.ValidationError({'chunk_size': "Entier attendu"})
+        return max(1, min(chunk_size, MAX_CHUNK_SIZE))
+
+    def stream(self, chunks):
+        return StreamingHttpResponse(stream_array(chunks), content_type=self.content_type)
+
+
+class AsyncProductListView(AsyncAPIView):
+    """
+    Liste complète au format ProductSerializer, par ordre de création
+    (?category_tree=, ?limit=, ?chunk_size=).
+    """
+
+    async def get(self, request):
+        queryset = filter_category_tree(
+            Product.objects.order_by('created_at', 'id').values_list(*PRODUCT_COLUMNS), request.GET
+        )
+        limit = request.GET.get('limit')
+        if limit is not None:
+            try:
+                queryset = queryset[:max(0, int(limit))]
+            except ValueError:
+                raise exceptions.ValidationError({'limit': "Entier attendu"})
+        return self.stream(product_chunks(ProductListing(request), queryset, self.chunk_size(request)))
+
+
+class AsyncProductDetailView(AsyncAPIView):
+    """Un produit au format ProductSerializer."""
+
+    async def get(self, request, pk):
+        try:
+            row = await Product.objects.values_list(*PRODUCT_COLUMNS).aget(pk=pk)
+        except Product.DoesNotExist:
+            raise Http404
+        product, = await build_products(ProductListing(request), [row])
+        return HttpResponse(FastJSONRenderer().render(product), content_type=self.content_type)
+
+
+class AsyncBrandListView(AsyncAPIView):
+    """Marques au format BrandSerializer, par nom."""
+
+    async def get(self, request):
+        listing = ProductListing(request)
+        queryset = Brand.objects.order_by('name', 'id').values_list('id', 'name', 'logo', 'logo_derivatives')
+        return self.stream(row_chunks(queryset, lambda row: listing.brand(*row), self.chunk_size(request)))
+
+
+class AsyncCategoryListView(AsyncAPIView):
+    """Catégories au format CategorySerializer, par nom."""
+
+    async def get(self, request):
+        queryset = Category.objects.order_by('name', 'id').values_list('id', 'name', 'parent_id')
+        return self.stream(row_chunks(
+            queryset, lambda row: {'id': row[0], 'name': row[1], 'parent': row[2]}, self.chunk_size(request)
+        ))
@@ -0,0 +1,64 @@
+from itertools import islice
+
+from django.db.models import Sum
+
+from .models import Product, ProductAvailability, Stock
+
+# Table de disponibilité dénormalisée : une ligne par produit, avec les totaux
+# et le détail par entrepôt. Recalculée par lots depuis Stock, en une requête
+# d'agrégation et un upsert, chaque fois que products_changed signale une
+# écriture sur les stocks (save(), update() des réservations, imports).
+
+REFRESH_CHUNK = 500
+FIELDS = ('units', 'units_sold', 'units_reserved')
+
+
+def refresh_availability(product_ids):
+    product_ids = list(product_ids)
+    for start in range(0, len(product_ids), REFRESH_CHUNK):
+        _refresh(product_ids[start:start + REFRESH_CHUNK])
+
+
+def _refresh(product_ids):
+    rows = {
+        pk: ProductAvailability(product_id=pk, per_warehouse=[])
+        for pk in Product.objects.filter(pk__in=product_ids).values_list('id', flat=True)
+    }
+    deleted = set(product_ids) - rows.keys()
+    if deleted:
+        # Pendant la suppression en cascade d'un produit, la suppression de ses
+        # stocks recrée la ligne après celle du CASCADE : on la retire ici
+        # (post_delete du produit)
+        ProductAvailability.objects.filter(product_id__in=deleted).delete()
+    if not rows:
+        return
+    stocks = (
+        Stock.objects.filter(product_id__in=rows)
+        .values('product_id', 'warehouse_id', 'warehouse__name')
+        .annotate(**{field: Sum(field) for field in FIELDS})
+        .order_by('product_id', 'warehouse__name', 'warehouse_id')
+    )
+    for stock in stocks:
+        row = rows[stock['product_id']]
+        for field in FIELDS:
+            setattr(row, field, getattr(row, field) + stock[field])
+        row.per_warehouse.append({
+            'warehouse_id': stock['warehouse_id'],
+            'warehouse': stock['warehouse__name'],
+            **{field: stock[field] for field in FIELDS},
+        })
+    for row in rows.values():
+        row.available_units = max(row.units - row.units_reserved, 0)
+    ProductAvailability.objects.bulk_create(
+        rows.values(), update_conflicts=True, unique_fields=['product'],
+        update_fields=[*FIELDS, 'available_units', 'per_warehouse', 'updated_at'],
+    )
+
+
+def rebuild_availability():
+    ids = Product.objects.values_list('id', flat=True).iterator(chunk_size=REFRESH_CHUNK)
+    total = 0
+    while chunk := list(islice(ids, REFRESH_CHUNK)):
+        _refresh(chunk)
+        total += len(chunk)
+    return total
@@ -0,0 +1,537 @@
+import asyncio
+import itertools
+import os
+import random
+import statistics
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from decimal import Decimal
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import CommandError
+from django.db import connection, connections, transaction
+from django.db.backends.signals import connection_created
+from django.urls import reverse
+from rest_framework.authtoken.models import Token
+
+from storer.metrics import percentile
+
+from . import availability
+from .models import (
+    Category, Brand, ProductType, Product,
+    ProductAttribute, ProductAttributeOption, ProductAttributeValue,
+    ProductImage, Stock, Warehouse
+)
+from .signals import notify_products_changed
+
+# Jeu de données synthétique et mesures pour le banc d'essai de l'API
+# (cf. commandes benchmark_api et benchmark_async).
+#
+# Le catalogue est semé par blocs en bulk_create, de façon déterministe
+# (graine fixe) et incrémentale : semer 10 000 produits dans une base qui en
+# contient déjà 1 000 n'ajoute que les 9 000 manquants. Les mesures passent
+# par le client de test Django, donc par toute la pile (middlewares,
+# authentification, permissions, rendu JSON).
+
+SEED_PREFIX = 'bench'
+SEED_CHUNK = 2000
+BRANDS = 40
+WAREHOUSES = ('Ouagadougou', 'Bobo-Dioulasso', 'Koudougou', 'Banfora', 'Ouahigouya')
+CATEGORY_TREE = {
+    'Informatique': ('Ordinateurs portables', 'Ordinateurs de bureau', 'Écrans', 'Stockage'),
+    'Téléphonie': ('Smartphones', 'Accessoires', 'Tablettes'),
+    'Électroménager': ('Cuisine', 'Froid', 'Lavage'),
+    'Image et son': ('Téléviseurs', 'Audio', 'Photo'),
+}
+PRODUCT_TYPES = {
+    'Ordinateur': {'RAM': ('4 Go', '8 Go', '16 Go', '32 Go'), 'Stockage': ('256 Go', '512 Go', '1 To'),
+                   'Couleur': ('Noir', 'Gris', 'Argent')},
+    'Téléphone': {'Mémoire': ('64 Go', '128 Go', '256 Go'), 'Couleur': ('Noir', 'Bleu', 'Blanc', 'Rouge'),
+                  'Écran': ('6,1"', '6,5"', '6,7"')},
+    'Appareil': {'Puissance': ('800 W', '1200 W', '2000 W'), 'Classe énergie': ('A', 'B', 'C'),
+                 'Couleur': ('Blanc', 'Inox', 'Noir')},
+}
+WORDS = (
+    'Pro', 'Max', 'Plus', 'Ultra', 'Lite', 'Air', 'Neo', 'Prime', 'Edge', 'Nova',
+    'Smart', 'Turbo', 'Solaire', 'Savane', 'Baobab', 'Harmattan', 'Sahel', 'Faso',
+)
+SEARCH_TERMS = ('pro', 'ultra', 'savane', 'smart', 'faso')
+
+
+def _reference_data():
+    """Catégories, marques, types, options et entrepôts (créés une fois)."""
+    categories = []
+    for parent_name, children in CATEGORY_TREE.items():
+        parent, _ = Category.objects.get_or_create(name=parent_name, parent=None)
+        categories.extend(Category.objects.get_or_create(name=name, parent=parent)[0] for name in children)
+    brands = [Brand.objects.get_or_create(name=f'{SEED_PREFIX.title()} {i:02d}')[0] for i in range(BRANDS)]
+    types = {}
+    for type_name, attributes in PRODUCT_TYPES.items():
+        product_type, _ = ProductType.objects.get_or_create(name=type_name)
+        options = []
+        for attribute_name, values in attributes.items():
+            attribute, _ = ProductAttribute.objects.get_or_create(name=attribute_name, product_type=product_type)
+            options.append([
+                ProductAttributeOption.objects.get_or_create(attribute=attribute, value=value)[0].pk
+                for value in values
+            ])
+        types[product_type.pk] = options
+    warehouses = [Warehouse.objects.get_or_create(name=name)[0].pk for name in WAREHOUSES]
+    return [c.pk for c in categories], [b.pk for b in brands], types, warehouses
+
+
+def seeded_count():
+    return Product.objects.filter(slug__startswith=f'{SEED_PREFIX}-').count()
+
+
+def seed_catalogue(total, seed=0, log=None):
+    """
+    Complète le catalogue synthétique jusqu'à total produits (chacun avec
+    3 attributs, 1 à 4 images et 1 à 5 stocks). Renvoie le nombre ajouté.
+    """
+    log = log or (lambda message: None)
+    start = seeded_count()
+    if start >= total:
+        return 0
+    categories, brands, types, warehouses = _reference_data()
+    type_ids = sorted(types)
+
+    for offset in range(start, total, SEED_CHUNK):
+        end = min(offset + SEED_CHUNK, total)
+        # Une graine par bloc : le contenu ne dépend pas du découpage des exécutions
+        rng = random.Random(f'{seed}-{offset}')
+        with transaction.atomic():
+            products = []
+            for i in range(offset, end):
+                name = f"{rng.choice(WORDS)} {rng.choice(WORDS)} {i}"
+                products.append(Product(
+                    name=name, slug=f'{SEED_PREFIX}-{i}',
+                    category_id=rng.choice(categories), brand_id=rng.choice(brands),
+                    product_type_id=rng.choice(type_ids),
+                    description=f"{name} : produit de démonstration {' '.join(rng.sample(WORDS, 6))}.",
+                    price=Decimal(rng.randint(1000, 2_000_000)) / 100,
+                    is_active=rng.random() > 0.05,
+                ))
+            Product.objects.bulk_create(products, batch_size=500)
+            if products[0].pk is None:
+                # Base sans RETURNING : relecture des clés
+                ids = list(Product.objects.filter(slug__in=[p.slug for p in products]).values_list('id', 'product_type_id'))
+            else:
+                ids = [(p.pk, p.product_type_id) for p in products]
+
+            values, pictures, stocks = [], [], []
+            for pk, type_id in ids:
+                for option_ids in types[type_id]:
+                    values.append(ProductAttributeValue(product_id=pk, option_id=rng.choice(option_ids)))
+                for j in range(rng.randint(1, 4)):
+                    pictures.append(ProductImage(
+                        product_id=pk, image=f'product_images/{SEED_PREFIX}/{pk}_{j}.jpg',
+                        is_feature=j == 0, alt_text=f'Photo {j + 1}',
+                    ))
+                for warehouse_id in rng.sample(warehouses, rng.randint(1, len(warehouses))):
+                    units = rng.randint(0, 200)
+                    stocks.append(Stock(
+                        product_id=pk, warehouse_id=warehouse_id, units=units, units_sold=rng.randint(0, units),
+                    ))
+            ProductAttributeValue.objects.bulk_create(values, batch_size=1000)
+            ProductImage.objects.bulk_create(pictures, batch_size=1000)
+            Stock.objects.bulk_create(stocks, batch_size=1000)
+
+            # bulk_create ne déclenche pas products_changed : disponibilité,
+            # index de recherche, cache des réponses et index à facettes
+            notify_products_changed([pk for pk, _ in ids])
+        log(f"{end}/{total} produits")
+
+    return total - start
+
+
+def seed_users(total):
+    """Complète les comptes synthétiques jusqu'à total (mot de passe commun)."""
+    from utilisateurs.models import User
+
+    existing = User.objects.filter(email__endswith=f'@{SEED_PREFIX}.local').count()
+    if existing >= total:
+        return 0
+    password = make_password(None)
+    User.objects.bulk_create([
+        User(email=f'client{i}@{SEED_PREFIX}.local', first_name='Client', last_name=str(i), password=password)
+        for i in range(existing, total)
+    ], batch_size=1000)
+    return total - existing
+
+
+def use_sqlite_file(path):
+    """Repointe la connexion par défaut sur le fichier SQLite path."""
+    if connection.vendor != 'sqlite':
+        raise CommandError("Base dédiée : SQLite seulement (sinon --use-default-database)")
+    # Comme la création des bases de test
+    connection.close()
+    connection.settings_dict['NAME'] = os.path.abspath(path)
+
+
+def benchmark_token():
+    """Jeton d'un compte ayant tous les codes de permission."""
+    from utilisateurs.models import Permission, Role, RolePermission, User, UserRole
+    from utilisateurs.permissions import PERMISSION_CODES
+
+    user, created = User.objects.get_or_create(
+        email=f'benchmark@{SEED_PREFIX}.local',
+        defaults={'first_name': 'Banc', 'last_name': "d'essai"},
+    )
+    if created:
+        user.set_unusable_password()
+        user.save()
+    role, _ = Role.objects.get_or_create(name='benchmark')
+    UserRole.objects.get_or_create(user=user, role=role)
+    for code, description in PERMISSION_CODES.items():
+        permission, _ = Permission.objects.get_or_create(code=code, defaults={'description': description})
+        RolePermission.objects.get_or_create(role=role, permission=permission)
+    return Token.objects.get_or_create(user=user)[0].key
+
+
+# --- Mesures ----------------------------------------------------------------
+
+def measure(client, url_for, requests=50, warmup=5, **headers):
+    """
+    Appelle requests fois url_for(i) avec le client (après warmup appels non
+    mesurés) ; renvoie latences (ms), débit et requêtes SQL d'un appel.
+    """
+    for i in range(warmup):
+        client.get(url_for(i), **headers)
+    # Requêtes comptées sur un appel à part, non chronométré
+    queries = []
+
+    def count(execute, sql, params, many, context):
+        queries.append(sql)
+        return execute(sql, params, many, context)
+
+    with connection.execute_wrapper(count):
+        response = client.get(url_for(0), **headers)
+    body = b''.join(response.streaming_content) if response.streaming else response.content
+
+    timings = []
+    started = time.perf_counter()
+    for i in range(requests):
+        t0 = time.perf_counter()
+        client.get(url_for(i), **headers)
+        timings.append((time.perf_counter() - t0) * 1000)
+    elapsed = time.perf_counter() - started
+    timings.sort()
+    return {
+        'url': url_for(0),
+        'status': response.status_code,
+        'queries': len(queries),
+        'bytes': len(body),
+        'requests': requests,
+        'mean_ms': round(statistics.fmean(timings), 3),
+        **{f'p{int(q * 100)}_ms': round(percentile(timings, q), 3) for q in (0.5, 0.9, 0.95, 0.99)},
+        'min_ms': round(timings[0], 3),
+        'max_ms': round(timings[-1], 3),
+        'throughput_rps': round(requests / elapsed, 2) if elapsed else None,
+    }
+
+
+def endpoints(sample_size=20):
+    """{nom: url_for(i)} des principaux endpoints de produits.urls et utilisateurs.urls."""
+    products = list(
+        Product.objects.filter(slug__startswith=f'{SEED_PREFIX}-').order_by('id').values_list('id', flat=True)[:sample_size]
+    ) or list(Product.objects.order_by('id').values_list('id', flat=True)[:sample_size])
+    root = Category.objects.filter(parent=None, name__in=CATEGORY_TREE).order_by('id').values_list('id', flat=True).first()
+    brand = Brand.objects.filter(name__startswith=SEED_PREFIX.title()).order_by('id').values_list('id', flat=True).first()
+
+    def fixed(url):
+        return lambda i: url
+
+    def cycling(name, params=''):
+        return lambda i: reverse(name, args=[products[i % len(products)]]) + params
+
+    return {
+        'products-page': fixed(reverse('product-list-create') + '?page_size=50'),
+        'products-page-sparse': fixed(
+            reverse('product-list-create') + '?page_size=50&fields=id,name,price,images&expand=images'
+        ),
+        'products-category-page': fixed(reverse('product-list-create') + f'?page_size=50&category_tree={root}'),
+        'products-listing-page': fixed(reverse('product-listing') + '?page_size=50'),
+        'product-detail': cycling('product-detail'),
+        'product-facets': fixed(reverse('product-facets') + f'?limit=20&brand={brand}'),
+        'product-search': lambda i: reverse('product-search') + f'?q={SEARCH_TERMS[i % len(SEARCH_TERMS)]}',
+        'category-tree': fixed(reverse('category-tree')),
+        'brands': fixed(reverse('brand-list-create')),
+        'warehouses': fixed(reverse('warehouse-list-create')),
+        'stocks-page': fixed(reverse('stock-list-create') + '?page_size=50'),
+        'attribute-values-page': fixed(reverse('product-attribute-value-list-create') + '?page_size=50'),
+        'user-profile': fixed(reverse('user_profile')),
+        'users-page': fixed(reverse('user-list') + '?page_size=50'),
+        'roles': fixed(reverse('role-list')),
+    }
+
+
+def compare(previous, current, threshold=0.2):
+    """
+    Lignes (taille, endpoint, métrique, avant, après, écart) des régressions
+    de plus de threshold sur p50/p95, et de toute hausse du nombre de requêtes.
+    """
+    regressions = []
+    for size, run in current.get('sizes', {}).items():
+        before = previous.get('sizes', {}).get(size, {}).get('endpoints', {})
+        for name, stats in run.get('endpoints', {}).items():
+            old = before.get(name)
+            if old is None:
+                continue
+            for metric in ('p50_ms', 'p95_ms'):
+                if old.get(metric) and stats[metric] > old[metric] * (1 + threshold):
+                    regressions.append((size, name, metric, old[metric], stats[metric], stats[metric] / old[metric] - 1))
+            if stats['queries'] > old.get('queries', stats['queries']):
+                regressions.append((size, name, 'queries', old['queries'], stats['queries'], None))
+    return regressions
+
+
+# --- Concurrence ------------------------------------------------------------
+
+def _worker(operation, deadline, samples, errors, seed):
+    from django.db import OperationalError
+
+    rng = random.Random(seed)
+    try:
+        while time.monotonic() < deadline:
+            t0 = time.perf_counter()
+            try:
+                operation(rng)
+            except OperationalError:
+                # « database is locked » : verrou non obtenu dans le délai
+                errors.append(1)
+                continue
+            samples.append((time.perf_counter() - t0) * 1000)
+    finally:
+        connections.close_all()
+
+
+def concurrency(readers, writers, duration, sample_size=20):
+    """
+    readers et writers threads pendant duration secondes sur le catalogue
+    en place : lectures de listes (lecture rapide, sample_size produits),
+    écritures de stock avec recalcul de la disponibilité. Renvoie débit,
+    latences et erreurs par type d'opération.
+    """
+    from django.db.models import F
+
+    from .fastpath import ProductListing
+
+    product_ids = list(Product.objects.values_list('id', flat=True))
+    stocks = list(Stock.objects.values_list('id', 'product_id'))
+    if not product_ids or not stocks:
+        raise CommandError("Catalogue vide")
+
+    def read(rng):
+        ProductListing().build_for_ids(rng.sample(product_ids, min(sample_size, len(product_ids))))
+
+    def write(rng):
+        stock_id, product_id = rng.choice(stocks)
+        with transaction.atomic():
+            Stock.objects.filter(pk=stock_id).update(units=F('units') + 1)
+            availability.refresh_availability([product_id])
+
+    connection.close()
+    results = {}
+    deadline = time.monotonic() + duration
+    threads = []
+    for kind, operation, count in (('reads', read, readers), ('writes', write, writers)):
+        samples, errors = [], []
+        results[kind] = (samples, errors, count)
+        threads.extend(
+            threading.Thread(target=_worker, args=(operation, deadline, samples, errors, f'{kind}-{i}'))
+            for i in range(count)
+        )
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    report = {}
+    for kind, (samples, errors, count) in results.items():
+        if not count:
+            continue
+        samples.sort()
+        report[kind] = {
+            'threads': count,
+            'operations': len(samples),
+            'errors': len(errors),
+            'ops_per_second': round(len(samples) / duration, 1),
+            **{f'p{int(q * 100)}_ms': round(percentile(samples, q), 3) if samples else None for q in (0.5, 0.95, 0.99)},
+        }
+    return report
+
+
+# --- ASGI : vues synchrones et asynchrones ----------------------------------
+
+def async_endpoints(sample_size=20):
+    """
+    {nom: (url_for synchrone, url_for asynchrone)} : mêmes données, par les
+    vues DRF et par produits.async_views (le détail synchrone sérialise
+    ProductDetailSerializer).
+    """
+    products = list(Product.objects.order_by('id').values_list('id', flat=True)[:sample_size])
+
+    def fixed(url):
+        return lambda i: url
+
+    def cycling(name):
+        return lambda i: reverse(name, args=[products[i % len(products)]])
+
+    return {
+        'products-50': (
+            fixed(reverse('product-listing') + '?page_size=50'), fixed(reverse('async-product-list') + '?limit=50'),
+        ),
+        'product-detail': (cycling('product-detail'), cycling('async-product-detail')),
+        'brands': (fixed(reverse('brand-list-create')), fixed(reverse('async-brand-list'))),
+        'categories': (fixed(reverse('category-list-create')), fixed(reverse('async-category-list'))),
+    }
+
+
+@contextmanager
+def execute_wrapper(wrapper):
+    """wrapper posé sur les connexions de tous les threads, ouvertes ou à venir."""
+    def install(sender, connection, **kwargs):
+        if wrapper not in connection.execute_wrappers:
+            connection.execute_wrappers.append(wrapper)
+
+    uid = f'produits.benchmark.{id(wrapper)}'
+    connection_created.connect(install, weak=False, dispatch_uid=uid)
+    for conn in connections.all(initialized_only=True):
+        install(None, conn)
+    try:
+        yield
+    finally:
+        connection_created.disconnect(dispatch_uid=uid)
+        for conn in connections.all(initialized_only=True):
+            if wrapper in conn.execute_wrappers:
+                conn.execute_wrappers.remove(wrapper)
+
+
+@contextmanager
+def database_latency(milliseconds):
+    """
+    Ajoute milliseconds d'attente à chaque requête SQL, dans tous les
+    threads : simule l'aller-retour réseau d'une base distante (SQLite locale
+    répond sans attente, ce qui masquerait l'intérêt du parallélisme).
+    """
+    if not milliseconds:
+        yield
+        return
+    delay = milliseconds / 1000
+
+    def wait(execute, sql, params, many, context):
+        time.sleep(delay)
+        return execute(sql, params, many, context)
+
+    with execute_wrapper(wait):
+        yield
+
+
+async def load(url_for, requests, concurrency, headers=None, threads=0, mode='sync'):
+    """
+    requests appels à url_for(i) par le client asynchrone, concurrency à la
+    fois, avec threads threads au plus (0 : sans limite) :
+
+    - mode 'sync' : chaque appel dans son propre contexte de threads, comme
+      sous ASGIHandler (une vue synchrone y occupe un thread jusqu'à sa
+      réponse) ; threads borne les appels en cours, comme un worker WSGI à
+      threads threads, et l'attente d'un thread compte dans la latence ;
+    - mode 'async' : les appels ne sont pas bornés ; leur code synchrone
+      (authentification, lectures de l'ORM asynchrone) se partage un thread
+      et les requêtes filles (fan-out) le pool par défaut, de threads - 1
+      threads.
+
+    À appeler dans une boucle dédiée (asyncio.run) : le mode 'async' en
+    remplace le pool par défaut. Renvoie latences, débit, statuts, appels
+    simultanés et threads en base au même moment, au plus fort.
+    """
+    from asgiref.sync import ThreadSensitiveContext
+    from django.test import AsyncClient
+
+    if mode not in ('sync', 'async'):
+        raise ValueError(f"Mode inconnu : {mode}")
+    if mode == 'async' and threads:
+        asyncio.get_running_loop().set_default_executor(
+            ThreadPoolExecutor(max(1, threads - 1), thread_name_prefix='benchmark')
+        )
+    indexes = itertools.count()
+    slots = asyncio.Semaphore(threads) if threads and mode == 'sync' else None
+    timings, statuses = [], Counter()
+    peak = {'in_flight': 0, 'threads': 0}
+    in_flight = 0
+    # Threads dont une requête SQL est en cours (ceux qu'asgiref crée et
+    # ferme autour des appels ne sont pas comptés)
+    busy, busy_lock = Counter(), threading.Lock()
+
+    def count_threads(execute, sql, params, many, context):
+        thread = threading.get_ident()
+        with busy_lock:
+            busy[thread] += 1
+            peak['threads'] = max(peak['threads'], len(busy))
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            with busy_lock:
+                busy[thread] -= 1
+                if not busy[thread]:
+                    del busy[thread]
+
+    async def get(client, i):
+        response = await client.get(url_for(i), headers=headers or {})
+        # Les listes asynchrones lisent la base pendant le flux
+        if response.streaming and response.is_async:
+            async for _ in response.streaming_content:
+                pass
+        elif response.streaming:
+            for _ in response.streaming_content:
+                pass
+        return response
+
+    async def call(client, i):
+        nonlocal in_flight
+        in_flight += 1
+        peak['in_flight'] = max(peak['in_flight'], in_flight)
+        try:
+            if mode == 'sync':
+                async with ThreadSensitiveContext():
+                    response = await get(client, i)
+            else:
+                response = await get(client, i)
+            return response.status_code
+        finally:
+            in_flight -= 1
+
+    async def worker():
+        client = AsyncClient()
+        while (i := next(indexes)) < requests:
+            t0 = time.perf_counter()
+            if slots is None:
+                status = await call(client, i)
+            else:
+                async with slots:
+                    status = await call(client, i)
+            timings.append((time.perf_counter() - t0) * 1000)
+            statuses[status] += 1
+
+    started = time.perf_counter()
+    with execute_wrapper(count_threads):
+        await asyncio.gather(*(worker() for _ in range(max(1, min(concurrency, requests)))))
+    elapsed = time.perf_counter() - started
+    timings.sort()
+    return {
+        'url': url_for(0),
+        'status': statuses.most_common(1)[0][0],
+        'errors': sum(count for status, count in statuses.items() if status >= 400),
+        'requests': requests,
+        'concurrency': concurrency,
+        'threads': threads or None,
+        'mean_ms': round(statistics.fmean(timings), 3),
+        **{f'p{int(q * 100)}_ms': round(percentile(timings, q), 3) for q in (0.5, 0.95, 0.99)},
+        'throughput_rps': round(requests / elapsed, 2) if elapsed else None,
+        'peak_in_flight': peak['in_flight'],
+        'peak_threads': peak['threads'],
+    }
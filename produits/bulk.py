@@ -0,0 +1,204 @@
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from django.utils.text import slugify
+from rest_framework import serializers
+from rest_framework.validators import UniqueTogetherValidator, UniqueValidator
+
+from .serializers import (
+    PrefetchedPrimaryKeyRelatedField, ProductAttributeValueWriteSerializer,
+    ProductCreateUpdateSerializer, StockWriteSerializer,
+)
+from .signals import notify_products_changed
+
+# Écritures en masse (synchronisation back-office).
+#
+# Un lot est une liste d'éléments : avec « id », mise à jour partielle de la
+# ligne existante, sans « id », création. Tout le lot est validé en une passe
+# avec les serializers d'écriture habituels, mais les relations sont lues dans
+# des dictionnaires préchargés (une requête par relation, cf.
+# PrefetchedPrimaryKeyRelatedField) et l'unicité est contrôlée en une requête
+# par champ. Si un élément est invalide, rien n'est écrit ; sinon le lot est
+# écrit en un bulk_create et un bulk_update dans une seule transaction.
+
+DEFAULT_MAX_ITEMS = 1000
+
+CREATED = 'created'
+UPDATED = 'updated'
+VALID = 'valid'
+ERROR = 'error'
+
+
+def get_max_items():
+    return getattr(settings, 'PRODUITS_BULK_MAX_ITEMS', DEFAULT_MAX_ITEMS)
+
+
+def _coerce_pk(value):
+    if isinstance(value, bool):
+        return None
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+class BulkWriter:
+    serializer_class = None
+    unique_fields = ()
+
+    def __init__(self, context=None):
+        self.context = dict(context or {})
+        self.model = self.serializer_class.Meta.model
+
+    # --- Points d'extension -------------------------------------------------
+
+    def prepare(self, obj, created):
+        """Complète l'objet avant écriture (ce que save() aurait fait)."""
+
+    def get_update_fields(self, fields):
+        """Colonnes réécrites par bulk_update (fields : champs reçus)."""
+        return fields
+
+    def changed_product_ids(self, objs):
+        return {obj.product_id for obj in objs}
+
+    # --- Validation ---------------------------------------------------------
+
+    def get_serializer(self, partial):
+        serializer = self.serializer_class(context=self.context, partial=partial)
+        # Contrôlée pour tout le lot dans check_unique
+        for field in serializer.fields.values():
+            field.validators = [v for v in field.validators if not isinstance(v, UniqueValidator)]
+        serializer.validators = [v for v in serializer.validators if not isinstance(v, UniqueTogetherValidator)]
+        return serializer
+
+    def prefetch(self, items):
+        """Une requête par relation pour toutes les clés citées dans le lot."""
+        prefetched = {}
+        for name, field in self.serializer_class().fields.items():
+            if field.read_only or not isinstance(field, PrefetchedPrimaryKeyRelatedField):
+                continue
+            pks = {_coerce_pk(item.get(name)) for item in items} - {None}
+            prefetched[name] = field.get_queryset().in_bulk(pks)
+        return prefetched
+
+    def validate(self, items):
+        """Renvoie [(instance ou None, validated_data ou None, erreurs ou None)]."""
+        ids = [_coerce_pk(item.get('id')) for item in items]
+        existing = self.model.objects.in_bulk({pk for pk in ids if pk is not None})
+        self.context['prefetched'] = self.prefetch(items)
+        creating, updating = self.get_serializer(partial=False), self.get_serializer(partial=True)
+
+        rows, seen = [], set()
+        for item, pk in zip(items, ids):
+            if 'id' in item and item['id'] is not None:
+                if pk not in existing:
+                    rows.append((None, None, {'id': [f"Objet {item['id']!r} introuvable."]}))
+                    continue
+                if pk in seen:
+                    rows.append((None, None, {'id': ["Objet présent deux fois dans le lot."]}))
+                    continue
+                seen.add(pk)
+            instance = existing.get(pk) if 'id' in item else None
+            serializer = updating if instance is not None else creating
+            try:
+                rows.append((instance, serializer.run_validation(item), None))
+            except serializers.ValidationError as exc:
+                rows.append((instance, None, exc.detail))
+        return rows
+
+    def check_unique(self, objs):
+        """Unicité des unique_fields : doublons dans le lot puis en base, une requête par champ."""
+        errors = {}
+        for name in self.unique_fields:
+            owners = {}
+            for index, obj in objs.items():
+                value = getattr(obj, name)
+                if value in owners:
+                    errors.setdefault(index, {})[name] = ["Valeur présente deux fois dans le lot."]
+                else:
+                    owners[value] = index
+            taken = self.model.objects.filter(**{f'{name}__in': list(owners)}).values_list(name, 'pk')
+            for value, pk in taken:
+                index = owners[value]
+                if objs[index].pk != pk:
+                    errors.setdefault(index, {})[name] = [f"La valeur {value!r} est déjà utilisée."]
+        return errors
+
+    # --- Écriture -----------------------------------------------------------
+
+    def run(self, items):
+        """
+        Valide puis écrit le lot ; renvoie (écrit, résultats par élément).
+        Rien n'est écrit dès qu'un élément est invalide.
+        """
+        rows = self.validate(items)
+        objs, update_fields, product_ids = {}, set(), set()
+        for index, (instance, data, errors) in enumerate(rows):
+            if errors is not None:
+                continue
+            if instance is not None:
+                # Produit d'origine, si la ligne change de produit
+                product_ids.update(self.changed_product_ids([instance]))
+            obj = instance if instance is not None else self.model()
+            for name, value in data.items():
+                setattr(obj, name, value)
+            if instance is not None:
+                update_fields.update(data)
+            self.prepare(obj, created=instance is None)
+            objs[index] = obj
+        errors = {index: row[2] for index, row in enumerate(rows) if row[2] is not None}
+        for index, unique_errors in self.check_unique(objs).items():
+            errors[index] = {**errors.get(index, {}), **unique_errors}
+
+        if errors:
+            return False, [
+                {'index': index, 'status': ERROR, 'errors': errors[index]} if index in errors
+                else {'index': index, 'status': VALID}
+                for index in range(len(items))
+            ]
+
+        created = [obj for index, obj in objs.items() if rows[index][0] is None]
+        updated = [obj for index, obj in objs.items() if rows[index][0] is not None]
+        with transaction.atomic():
+            self.model.objects.bulk_create(created, batch_size=500)
+            if updated and update_fields:
+                self.model.objects.bulk_update(updated, sorted(self.get_update_fields(update_fields)), batch_size=500)
+        notify_products_changed(product_ids | self.changed_product_ids(objs.values()), self.model)
+
+        serializer = self.serializer_class(context=self.context)
+        return True, [
+            {
+                'index': index,
+                'status': CREATED if rows[index][0] is None else UPDATED,
+                'id': obj.pk,
+                'data': serializer.to_representation(obj),
+            }
+            for index, obj in objs.items()
+        ]
+
+
+class ProductBulkWriter(BulkWriter):
+    serializer_class = ProductCreateUpdateSerializer
+    unique_fields = ('slug',)
+
+    def prepare(self, obj, created):
+        # bulk_create / bulk_update ne passent ni par Product.save() ni par auto_now
+        if not obj.slug:
+            obj.slug = slugify(obj.name)
+        obj.updated_at = timezone.now()
+
+    def get_update_fields(self, fields):
+        return set(fields) | {'slug', 'updated_at'}
+
+    def changed_product_ids(self, objs):
+        return {obj.pk for obj in objs}
+
+
+class ProductAttributeValueBulkWriter(BulkWriter):
+    serializer_class = ProductAttributeValueWriteSerializer
+
+
+class StockBulkWriter(BulkWriter):
+    serializer_class = StockWriteSerializer
+
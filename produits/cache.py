@@ -0,0 +1,115 @@
+import hashlib
+import json
+import uuid
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.http import parse_etags, quote_etag
+from rest_framework import status
+from rest_framework.response import Response
+from rest_framework.utils.encoders import JSONEncoder
+
+from storer.routers import use_primary
+
+# Cache des réponses de lecture du catalogue.
+#
+# Chaque réponse est stockée sous une clé qui contient le « jeton de version »
+# de ses portées : 'list' pour les listes, 'product:<id>' pour un produit.
+# Invalider revient à remplacer le jeton : les anciennes entrées ne sont plus
+# jamais lues et expirent d'elles-mêmes.
+
+LIST_SCOPE = 'list'
+# Index à facettes (cf. produits.facets), hors cache des réponses
+FACETS_SCOPE = 'facets'
+
+
+def get_cache():
+    return caches[getattr(settings, 'PRODUITS_CACHE_ALIAS', 'default')]
+
+
+def product_scope(product_id):
+    return f'product:{product_id}'
+
+
+def _version_key(scope):
+    return f'produits:version:{scope}'
+
+
+def get_versions(scopes):
+    cache = get_cache()
+    keys = {scope: _version_key(scope) for scope in scopes}
+    found = cache.get_many(keys.values())
+    versions = {}
+    missing = {}
+    for scope, key in keys.items():
+        if key in found:
+            versions[scope] = found[key]
+        else:
+            versions[scope] = missing[key] = uuid.uuid4().hex
+    if missing:
+        cache.set_many(missing, timeout=None)
+    return versions
+
+
+def bump_versions(scopes):
+    get_cache().set_many({_version_key(scope): uuid.uuid4().hex for scope in scopes}, timeout=None)
+
+
+def invalidate_products(product_ids):
+    """Invalide les listes et le détail des produits donnés."""
+    bump_versions([LIST_SCOPE, *(product_scope(pk) for pk in set(product_ids))])
+
+
+def compute_etag(data):
+    payload = json.dumps(data, cls=JSONEncoder, sort_keys=True, separators=(',', ':'))
+    return quote_etag(hashlib.md5(payload.encode(), usedforsecurity=False).hexdigest())
+
+
+def response_key(request, versions):
+    parts = [
+        request.build_absolute_uri(),
+        request.META.get('HTTP_ACCEPT', ''),
+        *(f'{scope}={version}' for scope, version in sorted(versions.items())),
+    ]
+    digest = hashlib.md5('|'.join(parts).encode(), usedforsecurity=False).hexdigest()
+    return f'produits:response:{digest}'
+
+
+class CachedResponseMixin:
+    """
+    Met en cache les réponses GET d'une vue, avec ETag et réponses 304
+    sur If-None-Match. Les vues définissent get_cache_scopes().
+    """
+    cache_timeout = None
+
+    def get_cache_scopes(self):
+        return [LIST_SCOPE]
+
+    def get_cache_timeout(self):
+        if self.cache_timeout is not None:
+            return self.cache_timeout
+        return getattr(settings, 'PRODUITS_CACHE_TIMEOUT', 300)
+
+    def get(self, request, *args, **kwargs):
+        cache = get_cache()
+        key = response_key(request, get_versions(self.get_cache_scopes()))
+        entry = cache.get(key)
+        if entry is None:
+            # Rangée sous la version lue ci-dessus : pas de réplica en retard
+            with use_primary():
+                response = super().get(request, *args, **kwargs)
+            if (
+                response.status_code != status.HTTP_200_OK or not isinstance(response, Response)
+                or not getattr(response, 'cacheable', True)
+            ):
+                return response
+            etag = compute_etag(response.data)
+            cache.set(key, (etag, response.data), self.get_cache_timeout())
+        else:
+            etag, data = entry
+            response = Response(data)
+
+        if etag in parse_etags(request.META.get('HTTP_IF_NONE_MATCH', '')):
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        response['ETag'] = etag
+        return response
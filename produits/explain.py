@@ -0,0 +1,117 @@
+import json
+import re
+
+from django.apps import apps
+from django.db import connection
+
+# Plans d'exécution des requêtes de l'API (cf. commande explain_api).
+#
+# Les requêtes SQL réellement émises par les endpoints sont capturées (client
+# de test, paramètres compris) puis passées à EXPLAIN. Un parcours complet
+# d'une table qui grossit avec le catalogue est signalé ; sur les petites
+# tables de référence (marques, entrepôts, rôles...) il est normal, de même
+# qu'un parcours dans l'ordre de la requête arrêté par LIMIT (pas de tri).
+
+# Tables dont la taille suit celle du catalogue ou de la clientèle
+LARGE_MODELS = (
+    'produits.Product', 'produits.ProductAttributeValue', 'produits.ProductImage', 'produits.Stock',
+    'produits.ProductAvailability', 'produits.StockReservation', 'produits.StockReservationLine',
+    'utilisateurs.User', 'utilisateurs.UserRole', 'authtoken.Token',
+)
+
+# Lectures complètes voulues, par endpoint (cf. benchmark.endpoints) : l'index
+# des facettes lit tous les couples (produit, option) une fois par version du
+# catalogue
+EXPECTED_FULL_SCANS = {
+    'product-facets': {'produits_productattributevalue'},
+}
+
+SQLITE_SCAN_RE = re.compile(r'^SCAN (?:TABLE )?"?(\w+)"?(?: AS \w+)?$')
+SQLITE_SORT_RE = re.compile(r'^USE TEMP B-TREE FOR (?:ORDER BY|RIGHT PART OF ORDER BY)')
+LIMIT_RE = re.compile(r'\bLIMIT\b', re.IGNORECASE)
+
+
+def large_tables():
+    return {apps.get_model(label)._meta.db_table for label in LARGE_MODELS}
+
+
+def capture(client, url):
+    """[(sql, params)] des SELECT exécutés par client.get(url)."""
+    statements = []
+
+    def record(execute, sql, params, many, context):
+        if not many and sql.lstrip().upper().startswith('SELECT'):
+            statements.append((sql, tuple(params or ())))
+        return execute(sql, params, many, context)
+
+    with connection.execute_wrapper(record):
+        response = client.get(url)
+    if response.streaming:
+        # Les flux (export) exécutent leurs requêtes pendant la lecture
+        with connection.execute_wrapper(record):
+            for _ in response.streaming_content:
+                pass
+    return response.status_code, statements
+
+
+def explain(sql, params):
+    """
+    Étapes du plan [(détail, table parcourue en entier ou None, tri)].
+    SQLite (EXPLAIN QUERY PLAN) et PostgreSQL (EXPLAIN (FORMAT JSON)).
+    """
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+            steps = []
+            for row in cursor.fetchall():
+                detail = row[-1]
+                match = SQLITE_SCAN_RE.match(detail)
+                steps.append((detail, match.group(1) if match else None, bool(SQLITE_SORT_RE.match(detail))))
+            return steps
+        if connection.vendor == 'postgresql':
+            cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+            plan = cursor.fetchone()[0]
+            if isinstance(plan, str):
+                plan = json.loads(plan)
+            return list(_postgresql_steps(plan[0]['Plan']))
+    raise NotImplementedError(f"EXPLAIN non pris en charge pour {connection.vendor}")
+
+
+def _postgresql_steps(node):
+    kind = node['Node Type']
+    relation = node.get('Relation Name')
+    detail = f"{kind} on {relation}" if relation else kind
+    if node.get('Index Name'):
+        detail += f" using {node['Index Name']}"
+    yield detail, relation if kind == 'Seq Scan' else None, kind in ('Sort', 'Incremental Sort')
+    for child in node.get('Plans', ()):
+        yield from _postgresql_steps(child)
+
+
+def check(client, urls):
+    """
+    {nom: {'url', 'status', 'queries': [{'sql', 'plan', 'full_scans', 'sorts'}]}}
+    pour les endpoints {nom: url} ; full_scans ne retient que les grandes
+    tables, hors lectures complètes voulues.
+    """
+    large = large_tables()
+    report = {}
+    for name, url in urls.items():
+        watched = large - EXPECTED_FULL_SCANS.get(name, set())
+        status, statements = capture(client, url)
+        queries, seen = [], set()
+        for sql, params in statements:
+            if sql in seen:
+                continue
+            seen.add(sql)
+            steps = explain(sql, params)
+            sorts = sum(sort for _, _, sort in steps)
+            bounded = not sorts and LIMIT_RE.search(sql)
+            queries.append({
+                'sql': sql,
+                'plan': [detail for detail, _, _ in steps],
+                'full_scans': [] if bounded else sorted({table for _, table, _ in steps if table in watched}),
+                'sorts': sorts,
+            })
+        report[name] = {'url': url, 'status': status, 'queries': queries}
+    return report
@@ -0,0 +1,43 @@
+import json
+
+from rest_framework.utils.encoders import JSONEncoder
+
+from .models import Product
+from .prefetch import plan_queryset
+from .serializers import ProductDetailSerializer
+
+EXPORT_FORMATS = ('ndjson', 'json')
+DEFAULT_CHUNK_SIZE = 500
+
+
+def iter_products(queryset=None, chunk_size=DEFAULT_CHUNK_SIZE, context=None):
+    """
+    Parcourt le catalogue par blocs (curseur côté serveur + préchargements par
+    bloc) et produit un dict sérialisé par produit.
+    """
+    if queryset is None:
+        queryset = Product.objects.all()
+    queryset = plan_queryset(queryset.order_by('id'), ProductDetailSerializer)
+    # Un seul serializer, réutilisé pour chaque ligne
+    serializer = ProductDetailSerializer(context=context or {})
+    for product in queryset.iterator(chunk_size=chunk_size):
+        yield serializer.to_representation(product)
+
+
+def _dumps(data):
+    return json.dumps(data, cls=JSONEncoder, ensure_ascii=False, separators=(',', ':'))
+
+
+def iter_export(products, fmt='ndjson'):
+    """Encode les produits en NDJSON ou en tableau JSON, morceau par morceau."""
+    if fmt == 'ndjson':
+        for data in products:
+            yield _dumps(data) + '\n'
+        return
+
+    yield '['
+    first = True
+    for data in products:
+        yield _dumps(data) if first else ',' + _dumps(data)
+        first = False
+    yield ']\n'
@@ -0,0 +1,235 @@
+import logging
+import threading
+from bisect import bisect_left, bisect_right
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import connections
+
+from storer.routers import use_primary
+
+from . import cache
+from .models import Category, Brand, Product, ProductAttributeOption, ProductAttributeValue
+
+# Index à facettes en mémoire.
+#
+# Les produits actifs reçoivent une position (triée par prix) ; chaque marque,
+# catégorie et option d'attribut est un bitmap (entier Python) des positions
+# qui la portent. Un filtre est un ET de OU de bitmaps, et le comptage d'une
+# facette un simple int.bit_count(), quelle que soit la taille du catalogue.
+#
+# L'index a sa propre version de cache (FACETS_SCOPE), changée seulement par
+# les écritures qui le concernent (produits, valeurs d'attribut, marques,
+# catégories, options) : les mouvements de stock et de disponibilité ne le
+# touchent pas. Quand elle change, l'index en place continue de répondre
+# pendant qu'un thread en reconstruit un nouveau, substitué une fois prêt
+# (PRODUITS_FACETS_BACKGROUND=False : reconstruction dans la requête).
+
+logger = logging.getLogger(__name__)
+
+
+def _bitmap(positions, size):
+    bits = bytearray((size + 7) // 8)
+    for pos in positions:
+        bits[pos >> 3] |= 1 << (pos & 7)
+    return int.from_bytes(bits, 'little')
+
+
+def _iter_positions(mask, reverse=False):
+    while mask:
+        if reverse:
+            pos = mask.bit_length() - 1
+            mask ^= 1 << pos
+        else:
+            low = mask & -mask
+            pos = low.bit_length() - 1
+            mask ^= low
+        yield pos
+
+
+class FacetIndex:
+
+    def __init__(self, version=None):
+        self.version = version
+        rows = list(
+            Product.objects.filter(is_active=True)
+            .order_by('price', 'id')
+            .values_list('id', 'price', 'brand_id', 'category_id')
+        )
+        size = len(rows)
+        self.ids = [row[0] for row in rows]
+        self.prices = [row[1] for row in rows]
+        self.all = (1 << size) - 1
+        position = {pk: pos for pos, pk in enumerate(self.ids)}
+
+        brands, categories, options = defaultdict(list), defaultdict(list), defaultdict(list)
+        for pos, (_, _, brand_id, category_id) in enumerate(rows):
+            brands[brand_id].append(pos)
+            categories[category_id].append(pos)
+        for product_id, option_id in ProductAttributeValue.objects.values_list('product_id', 'option_id').iterator():
+            pos = position.get(product_id)
+            if pos is not None:
+                options[option_id].append(pos)
+
+        self.brands = {pk: _bitmap(p, size) for pk, p in brands.items()}
+        self.categories = {pk: _bitmap(p, size) for pk, p in categories.items()}
+        self.options = {pk: _bitmap(set(p), size) for pk, p in options.items()}
+
+        self.brand_names = dict(Brand.objects.filter(pk__in=self.brands).values_list('id', 'name'))
+        self.category_tree = {
+            pk: (name, path) for pk, name, path in Category.objects.values_list('id', 'name', 'path')
+        }
+        self.option_info = {}   # option -> (attribut, valeur)
+        self.attribute_names = {}
+        for pk, attribute_id, attribute_name, value in ProductAttributeOption.objects.filter(
+            pk__in=self.options
+        ).values_list('id', 'attribute_id', 'attribute__name', 'value'):
+            self.option_info[pk] = (attribute_id, value)
+            self.attribute_names[attribute_id] = attribute_name
+
+    # --- Filtres ---------------------------------------------------------
+
+    def _any(self, masks, keys):
+        mask = 0
+        for key in keys:
+            mask |= masks.get(key, 0)
+        return mask
+
+    def _subtree(self, category_id):
+        _, path = self.category_tree.get(category_id, (None, None))
+        if not path:
+            return {category_id}
+        return {pk for pk, (_, p) in self.category_tree.items() if p.startswith(path)}
+
+    def _price_mask(self, price_min, price_max):
+        lo = bisect_left(self.prices, price_min) if price_min is not None else 0
+        hi = bisect_right(self.prices, price_max) if price_max is not None else len(self.prices)
+        if hi <= lo:
+            return 0
+        return ((1 << hi) - 1) ^ ((1 << lo) - 1)
+
+    def _groups(self, options, brands, categories, price_min, price_max):
+        groups = {}
+        by_attribute = defaultdict(list)
+        for option_id in options:
+            attribute_id = self.option_info.get(option_id, (None,))[0]
+            by_attribute[attribute_id].append(option_id)
+        for attribute_id, option_ids in by_attribute.items():
+            # OU entre options d'un même attribut, ET entre attributs
+            groups[('attribute', attribute_id)] = self._any(self.options, option_ids)
+        if brands:
+            groups['brand'] = self._any(self.brands, brands)
+        if categories:
+            groups['category'] = self._any(
+                self.categories, set().union(*(self._subtree(pk) for pk in categories))
+            )
+        if price_min is not None or price_max is not None:
+            groups['price'] = self._price_mask(price_min, price_max)
+        return groups
+
+    def _combine(self, groups, exclude=None):
+        mask = self.all
+        for name, group in groups.items():
+            if name != exclude:
+                mask &= group
+        return mask
+
+    # --- Recherche -------------------------------------------------------
+
+    def search(self, options=(), brands=(), categories=(), price_min=None, price_max=None,
+               offset=0, limit=20, descending=False):
+        """
+        Retourne (nombre total, ids de la page, facettes). Les comptes d'une
+        facette ignorent les filtres de cette même facette (facettes
+        disjonctives), pour que l'on puisse élargir une sélection.
+        """
+        groups = self._groups(options, brands, categories, price_min, price_max)
+        result = self._combine(groups)
+
+        page = []
+        for i, pos in enumerate(_iter_positions(result, reverse=descending)):
+            if i >= offset + limit:
+                break
+            if i >= offset:
+                page.append(self.ids[pos])
+
+        base = self._combine(groups, exclude='brand')
+        brand_counts = [
+            {'id': pk, 'name': self.brand_names.get(pk), 'count': count}
+            for pk, mask in self.brands.items() if (count := (base & mask).bit_count())
+        ]
+        base = self._combine(groups, exclude='category')
+        category_counts = [
+            {'id': pk, 'name': self.category_tree.get(pk, (None,))[0], 'count': count}
+            for pk, mask in self.categories.items() if (count := (base & mask).bit_count())
+        ]
+        attributes = defaultdict(list)
+        bases = {}
+        for option_id, (attribute_id, value) in self.option_info.items():
+            if attribute_id not in bases:
+                bases[attribute_id] = self._combine(groups, exclude=('attribute', attribute_id))
+            count = (bases[attribute_id] & self.options[option_id]).bit_count()
+            if count:
+                attributes[attribute_id].append({'id': option_id, 'value': value, 'count': count})
+
+        price = None
+        if result:
+            price = {
+                'min': str(self.prices[(result & -result).bit_length() - 1]),
+                'max': str(self.prices[result.bit_length() - 1]),
+            }
+        facets = {
+            'brands': sorted(brand_counts, key=lambda f: -f['count']),
+            'categories': sorted(category_counts, key=lambda f: -f['count']),
+            'attributes': [
+                {'id': pk, 'name': self.attribute_names[pk], 'options': sorted(opts, key=lambda f: -f['count'])}
+                for pk, opts in sorted(attributes.items())
+            ],
+            'price': price,
+        }
+        return result.bit_count(), page, facets
+
+
+_index = None
+_lock = threading.Lock()
+_rebuilding = False
+
+
+def current_version():
+    return cache.get_versions([cache.FACETS_SCOPE])[cache.FACETS_SCOPE]
+
+
+def _rebuild(version):
+    global _index, _rebuilding
+    try:
+        index = FacetIndex(version)
+        with _lock:
+            _index = index
+    except Exception:
+        logger.exception("Échec de la reconstruction de l'index à facettes")
+    finally:
+        with _lock:
+            _rebuilding = False
+        connections.close_all()
+
+
+def get_index():
+    """
+    Index courant. Le premier est construit dans la requête ; ensuite, un
+    index périmé est servi pendant sa reconstruction en arrière-plan.
+    """
+    global _index, _rebuilding
+    version = current_version()
+    index = _index
+    if index is not None and index.version == version:
+        return index
+    if index is not None and getattr(settings, 'PRODUITS_FACETS_BACKGROUND', True):
+        with _lock:
+            start, _rebuilding = not _rebuilding, True
+        if start:
+            threading.Thread(target=_rebuild, args=(version,), name='facets', daemon=True).start()
+        return index
+    with _lock, use_primary():
+        if _index is None or _index.version != version:
+            _index = FacetIndex(version)
+        return _index
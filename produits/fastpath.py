@@ -0,0 +1,196 @@
+import re
+from collections import defaultdict
+
+from django.urls import reverse
+
+from . import images
+from .models import Product, ProductAttributeValue, ProductImage, Stock
+from .serializers import ProductSerializer
+from .storage import media_storage
+
+# Lecture rapide des listes de produits.
+#
+# Produit exactement la représentation de ProductSerializer (mêmes clés, même
+# ordre, mêmes valeurs) sans instancier de modèles ni de serializers : quatre
+# requêtes .values_list() (produits avec leurs jointures, attributs, images,
+# stocks) et des dictionnaires construits directement. Les conversions qui
+# comptent (prix, dates) réutilisent les champs de ProductSerializer, liés une
+# fois ; les URL absolues sont préfixées au lieu d'appeler build_absolute_uri
+# pour chaque ligne. La parité est vérifiée par ProductListingParityTests.
+# Requêtes et mise en forme par ligne sont séparées : produits.async_views
+# lance les mêmes requêtes en parallèle et réutilise la mise en forme.
+
+PRODUCT_COLUMNS = (
+    'id', 'name', 'slug', 'description', 'price', 'is_active', 'created_at', 'updated_at',
+    'category_id', 'category__name', 'category__parent_id',
+    'brand_id', 'brand__name', 'brand__logo', 'brand__logo_derivatives',
+    'product_type_id', 'product_type__name',
+    'availability__available_units',
+)
+ATTRIBUTE_COLUMNS = (
+    'id', 'product_id', 'option_id', 'option__value',
+    'option__attribute_id', 'option__attribute__name', 'option__attribute__product_type_id',
+)
+IMAGE_COLUMNS = ('id', 'product_id', 'image', 'is_feature', 'alt_text', 'derivatives')
+STOCK_COLUMNS = (
+    'id', 'product_id', 'warehouse_id', 'warehouse__name', 'warehouse__location',
+    'units', 'units_sold', 'units_reserved',
+)
+
+# Noms de fichiers dont l'URL est « préfixe + nom » (rien à échapper, pas de
+# segment . ou ..) ; les autres passent par storage.url / build_absolute_uri.
+SIMPLE_NAME = re.compile(r'^(?!.*(?:^|/)\.\.?(?:/|$))[A-Za-z0-9_.\-]+(?:/[A-Za-z0-9_.\-]+)*$')
+PK_PLACEHOLDER = 918273645
+
+
+class ProductListing:
+    """Construit la sortie de ProductSerializer(many=True) pour un queryset."""
+
+    def __init__(self, request=None):
+        self.request = request
+        fields = ProductSerializer(context={'request': request}).fields
+        self.price = fields['price'].to_representation
+        self.datetime = fields['created_at'].to_representation
+        self.storage = media_storage
+        self.media_prefix = self.absolute(self.storage.url('x'))[:-1]
+        self.lazy = images.is_lazy()
+        self.widths, self.formats = images.get_widths(), images.get_formats()
+        self.lazy_templates = {}
+        self.brands = {}
+
+    def absolute(self, url):
+        return self.request.build_absolute_uri(url) if self.request is not None else url
+
+    def media_url(self, name):
+        if SIMPLE_NAME.match(name):
+            return self.media_prefix + name
+        return self.absolute(self.storage.url(name))
+
+    def lazy_srcset(self, kind, pk):
+        templates = self.lazy_templates.get(kind)
+        if templates is None:
+            # Une résolution d'URL par largeur et format, pas par ligne
+            templates = self.lazy_templates[kind] = {
+                fmt: [
+                    (self.absolute(reverse('image-derivative', args=[kind, PK_PLACEHOLDER, width, fmt]))
+                     .split(str(PK_PLACEHOLDER)), width)
+                    for width in self.widths
+                ]
+                for fmt in self.formats
+            }
+        return {
+            fmt: ', '.join(f"{head}{pk}{tail} {width}w" for (head, tail), width in entries)
+            for fmt, entries in templates.items()
+        }
+
+    def srcset(self, kind, pk, name, derivatives):
+        # cf. serializers.image_srcset
+        if not name:
+            return {}
+        if derivatives.get('variants') and derivatives.get('source') == name:
+            return images.srcset(derivatives, self.media_url)
+        if self.lazy:
+            return self.lazy_srcset(kind, pk)
+        return {}
+
+    def brand(self, pk, name, logo, derivatives):
+        brand = self.brands.get(pk)
+        if brand is None:
+            brand = self.brands[pk] = {
+                'id': pk,
+                'name': name,
+                'logo': self.media_url(logo) if logo else None,
+                'srcset': self.srcset('brand', pk, logo, derivatives),
+            }
+        # Copie : chaque produit a son propre dictionnaire, comme avec le serializer
+        return {**brand, 'srcset': dict(brand['srcset'])}
+
+    def attribute(self, row):
+        pk, product_id, option_id, value, attribute_id, attribute_name, type_id = row
+        return {
+            'id': pk,
+            'product': product_id,
+            'option': {
+                'id': option_id,
+                'value': value,
+                'attribute': {'id': attribute_id, 'name': attribute_name, 'product_type': type_id},
+            },
+        }
+
+    def image(self, row):
+        pk, product_id, name, is_feature, alt_text, derivatives = row
+        return {
+            'id': pk,
+            'product': product_id,
+            'image': self.media_url(name) if name else None,
+            'srcset': self.srcset('product-image', pk, name, derivatives),
+            'is_feature': is_feature,
+            'alt_text': alt_text,
+        }
+
+    def stock(self, row):
+        pk, product_id, warehouse_id, warehouse, location, units, sold, reserved = row
+        return {
+            'id': pk,
+            'product': product_id,
+            'warehouse': {'id': warehouse_id, 'name': warehouse, 'location': location},
+            'warehouse_id': warehouse_id,
+            'units': units,
+            'units_sold': sold,
+            'units_reserved': reserved,
+        }
+
+    def child_querysets(self, product_ids):
+        """Requêtes des attributs, images et stocks, indépendantes entre elles."""
+        return (
+            ProductAttributeValue.objects.filter(product_id__in=product_ids).order_by('pk').values_list(*ATTRIBUTE_COLUMNS),
+            ProductImage.objects.filter(product_id__in=product_ids).order_by('pk').values_list(*IMAGE_COLUMNS),
+            Stock.objects.filter(product_id__in=product_ids).order_by('pk').values_list(*STOCK_COLUMNS),
+        )
+
+    def group(self, attribute_rows, image_rows, stock_rows):
+        """{produit: [...]} des attributs, images et stocks."""
+        grouped = []
+        for rows, build in ((attribute_rows, self.attribute), (image_rows, self.image), (stock_rows, self.stock)):
+            by_product = defaultdict(list)
+            for row in rows:
+                by_product[row[1]].append(build(row))
+            grouped.append(by_product)
+        return grouped
+
+    def children(self, product_ids):
+        return self.group(*self.child_querysets(product_ids))
+
+    def product(self, row, attributes, pictures, stocks):
+        (pk, name, slug, description, price, is_active, created_at, updated_at,
+         category_id, category_name, parent_id, brand_id, brand_name, logo, logo_derivatives,
+         type_id, type_name, available_units) = row
+        return {
+            'id': pk,
+            'name': name,
+            'slug': slug,
+            'category': {'id': category_id, 'name': category_name, 'parent': parent_id},
+            'brand': self.brand(brand_id, brand_name, logo, logo_derivatives),
+            'product_type': {'id': type_id, 'name': type_name},
+            'description': description,
+            'price': self.price(price),
+            'is_active': is_active,
+            # None sans ligne ProductAvailability, comme le serializer
+            'available_units': available_units,
+            'created_at': self.datetime(created_at),
+            'updated_at': self.datetime(updated_at),
+            'attribute_values': attributes.get(pk, []),
+            'images': pictures.get(pk, []),
+            'stocks': stocks.get(pk, []),
+        }
+
+    def build(self, queryset):
+        """Liste des produits du queryset, dans son ordre."""
+        rows = list(queryset.values_list(*PRODUCT_COLUMNS))
+        attributes, pictures, stocks = self.children([row[0] for row in rows])
+        return [self.product(row, attributes, pictures, stocks) for row in rows]
+
+    def build_for_ids(self, product_ids):
+        """Comme build(), dans l'ordre de product_ids (page déjà découpée)."""
+        by_id = {product['id']: product for product in self.build(Product.objects.filter(pk__in=product_ids))}
+        return [by_id[pk] for pk in product_ids if pk in by_id]
@@ -0,0 +1,211 @@
+import gzip
+import io
+import json
+import os
+
+from django.conf import settings
+
+# Lecture incrémentale des flux fournisseurs (JSON, NDJSON, éventuellement
+# compressés en gzip) : un enregistrement à la fois, mémoire bornée quelle que
+# soit la taille du fichier. Un enregistrement (valeur JSON, ligne NDJSON)
+# ne dépasse pas PRODUITS_FEED_MAX_RECORD_SIZE caractères : au-delà, le flux
+# est refusé au lieu d'être lu jusqu'au bout en mémoire.
+
+FEED_FORMATS = ('auto', 'json', 'ndjson')
+READ_SIZE = 64 * 1024
+NDJSON_EXTENSIONS = ('.ndjson', '.jsonl')
+DEFAULT_MAX_RECORD_SIZE = 8 * 1024 * 1024
+# Plus long jeton qu'une fin de tampon peut couper sans que l'erreur du
+# décodeur ne soit signalée en fin de tampon (-Infinity, \uXXXX)
+TOKEN_TAIL = 16
+
+
+class FeedError(ValueError):
+    pass
+
+
+def get_max_record_size():
+    return getattr(settings, 'PRODUITS_FEED_MAX_RECORD_SIZE', DEFAULT_MAX_RECORD_SIZE)
+
+
+def _too_large(max_size):
+    return FeedError(f"Enregistrement de plus de {max_size} caractères (PRODUITS_FEED_MAX_RECORD_SIZE)")
+
+
+class Feed:
+    """Fichier de flux ouvert, avec suivi de la progression en octets."""
+
+    def __init__(self, path, fmt='auto'):
+        if fmt not in FEED_FORMATS:
+            raise FeedError(f"Format inconnu : {fmt}")
+        self.path = path
+        self.size = os.path.getsize(path)
+        self._raw = open(path, 'rb')
+        compressed = self._raw.read(2) == b'\x1f\x8b'
+        self._raw.seek(0)
+        binary = gzip.GzipFile(fileobj=self._raw) if compressed else self._raw
+        self.stream = io.TextIOWrapper(binary, encoding='utf-8')
+
+        name = path[:-3] if path.endswith('.gz') else path
+        if fmt == 'auto':
+            fmt = 'ndjson' if name.endswith(NDJSON_EXTENSIONS) else 'json'
+        self.format = fmt
+
+    def progress(self):
+        """Fraction du fichier (compressé le cas échéant) déjà lue."""
+        return self._raw.tell() / self.size if self.size else 1.0
+
+    def close(self):
+        self.stream.close()
+        self._raw.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def records(self):
+        """Enregistrements d'un tableau JSON de premier niveau, ou lignes NDJSON."""
+        if self.format == 'ndjson':
+            yield from self._ndjson()
+            return
+        reader = _JSONReader(self.stream)
+        reader.expect('[')
+        yield from reader.items(']')
+        reader.end()
+
+    def sections(self):
+        """
+        Paires (section, élément) d'un objet de premier niveau dont les valeurs
+        sont des tableaux : {"brands": [...], ...} -> ("brands", item), ...
+        En NDJSON, chaque ligne est un objet {"section": élément}.
+        """
+        if self.format == 'ndjson':
+            for line in self._ndjson():
+                if not isinstance(line, dict):
+                    raise FeedError("Ligne NDJSON attendue : objet {section: élément}")
+                yield from line.items()
+            return
+        reader = _JSONReader(self.stream)
+        reader.expect('{')
+        for key in reader.keys():
+            if reader.peek() == '[':
+                reader.expect('[')
+                for item in reader.items(']'):
+                    yield key, item
+            else:
+                yield key, reader.value()
+        reader.end()
+
+    def _ndjson(self):
+        max_size = get_max_record_size()
+        for number, line in enumerate(iter(lambda: self.stream.readline(max_size + 1), ''), 1):
+            if len(line) > max_size and not line.endswith('\n'):
+                raise FeedError(f"Ligne {number} : {_too_large(max_size)}")
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError as exc:
+                raise FeedError(f"Ligne {number} invalide : {exc}") from exc
+
+
+class _JSONReader:
+    """Analyse à la demande les conteneurs de premier niveau d'un document JSON."""
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.max_size = get_max_record_size()
+        self.decoder = json.JSONDecoder()
+        self.buffer = ''
+        self.pos = 0
+        self.eof = False
+
+    def _fill(self, size=READ_SIZE):
+        if self.eof:
+            return False
+        if self.pos > len(self.buffer) // 2:
+            self.buffer = self.buffer[self.pos:]
+            self.pos = 0
+        data = self.stream.read(size)
+        if not data:
+            self.eof = True
+            return False
+        self.buffer += data
+        return True
+
+    def peek(self):
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in ' \t\r\n':
+                self.pos += 1
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self._fill():
+                return ''
+
+    def expect(self, char):
+        found = self.peek()
+        if found != char:
+            raise FeedError(f"'{char}' attendu, '{found or 'fin du fichier'}' trouvé")
+        self.pos += 1
+
+    def value(self):
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError as exc:
+                # Valeur coupée par la fin du tampon : on lit davantage. Une
+                # erreur plus tôt dans le tampon ne changera pas : on s'arrête.
+                if not self._truncated(exc):
+                    raise FeedError(f"JSON invalide : {exc}") from exc
+                if len(self.buffer) - self.pos > self.max_size:
+                    raise _too_large(self.max_size) from exc
+                if self._fill(max(READ_SIZE, len(self.buffer) - self.pos)):
+                    continue
+                raise FeedError(f"JSON invalide : {exc}") from exc
+            # Un nombre en fin de tampon peut être incomplet
+            if end == len(self.buffer) and self._fill():
+                continue
+            self.pos = end
+            return value
+
+    def _truncated(self, exc):
+        # Une chaîne non terminée est signalée à son début
+        return exc.msg.startswith('Unterminated string') or exc.pos >= len(self.buffer) - TOKEN_TAIL
+
+    def items(self, closing):
+        if self.peek() == closing:
+            self.pos += 1
+            return
+        while True:
+            yield self.value()
+            separator = self.peek()
+            self.pos += 1
+            if separator == closing:
+                return
+            if separator != ',':
+                raise FeedError(f"',' ou '{closing}' attendu, '{separator or 'fin du fichier'}' trouvé")
+
+    def keys(self):
+        if self.peek() == '}':
+            self.pos += 1
+            return
+        while True:
+            key = self.value()
+            if not isinstance(key, str):
+                raise FeedError("Clé d'objet attendue")
+            self.expect(':')
+            yield key
+            separator = self.peek()
+            self.pos += 1
+            if separator == '}':
+                return
+            if separator != ',':
+                raise FeedError(f"',' ou '}}' attendu, '{separator or 'fin du fichier'}' trouvé")
+
+    def end(self):
+        if self.peek():
+            raise FeedError("Données après la fin du document JSON")
@@ -0,0 +1,216 @@
+import hashlib
+import io
+import logging
+import os
+import posixpath
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import connections, transaction
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+logger = logging.getLogger(__name__)
+
+# Déclinaisons des images (photos produits, logos de marques).
+#
+# Chaque original est décliné en plusieurs largeurs et formats (WebP, JPEG),
+# rangés à côté de lui sous un nom qui contient l'empreinte de l'original :
+# « photo.320w.<empreinte>.webp ». Un fichier existant sous ce nom est donc
+# forcément à jour et sert de cache disque. Les noms générés sont enregistrés
+# dans un champ JSON du modèle, ce qui permet au serializer de construire le
+# srcset sans toucher au disque.
+#
+# Génération à l'envoi, dans un pool de threads (Pillow libère le GIL pendant
+# le redimensionnement et l'encodage), ou à la demande via la vue
+# product-image-derivative.
+
+DEFAULT_WIDTHS = (160, 320, 640, 1024)
+FORMATS = {'webp': ('WEBP', 'webp'), 'jpeg': ('JPEG', 'jpg')}
+QUALITY = {'webp': 80, 'jpeg': 82}
+READ_CHUNK = 64 * 1024
+DIGEST_LENGTH = 16
+
+
+def get_widths():
+    return tuple(getattr(settings, 'PRODUITS_IMAGE_WIDTHS', DEFAULT_WIDTHS))
+
+
+def get_formats():
+    return tuple(getattr(settings, 'PRODUITS_IMAGE_FORMATS', tuple(FORMATS)))
+
+
+def file_digest(field_file):
+    """Empreinte SHA-256 du fichier, lue par blocs."""
+    digest = hashlib.sha256()
+    with field_file.storage.open(field_file.name, 'rb') as f:
+        while chunk := f.read(READ_CHUNK):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def derivative_name(name, digest, width, fmt):
+    stem = posixpath.splitext(name)[0]
+    return f"{stem}.{width}w.{digest[:DIGEST_LENGTH]}.{FORMATS[fmt][1]}"
+
+
+def render(source, width, fmt):
+    """Octets de l'image source réduite à width pixels de large (jamais agrandie)."""
+    image = ImageOps.exif_transpose(source)
+    if image.width > width:
+        image = image.resize((width, round(image.height * width / image.width)), Image.LANCZOS)
+    if fmt == 'jpeg' and image.mode != 'RGB':
+        # JPEG sans transparence : fond blanc
+        background = Image.new('RGB', image.size, 'white')
+        background.paste(image, mask=image.convert('RGBA').getchannel('A'))
+        image = background
+    elif fmt == 'webp' and image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGBA')
+    buffer = io.BytesIO()
+    image.save(buffer, FORMATS[fmt][0], quality=QUALITY[fmt], optimize=fmt == 'jpeg')
+    return buffer.getvalue()
+
+
+def generate(field_file, widths=None, formats=None, derivatives=None):
+    """
+    Crée les déclinaisons manquantes de field_file et renvoie la carte
+    {'source', 'digest', 'width', 'variants': {format: {largeur: nom}}}.
+    """
+    storage = field_file.storage
+    digest = file_digest(field_file)
+    if derivatives and derivatives.get('digest') == digest:
+        result = {
+            **derivatives, 'source': field_file.name,
+            'variants': {fmt: dict(v) for fmt, v in derivatives['variants'].items()},
+        }
+    else:
+        result = {'source': field_file.name, 'digest': digest, 'width': None, 'variants': {}}
+    with storage.open(field_file.name, 'rb') as f:
+        source = Image.open(f)
+        source.load()
+    result['width'] = ImageOps.exif_transpose(source).width
+    # Pas d'agrandissement : les largeurs trop grandes se ramènent à celle de l'original
+    targets = sorted({min(width, result['width']) for width in widths or get_widths()})
+    for fmt in formats or get_formats():
+        variants = result['variants'].setdefault(fmt, {})
+        for width in targets:
+            recorded = variants.get(str(width))
+            if recorded and storage.exists(recorded):
+                continue
+            name = derivative_name(field_file.name, digest, width, fmt)
+            if not storage.exists(name):
+                # Un stockage adressé par le contenu peut choisir un autre nom
+                name = storage.save(name, ContentFile(render(source, width, fmt)))
+            variants[str(width)] = name
+    return result
+
+
+# --- Modèles concernés -------------------------------------------------------
+
+def targets():
+    """{type: (modèle, champ du fichier, champ des déclinaisons)} des images déclinées."""
+    from .models import Brand, ProductImage
+    return {
+        'product-image': (ProductImage, 'image', 'derivatives'),
+        'brand': (Brand, 'logo', 'logo_derivatives'),
+    }
+
+
+def target_for(instance):
+    for kind, (model, field, store) in targets().items():
+        if isinstance(instance, model):
+            return kind, field, store
+    raise ValueError(f"Pas de déclinaisons pour {type(instance).__name__}")
+
+
+def needs_refresh(instance):
+    _, field, store = target_for(instance)
+    field_file = getattr(instance, field)
+    derivatives = getattr(instance, store) or {}
+    return bool(field_file) and derivatives.get('source') != field_file.name
+
+
+def build(kind, pk, widths=None, formats=None):
+    """Génère et enregistre les déclinaisons d'une instance ; renvoie la carte."""
+    from .signals import notify_products_changed
+    from .models import Brand, Product
+
+    model, field, store = targets()[kind]
+    instance = model.objects.filter(pk=pk).first()
+    if instance is None or not getattr(instance, field):
+        return None
+    field_file = getattr(instance, field)
+    try:
+        derivatives = generate(field_file, widths, formats, getattr(instance, store))
+    except (OSError, UnidentifiedImageError) as exc:
+        # Fichier absent ou illisible : l'original reste servi tel quel
+        logger.warning("Déclinaisons impossibles pour %s : %s", field_file.name, exc)
+        return None
+    # update() : ne pas redéclencher post_save ; seulement si l'image n'a pas changé entre-temps
+    model.objects.filter(pk=pk, **{field: field_file.name}).update(**{store: derivatives})
+    if model is Brand:
+        product_ids = Product.objects.filter(brand_id=pk).values_list('id', flat=True)
+    else:
+        product_ids = [instance.product_id]
+    notify_products_changed(product_ids, model)
+    return derivatives
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _run(kind, pk):
+    try:
+        build(kind, pk)
+    except Exception:
+        logger.exception("Échec de la génération des déclinaisons (%s %s)", kind, pk)
+    finally:
+        connections.close_all()
+
+
+def schedule(instance):
+    """Génère les déclinaisons après validation de la transaction, dans le pool."""
+    kind, _, _ = target_for(instance)
+    pk = instance.pk
+    workers = getattr(settings, 'PRODUITS_IMAGE_WORKERS', os.cpu_count() or 1)
+
+    def submit():
+        global _executor
+        if workers <= 0:
+            build(kind, pk)
+            return
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='derivatives')
+        _executor.submit(_run, kind, pk)
+
+    transaction.on_commit(submit)
+
+
+def srcset(derivatives, build_url):
+    """{'webp': 'url 320w, url 640w', ...} depuis la carte enregistrée."""
+    result = {}
+    for fmt, variants in (derivatives or {}).get('variants', {}).items():
+        if variants:
+            result[fmt] = ', '.join(
+                f"{build_url(name)} {width}w" for width, name in sorted(variants.items(), key=lambda v: int(v[0]))
+            )
+    return result
+
+
+def lazy_srcset(kind, pk, build_url):
+    """srcset vers la vue de génération à la demande, tant que rien n'est généré."""
+    from django.urls import reverse
+    return {
+        fmt: ', '.join(
+            f"{build_url(reverse('image-derivative', args=[kind, pk, width, fmt]))} {width}w"
+            for width in get_widths()
+        )
+        for fmt in get_formats()
+    }
+
+
+def is_lazy():
+    return getattr(settings, 'PRODUITS_IMAGE_LAZY', False)
@@ -0,0 +1,298 @@
+import json
+import os
+import time
+from decimal import Decimal, InvalidOperation
+from itertools import islice
+
+from django.db import transaction
+from django.utils.text import slugify
+
+from .models import (
+    Category, Brand, ProductType, Product,
+    ProductAttribute, ProductAttributeOption, ProductAttributeValue,
+    Stock, Warehouse
+)
+from .signals import notify_products_changed
+
+DEFAULT_CHUNK_SIZE = 1000
+DEFAULT_WAREHOUSE = "Ouagadougou Central Warehouse"
+
+
+def chunked(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+class Checkpoint:
+    """Nombre d'enregistrements déjà importés, écrit après chaque bloc validé."""
+
+    def __init__(self, path):
+        self.path = path
+
+    def load(self):
+        if not self.path or not os.path.exists(self.path):
+            return 0
+        with open(self.path, encoding='utf-8') as f:
+            return json.load(f).get('processed', 0)
+
+    def save(self, processed):
+        if not self.path:
+            return
+        tmp = f'{self.path}.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump({'processed': processed}, f)
+        os.replace(tmp, self.path)
+
+    def clear(self):
+        if self.path and os.path.exists(self.path):
+            os.remove(self.path)
+
+
+class CatalogueImporter:
+    """
+    Import par blocs du catalogue produits.
+
+    Les tables de référence (catégories, marques, types, attributs, options,
+    entrepôts) sont chargées une fois en mémoire ; chaque bloc est écrit en
+    quelques bulk_create/bulk_update dans une seule transaction, au lieu de
+    get_or_create ligne par ligne.
+    """
+
+    def __init__(self, chunk_size=DEFAULT_CHUNK_SIZE, checkpoint=None, log=None, progress=None):
+        self.chunk_size = chunk_size
+        self.progress = progress
+        self.checkpoint = checkpoint or Checkpoint(None)
+        self.log = log or (lambda message: None)
+        self.stats = {'products': 0, 'skipped': 0, 'images_skipped': 0}
+
+        self.categories = {(c.name, c.parent_id): c.pk for c in Category.objects.only('name', 'parent')}
+        self.brands = dict(Brand.objects.values_list('name', 'id'))
+        self.types = dict(ProductType.objects.values_list('name', 'id'))
+        self.attributes = {
+            (a.product_type_id, a.name): a.pk for a in ProductAttribute.objects.only('name', 'product_type')
+        }
+        self.options = {
+            (o.attribute_id, o.value): o.pk for o in ProductAttributeOption.objects.only('attribute', 'value')
+        }
+        self.warehouses = dict(Warehouse.objects.values_list('name', 'id'))
+        self.warehouse_ids = set(self.warehouses.values())
+
+    # --- Tables de référence --------------------------------------------
+
+    def _ensure(self, mapping, keys, model, build, reload):
+        """Crée en masse les clés absentes de mapping puis recharge leurs id."""
+        missing = [key for key in dict.fromkeys(keys) if key not in mapping]
+        if not missing:
+            return
+        model.objects.bulk_create([build(key) for key in missing], ignore_conflicts=True)
+        mapping.update(reload(missing))
+
+    def _ensure_brands(self, names):
+        self._ensure(
+            self.brands, names, Brand, lambda name: Brand(name=name),
+            lambda names: Brand.objects.filter(name__in=names).values_list('name', 'id'),
+        )
+
+    def _ensure_types(self, names):
+        self._ensure(
+            self.types, names, ProductType, lambda name: ProductType(name=name),
+            lambda names: ProductType.objects.filter(name__in=names).values_list('name', 'id'),
+        )
+
+    def _ensure_category_keys(self, keys):
+        self._ensure(
+            self.categories, keys, Category,
+            lambda key: Category(name=key[0], parent_id=key[1]),
+            lambda missing: {
+                (c.name, c.parent_id): c.pk
+                for c in Category.objects.filter(name__in={name for name, _ in missing}).only('name', 'parent')
+            },
+        )
+
+    def _ensure_categories(self, keys):
+        # keys: (nom, nom du parent ou None) ; les parents sont créés à la racine
+        keys = list(keys)
+        known = len(self.categories)
+        self._ensure_category_keys([(parent, None) for _, parent in keys if parent])
+        self._ensure_category_keys([
+            (name, self.categories[(parent, None)] if parent else None) for name, parent in keys
+        ])
+        if len(self.categories) != known:
+            # bulk_create ne passe pas par Category.save()
+            Category.objects.rebuild_paths()
+
+    def _ensure_attributes(self, keys):
+        self._ensure(
+            self.attributes, keys, ProductAttribute,
+            lambda key: ProductAttribute(product_type_id=key[0], name=key[1]),
+            lambda missing: {
+                (a.product_type_id, a.name): a.pk
+                for a in ProductAttribute.objects.filter(name__in={name for _, name in missing}).only('name', 'product_type')
+            },
+        )
+
+    def _ensure_options(self, keys):
+        self._ensure(
+            self.options, keys, ProductAttributeOption,
+            lambda key: ProductAttributeOption(attribute_id=key[0], value=key[1]),
+            lambda missing: {
+                (o.attribute_id, o.value): o.pk
+                for o in ProductAttributeOption.objects.filter(
+                    attribute_id__in={attr for attr, _ in missing}
+                ).only('attribute', 'value')
+            },
+        )
+
+    def _ensure_warehouses(self, names):
+        self._ensure(
+            self.warehouses, names, Warehouse, lambda name: Warehouse(name=name),
+            lambda names: Warehouse.objects.filter(name__in=names).values_list('name', 'id'),
+        )
+        self.warehouse_ids.update(self.warehouses.values())
+
+    # --- Import ---------------------------------------------------------
+
+    def _clean(self, record):
+        try:
+            price = Decimal(str(record['price']))
+            return {
+                'name': record['name'],
+                'slug': slugify(record.get('slug') or record['name'])[:255],
+                'category': (record['category'], record.get('category_parent') or None),
+                'brand': record['brand'],
+                'product_type': record['product_type'],
+                'description': record.get('description', ''),
+                'price': price,
+                'is_active': record.get('is_active', True),
+                'attributes': [
+                    (attr.get('attribute_name') or attr['name'], str(attr['value']))
+                    for attr in record.get('attributes', [])
+                ],
+                'images': len(record.get('images', [])),
+                'stock': record.get('stock'),
+            }
+        except (KeyError, TypeError, InvalidOperation) as exc:
+            self.log(f"Enregistrement ignoré ({exc!r}) : {record.get('name', '?') if isinstance(record, dict) else record!r}")
+            return None
+
+    def import_chunk(self, records):
+        rows = {}
+        for record in records:
+            row = self._clean(record)
+            if row is None:
+                self.stats['skipped'] += 1
+            elif row['slug']:
+                rows[row['slug']] = row  # le dernier doublon l'emporte
+        if not rows:
+            return []
+        rows = list(rows.values())
+
+        self._ensure_brands(row['brand'] for row in rows)
+        self._ensure_types(row['product_type'] for row in rows)
+        self._ensure_categories([row['category'] for row in rows])
+
+        products = []
+        for row in rows:
+            name, parent = row['category']
+            parent_id = self.categories[(parent, None)] if parent else None
+            products.append(Product(
+                name=row['name'], slug=row['slug'],
+                category_id=self.categories[(name, parent_id)],
+                brand_id=self.brands[row['brand']],
+                product_type_id=self.types[row['product_type']],
+                description=row['description'], price=row['price'], is_active=row['is_active'],
+            ))
+        Product.objects.bulk_create(
+            products, update_conflicts=True, unique_fields=['slug'],
+            update_fields=['name', 'category', 'brand', 'product_type', 'description', 'price', 'is_active', 'updated_at'],
+        )
+        product_ids = dict(Product.objects.filter(slug__in=[row['slug'] for row in rows]).values_list('slug', 'id'))
+
+        # Attributs -> options -> liaisons produit/option
+        self._ensure_attributes(
+            (self.types[row['product_type']], attr) for row in rows for attr, _ in row['attributes']
+        )
+        wanted = {}
+        for row in rows:
+            type_id = self.types[row['product_type']]
+            wanted[product_ids[row['slug']]] = [
+                (self.attributes[(type_id, attr)], value) for attr, value in row['attributes']
+            ]
+        self._ensure_options(key for keys in wanted.values() for key in keys)
+        existing = set(
+            ProductAttributeValue.objects.filter(product_id__in=wanted).values_list('product_id', 'option_id')
+        )
+        new_links = {
+            (product_id, self.options[key])
+            for product_id, keys in wanted.items() for key in keys
+        } - existing
+        ProductAttributeValue.objects.bulk_create(
+            [ProductAttributeValue(product_id=p, option_id=o) for p, o in new_links]
+        )
+
+        # Stocks : mise à jour ou création par (produit, entrepôt)
+        stock_rows = {}
+        for row in rows:
+            stock = row['stock']
+            if not stock:
+                continue
+            warehouse_id = stock.get('warehouse_id')
+            if warehouse_id is None:
+                name = stock.get('warehouse_name') or DEFAULT_WAREHOUSE
+                self._ensure_warehouses([name])
+                warehouse_id = self.warehouses[name]
+            elif warehouse_id not in self.warehouse_ids:
+                self.log(f"Entrepôt {warehouse_id} introuvable pour '{row['name']}', stock ignoré")
+                continue
+            stock_rows[(product_ids[row['slug']], warehouse_id)] = stock
+        existing = {
+            (s.product_id, s.warehouse_id): s
+            for s in Stock.objects.filter(product_id__in={p for p, _ in stock_rows})
+        }
+        to_update, to_create = [], []
+        for (product_id, warehouse_id), data in stock_rows.items():
+            stock = existing.get((product_id, warehouse_id))
+            if stock is None:
+                stock = Stock(product_id=product_id, warehouse_id=warehouse_id)
+                to_create.append(stock)
+            else:
+                to_update.append(stock)
+            stock.units = data.get('units', 0)
+            stock.units_sold = data.get('units_sold', 0)
+        Stock.objects.bulk_create(to_create)
+        Stock.objects.bulk_update(to_update, ['units', 'units_sold'])
+
+        # Les images du flux sont des URL distantes : non téléchargées (cf. seed_catalog)
+        self.stats['images_skipped'] += sum(row['images'] for row in rows)
+        self.stats['products'] += len(rows)
+        return list(product_ids.values())
+
+    def run(self, records, resume=False):
+        processed = self.checkpoint.load() if resume else 0
+        if processed:
+            self.log(f"Reprise après {processed} enregistrements")
+            records = islice(records, processed, None)
+
+        start = time.monotonic()
+        imported = 0
+        for chunk in chunked(records, self.chunk_size):
+            with transaction.atomic():
+                product_ids = self.import_chunk(chunk)
+            # bulk_create ne déclenche pas post_save
+            notify_products_changed(product_ids)
+            processed += len(chunk)
+            imported += len(chunk)
+            self.checkpoint.save(processed)
+            elapsed = time.monotonic() - start
+            done = f", {self.progress():.0%} du fichier" if self.progress else ""
+            self.log(f"{processed} enregistrements traités ({imported / elapsed:.0f} lignes/s{done})")
+
+        self.checkpoint.clear()
+        elapsed = time.monotonic() - start
+        self.stats['elapsed'] = elapsed
+        self.stats['rate'] = imported / elapsed if elapsed else 0
+        return self.stats
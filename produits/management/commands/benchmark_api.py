@@ -0,0 +1,128 @@
+import json
+import os
+import platform
+import subprocess
+import time
+
+import django
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client, override_settings
+from django.utils import timezone
+
+from produits import benchmark
+
+DEFAULT_SIZES = '1000,10000,100000'
+
+
+class Command(BaseCommand):
+    help = (
+        "Banc d'essai de l'API : sème des catalogues synthétiques (1k/10k/100k produits par défaut) "
+        "dans une base SQLite dédiée, mesure latences (p50/p90/p95/p99), débit et requêtes SQL des "
+        "principaux endpoints produits et utilisateurs, et écrit les résultats en JSON"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default=DEFAULT_SIZES,
+                            help="Tailles de catalogue, croissantes, séparées par des virgules")
+        parser.add_argument('--database', default=os.path.join(settings.BASE_DIR, 'benchmark.sqlite3'),
+                            help="Fichier SQLite du banc d'essai (réutilisé d'une exécution à l'autre)")
+        parser.add_argument('--use-default-database', action='store_true',
+                            help="Mesure sur la base configurée au lieu du fichier dédié (elle sera semée)")
+        parser.add_argument('--requests', type=int, default=50, help="Appels mesurés par endpoint")
+        parser.add_argument('--warmup', type=int, default=5, help="Appels non mesurés par endpoint")
+        parser.add_argument('--users', type=int, default=1000, help="Comptes synthétiques")
+        parser.add_argument('--only', default='', help="Endpoints à mesurer (noms séparés par des virgules)")
+        parser.add_argument('--with-cache', action='store_true',
+                            help="Garde le cache des réponses produits (désactivé par défaut)")
+        parser.add_argument('--output', default=None,
+                            help="Fichier JSON des résultats (benchmark-<date>.json par défaut)")
+        parser.add_argument('--compare', default=None, help="Résultats précédents (JSON) à comparer")
+        parser.add_argument('--threshold', type=float, default=0.2,
+                            help="Écart de p50/p95 signalé comme régression (0.2 = +20 %%)")
+        parser.add_argument('--fail-on-regression', action='store_true',
+                            help="Code de sortie non nul en cas de régression")
+
+    def handle(self, *args, **options):
+        try:
+            sizes = sorted({int(size) for size in options['sizes'].split(',') if size.strip()})
+        except ValueError:
+            raise CommandError("--sizes : entiers séparés par des virgules attendus")
+        if not sizes or sizes[0] < 1 or options['requests'] < 1:
+            raise CommandError("--sizes et --requests doivent être positifs")
+        previous = None
+        if options['compare']:
+            with open(options['compare'], encoding='utf-8') as f:
+                previous = json.load(f)
+
+        if not options['use_default_database']:
+            benchmark.use_sqlite_file(options['database'])
+            self.stderr.write(f"Base du banc d'essai : {connection.settings_dict['NAME']}")
+        call_command('migrate', verbosity=0, interactive=False)
+        token = benchmark.benchmark_token()
+
+        # Mesures sans DEBUG (pas de journal des requêtes SQL) ; le client de
+        # test se présente comme « testserver »
+        overrides = {'DEBUG': False, 'ALLOWED_HOSTS': [*settings.ALLOWED_HOSTS, 'testserver']}
+        if not options['with_cache']:
+            overrides['PRODUITS_CACHE_TIMEOUT'] = 0
+        only = {name.strip() for name in options['only'].split(',') if name.strip()}
+
+        results = {'meta': self.meta(options), 'sizes': {}}
+        with override_settings(**overrides):
+            client = Client(HTTP_AUTHORIZATION=f'Token {token}')
+            for size in sizes:
+                start = time.monotonic()
+                added = benchmark.seed_catalogue(size, log=lambda message: self.stderr.write(f"  {message}"))
+                benchmark.seed_users(options['users'])
+                seed_seconds = round(time.monotonic() - start, 2)
+                self.stdout.write(self.style.MIGRATE_HEADING(
+                    f"{size} produits ({added} ajoutés en {seed_seconds}s)"
+                ))
+                run = results['sizes'][str(size)] = {'seed_seconds': seed_seconds, 'endpoints': {}}
+                for name, url_for in benchmark.endpoints().items():
+                    if only and name not in only:
+                        continue
+                    stats = benchmark.measure(client, url_for, options['requests'], options['warmup'])
+                    run['endpoints'][name] = stats
+                    self.stdout.write(
+                        f"  {name:<24} {stats['status']}  p50 {stats['p50_ms']:8.2f} ms  "
+                        f"p95 {stats['p95_ms']:8.2f} ms  {stats['throughput_rps']:8.1f} req/s  "
+                        f"{stats['queries']:3d} requêtes  {stats['bytes']} octets"
+                    )
+
+        output = options['output'] or f"benchmark-{timezone.now():%Y%m%d-%H%M%S}.json"
+        with open(output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2, ensure_ascii=False)
+        self.stdout.write(self.style.SUCCESS(f"Résultats écrits dans {output}"))
+
+        if previous is not None:
+            regressions = benchmark.compare(previous, results, options['threshold'])
+            for size, name, metric, before, after, ratio in regressions:
+                change = f"+{ratio:.0%}" if ratio is not None else ''
+                self.stdout.write(self.style.WARNING(f"  {size} {name} {metric} : {before} -> {after} {change}"))
+            if not regressions:
+                self.stdout.write(self.style.SUCCESS("Aucune régression par rapport à " + options['compare']))
+            elif options['fail_on_regression']:
+                raise CommandError(f"{len(regressions)} régression(s)")
+
+    def meta(self, options):
+        try:
+            commit = subprocess.run(
+                ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                cwd=settings.BASE_DIR, timeout=5,
+            ).stdout.strip() or None
+        except (OSError, subprocess.SubprocessError):
+            commit = None
+        return {
+            'created_at': timezone.now().isoformat(),
+            'commit': commit,
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'database': connection.vendor,
+            'requests': options['requests'],
+            'warmup': options['warmup'],
+            'response_cache': options['with_cache'],
+        }
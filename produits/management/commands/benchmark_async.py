@@ -0,0 +1,101 @@
+import asyncio
+import json
+import os
+
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import override_settings
+
+from produits import benchmark
+
+MODES = ('sync', 'async')
+LATENCY_NOTE = (
+    "attente ajoutée à chaque requête SQL, dans tous les threads, par produits.benchmark.database_latency : "
+    "aller-retour d'une base distante"
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Banc d'essai ASGI : mêmes lectures du catalogue par les vues synchrones (DRF) et par les vues "
+        "asynchrones (produits.async_views), à plusieurs niveaux de concurrence dans un seul processus"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default=os.path.join(settings.BASE_DIR, 'benchmark.sqlite3'),
+                            help="Fichier SQLite du banc d'essai (réutilisé d'une exécution à l'autre)")
+        parser.add_argument('--use-default-database', action='store_true',
+                            help="Mesure sur la base configurée au lieu du fichier dédié (elle sera semée)")
+        parser.add_argument('--products', type=int, default=2000, help="Taille du catalogue semé")
+        parser.add_argument('--requests', type=int, default=200, help="Appels par mesure")
+        parser.add_argument('--concurrency', default='1,10,50',
+                            help="Appels simultanés, séparés par des virgules")
+        parser.add_argument('--threads', '--sync-threads', dest='threads', type=int, default=4,
+                            help="Threads de chaque mode : appels simultanés servis en synchrone, pool des vues "
+                                 "asynchrones (cf. benchmark.load) ; 0 : sans limite")
+        parser.add_argument('--db-latency-ms', type=float, default=2,
+                            help="Attente ajoutée à chaque requête SQL (base distante simulée)")
+        parser.add_argument('--only', default='', help="Endpoints à mesurer (noms séparés par des virgules)")
+        parser.add_argument('--output', default=None, help="Résultats en JSON")
+
+    def handle(self, *args, **options):
+        try:
+            levels = sorted({int(level) for level in options['concurrency'].split(',') if level.strip()})
+        except ValueError:
+            raise CommandError("--concurrency : entiers séparés par des virgules attendus")
+        if not levels or levels[0] < 1 or options['requests'] < 1 or options['threads'] < 0:
+            raise CommandError("--concurrency et --requests doivent être positifs")
+
+        if not options['use_default_database']:
+            benchmark.use_sqlite_file(options['database'])
+            self.stderr.write(f"Base du banc d'essai : {connection.settings_dict['NAME']}")
+        call_command('migrate', verbosity=0, interactive=False)
+        benchmark.seed_catalogue(options['products'], log=lambda message: self.stderr.write(f"  {message}"))
+        headers = {'Authorization': f'Token {benchmark.benchmark_token()}'}
+        only = {name.strip() for name in options['only'].split(',') if name.strip()}
+
+        results = {
+            'meta': {
+                'database': connection.vendor,
+                'products': options['products'],
+                'requests': options['requests'],
+                'threads': options['threads'] or None,
+                'db_latency_ms': options['db_latency_ms'],
+                'db_latency': LATENCY_NOTE,
+                'fanout': settings.PRODUITS_ASYNC_FANOUT,
+            },
+            'endpoints': {},
+        }
+        # Comme benchmark_api : sans DEBUG ni cache des réponses
+        overrides = {
+            'DEBUG': False, 'ALLOWED_HOSTS': [*settings.ALLOWED_HOSTS, 'testserver'], 'PRODUITS_CACHE_TIMEOUT': 0,
+        }
+        self.stdout.write(
+            f"Latence SQL simulée : {options['db_latency_ms']:g} ms par requête ({LATENCY_NOTE}) ; "
+            f"threads par mode : {options['threads'] or 'sans limite'}"
+        )
+        with override_settings(**overrides), benchmark.database_latency(options['db_latency_ms']):
+            for name, urls in benchmark.async_endpoints().items():
+                if only and name not in only:
+                    continue
+                self.stdout.write(self.style.MIGRATE_HEADING(name))
+                runs = results['endpoints'][name] = []
+                for level in levels:
+                    for mode, url_for in zip(MODES, urls):
+                        stats = asyncio.run(benchmark.load(
+                            url_for, options['requests'], level, headers, options['threads'], mode
+                        ))
+                        runs.append({'mode': mode, **stats})
+                        style = self.style.WARNING if stats['errors'] else self.style.SUCCESS
+                        self.stdout.write(style(
+                            f"  {mode:<5} x{level:<4} {stats['status']}  p50 {stats['p50_ms']:8.2f} ms  "
+                            f"p95 {stats['p95_ms']:8.2f} ms  {stats['throughput_rps']:8.1f} req/s  "
+                            f"{stats['peak_in_flight']:3d} en cours  {stats['peak_threads']:3d} threads en base"
+                        ))
+
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as f:
+                json.dump(results, f, indent=2, ensure_ascii=False)
+            self.stdout.write(self.style.SUCCESS(f"Résultats écrits dans {options['output']}"))
@@ -0,0 +1,83 @@
+import json
+import os
+import tempfile
+
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import override_settings
+
+from produits import benchmark
+
+# Modes SQLite comparés : PRAGMA appliqués à chaque connexion, mode de
+# transaction. « rollback » reproduit les réglages par défaut de SQLite et
+# Django (journal DELETE, transactions DEFERRED).
+SQLITE_MODES = {
+    'rollback': ({'journal_mode': 'DELETE', 'synchronous': 'FULL'}, 'DEFERRED'),
+    'wal': ({**settings.SQLITE_PRAGMAS, 'journal_mode': 'WAL'}, 'IMMEDIATE'),
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Banc d'essai de concurrence de la base : lecteurs et écrivains simultanés (threads) "
+        "sur SQLite en journal classique et en WAL, ou sur la base configurée (PostgreSQL avec pool...)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--modes', default=','.join(SQLITE_MODES),
+                            help=f"Modes SQLite comparés ({', '.join(SQLITE_MODES)})")
+        parser.add_argument('--use-default-database', action='store_true',
+                            help="Mesure la base configurée, telle quelle et déjà remplie, au lieu des modes SQLite")
+        parser.add_argument('--products', type=int, default=2000, help="Taille du catalogue semé par mode")
+        parser.add_argument('--readers', type=int, default=4, help="Threads lecteurs")
+        parser.add_argument('--writers', type=int, default=2, help="Threads écrivains")
+        parser.add_argument('--duration', type=float, default=5, help="Durée de chaque mesure (secondes)")
+        parser.add_argument('--output', default=None, help="Résultats en JSON")
+
+    def handle(self, *args, **options):
+        if options['duration'] <= 0 or options['readers'] + options['writers'] < 1:
+            raise CommandError("--duration et le nombre de threads doivent être positifs")
+        results = {}
+        if options['use_default_database']:
+            results['configured'] = self.run(options)
+        else:
+            modes = [mode.strip() for mode in options['modes'].split(',') if mode.strip()]
+            unknown = set(modes) - set(SQLITE_MODES)
+            if unknown:
+                raise CommandError(f"Modes inconnus : {', '.join(sorted(unknown))}")
+            with tempfile.TemporaryDirectory() as directory:
+                for mode in modes:
+                    results[mode] = self.run_sqlite(mode, os.path.join(directory, f'{mode}.sqlite3'), options)
+
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as f:
+                json.dump(results, f, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Résultats écrits dans {options['output']}"))
+
+    def run_sqlite(self, mode, path, options):
+        pragmas, transaction_mode = SQLITE_MODES[mode]
+        benchmark.use_sqlite_file(path)
+        db_options = connection.settings_dict['OPTIONS']
+        previous = db_options.get('transaction_mode')
+        db_options['transaction_mode'] = transaction_mode
+        try:
+            with override_settings(SQLITE_PRAGMAS=pragmas):
+                call_command('migrate', verbosity=0, interactive=False)
+                benchmark.seed_catalogue(options['products'])
+                return self.run(options, label=mode)
+        finally:
+            connection.close()
+            db_options['transaction_mode'] = previous
+
+    def run(self, options, label='configured'):
+        report = benchmark.concurrency(options['readers'], options['writers'], options['duration'])
+        for kind, stats in report.items():
+            style = self.style.WARNING if stats['errors'] else self.style.SUCCESS
+            self.stdout.write(style(
+                f"{label:<10} {kind:<6} {stats['threads']} threads  {stats['ops_per_second']:8.1f} op/s  "
+                f"p50 {stats['p50_ms'] or 0:8.2f} ms  p95 {stats['p95_ms'] or 0:8.2f} ms  "
+                f"p99 {stats['p99_ms'] or 0:8.2f} ms  {stats['errors']} erreur(s)"
+            ))
+        return report
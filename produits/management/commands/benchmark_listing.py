@@ -0,0 +1,65 @@
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext
+from rest_framework.renderers import JSONRenderer
+
+from produits.fastpath import ProductListing
+from produits.models import Product
+from produits.prefetch import plan_queryset
+from produits.serializers import ProductSerializer
+from storer.renderers import FastJSONRenderer
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare ProductSerializer + JSONRenderer et la lecture rapide (produits.fastpath) "
+        "sur les produits de la base : temps médian, requêtes, parité des octets"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limit', type=int, default=500, help="Nombre de produits listés")
+        parser.add_argument('--repeat', type=int, default=5, help="Nombre de mesures par chemin")
+        parser.add_argument('--host', default='localhost', help="Hôte des URL absolues (doit figurer dans ALLOWED_HOSTS)")
+
+    def handle(self, *args, **options):
+        if options['limit'] < 1 or options['repeat'] < 1:
+            raise CommandError("--limit et --repeat doivent être positifs")
+        ids = list(Product.objects.order_by('id').values_list('id', flat=True)[:options['limit']])
+        if not ids:
+            raise CommandError("Aucun produit en base (cf. seed_catalog)")
+        queryset = Product.objects.filter(pk__in=ids).order_by('id')
+        request = RequestFactory().get('/api/products/listing/', HTTP_HOST=options['host'])
+
+        def serializer_path():
+            data = ProductSerializer(
+                plan_queryset(queryset, ProductSerializer), many=True, context={'request': request}
+            ).data
+            return JSONRenderer().render(data)
+
+        def fast_path():
+            return FastJSONRenderer().render(ProductListing(request).build(queryset))
+
+        results = {}
+        for label, func in (('ProductSerializer', serializer_path), ('fastpath', fast_path)):
+            timings = []
+            for _ in range(options['repeat']):
+                with CaptureQueriesContext(connection) as ctx:
+                    start = time.perf_counter()
+                    body = func()
+                    timings.append(time.perf_counter() - start)
+            results[label] = (statistics.median(timings), len(ctx.captured_queries), body)
+            self.stdout.write(
+                f"{label:<18} {results[label][0] * 1000:9.1f} ms  "
+                f"{len(ctx.captured_queries):3d} requêtes  {len(body)} octets"
+            )
+
+        slow, fast = results['ProductSerializer'], results['fastpath']
+        if slow[2] != fast[2]:
+            raise CommandError("Sorties différentes : la lecture rapide n'est plus à parité")
+        self.stdout.write(self.style.SUCCESS(
+            f"{len(ids)} produits, sorties identiques, accélération x{slow[0] / fast[0]:.1f}"
+        ))
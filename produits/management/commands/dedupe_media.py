@@ -0,0 +1,93 @@
+from collections import Counter
+
+from django.core.files import File
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from produits.images import targets
+from produits.models import MediaBlob, Product, ProductImage
+from produits.signals import notify_products_changed
+from produits.storage import content_name, is_blob_name, media_storage
+
+
+class Command(BaseCommand):
+    help = (
+        "Range les photos produits et logos existants sous leur empreinte (un fichier par contenu), "
+        "supprime les doublons et recalcule les compteurs de références"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true',
+                            help="Affiche les doublons sans rien modifier")
+
+    def handle(self, *args, **options):
+        dry_run = options['dry_run']
+        storage = media_storage
+        moved = {}      # ancien nom -> nom par contenu (None : fichier absent)
+        freed = 0
+        changed = {kind: set() for kind in targets()}
+
+        for kind, (model, field, store) in targets().items():
+            rows = model.objects.exclude(**{f'{field}__isnull': True}).exclude(**{field: ''})
+            # Liste complète : la table est modifiée pendant le parcours
+            for pk, name, derivatives in list(rows.values_list('pk', field, store)):
+                if is_blob_name(name):
+                    continue
+                if name not in moved:
+                    if not storage.exists(name):
+                        self.stdout.write(self.style.WARNING(f"Fichier absent, ignoré : {name}"))
+                        moved[name] = None
+                        continue
+                    target = content_name(storage, name)
+                    if target in moved.values() or storage.exists(target):
+                        freed += storage.size(name)
+                    elif not dry_run:
+                        with storage.open(name, 'rb') as f:
+                            storage.save(name, File(f))
+                    moved[name] = target
+                target = moved[name]
+                if target is None or dry_run:
+                    continue
+                if derivatives and derivatives.get('source') == name:
+                    # Même contenu : les déclinaisons restent valables
+                    derivatives['source'] = target
+                model.objects.filter(pk=pk).update(**{field: target, store: derivatives or {}})
+                changed[kind].add(pk)
+
+        blobs = Counter(target for target in moved.values() if target)
+        for target, count in sorted(blobs.items()):
+            if count > 1:
+                self.stdout.write(f"{count} copies -> {target}")
+        if dry_run:
+            self.stdout.write(self.style.SUCCESS(
+                f"{len(moved)} fichiers à ranger dans {len(blobs)} blobs, {freed} octets récupérables"
+            ))
+            return
+
+        for name, target in moved.items():
+            if target and target != name:
+                storage.delete(name)
+        self.recount(storage)
+
+        product_ids = set(ProductImage.objects.filter(pk__in=changed['product-image']).values_list('product_id', flat=True))
+        product_ids.update(Product.objects.filter(brand_id__in=changed['brand']).values_list('id', flat=True))
+        notify_products_changed(product_ids)
+        self.stdout.write(self.style.SUCCESS(
+            f"{len(moved)} fichiers rangés dans {len(blobs)} blobs, {freed} octets libérés"
+        ))
+
+    def recount(self, storage):
+        """Recalcule MediaBlob depuis les références réelles en base."""
+        counts = Counter()
+        for model, field, _ in targets().values():
+            for name in model.objects.values_list(field, flat=True).iterator():
+                if name and is_blob_name(name):
+                    counts[name] += 1
+        with transaction.atomic():
+            MediaBlob.objects.exclude(name__in=list(counts)).delete()
+            existing = {blob.name: blob for blob in MediaBlob.objects.all()}
+            for name, count in counts.items():
+                blob = existing.get(name) or MediaBlob(name=name)
+                blob.refcount = count
+                blob.size = storage.size(name) if storage.exists(name) else 0
+                blob.save()
@@ -0,0 +1,70 @@
+import json
+import os
+
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client, override_settings
+
+from produits import benchmark, explain
+from produits.models import Product
+
+
+class Command(BaseCommand):
+    help = (
+        "Passe à EXPLAIN les requêtes SQL des principaux endpoints de l'API et signale "
+        "les parcours complets des grandes tables (produits, stocks, attributs, images, comptes)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default=os.path.join(settings.BASE_DIR, 'benchmark.sqlite3'),
+                            help="Fichier SQLite à analyser (celui de benchmark_api par défaut)")
+        parser.add_argument('--use-default-database', action='store_true',
+                            help="Analyse la base configurée au lieu du fichier dédié")
+        parser.add_argument('--only', default='', help="Endpoints à analyser (noms séparés par des virgules)")
+        parser.add_argument('--output', default=None, help="Rapport complet en JSON")
+        parser.add_argument('--fail-on-scan', action='store_true',
+                            help="Code de sortie non nul si un parcours complet est signalé")
+
+    def handle(self, *args, **options):
+        if not options['use_default_database']:
+            if not os.path.exists(options['database']):
+                raise CommandError(f"{options['database']} introuvable (cf. benchmark_api)")
+            benchmark.use_sqlite_file(options['database'])
+        call_command('migrate', verbosity=0, interactive=False)
+        if not Product.objects.exists():
+            raise CommandError("Aucun produit en base (cf. benchmark_api ou seed_catalog)")
+        token = benchmark.benchmark_token()
+
+        only = {name.strip() for name in options['only'].split(',') if name.strip()}
+        with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver'], PRODUITS_CACHE_TIMEOUT=0):
+            client = Client(HTTP_AUTHORIZATION=f'Token {token}')
+            urls = {
+                name: url_for(0) for name, url_for in benchmark.endpoints().items()
+                if not only or name in only
+            }
+            try:
+                report = explain.check(client, urls)
+            except NotImplementedError as e:
+                raise CommandError(str(e))
+
+        flagged = 0
+        for name, result in report.items():
+            scans = [query for query in result['queries'] if query['full_scans']]
+            flagged += len(scans)
+            style = self.style.WARNING if scans else self.style.SUCCESS
+            self.stdout.write(style(
+                f"{name:<24} {result['status']}  {len(result['queries']):2d} requêtes  "
+                f"{len(scans)} parcours complet(s)"
+            ))
+            for query in scans:
+                self.stdout.write(f"    {', '.join(query['full_scans'])} : {query['sql'][:160]}")
+                for step in query['plan']:
+                    self.stdout.write(f"      {step}")
+
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as f:
+                json.dump(report, f, indent=2, ensure_ascii=False)
+            self.stdout.write(f"Rapport écrit dans {options['output']}")
+        if flagged and options['fail_on_scan']:
+            raise CommandError(f"{flagged} requête(s) avec parcours complet")
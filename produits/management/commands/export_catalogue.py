@@ -0,0 +1,40 @@
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from produits.export import EXPORT_FORMATS, DEFAULT_CHUNK_SIZE, iter_products, iter_export
+
+
+class Command(BaseCommand):
+    help = "Exporte tout le catalogue produits en NDJSON ou en tableau JSON, par flux"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', choices=EXPORT_FORMATS, default='ndjson')
+        parser.add_argument('--output', type=str, default=None, help="Fichier de sortie (stdout par défaut)")
+        parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        if options['chunk_size'] < 1:
+            raise CommandError("--chunk-size doit être positif")
+
+        start = time.monotonic()
+        count = 0
+
+        def counted(products):
+            nonlocal count
+            for data in products:
+                count += 1
+                yield data
+
+        products = counted(iter_products(chunk_size=options['chunk_size']))
+        out = open(options['output'], 'w', encoding='utf-8') if options['output'] else sys.stdout
+        try:
+            for chunk in iter_export(products, options['format']):
+                out.write(chunk)
+        finally:
+            if out is not sys.stdout:
+                out.close()
+
+        elapsed = time.monotonic() - start
+        self.stderr.write(self.style.SUCCESS(f"{count} produits exportés en {elapsed:.2f}s"))
@@ -1,117 +1,127 @@
-import json
 import os
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
 from produits.models import (
     Category, Brand, ProductType,
     ProductAttribute, ProductAttributeOption,
     Warehouse
 )
+from produits.feeds import Feed, FeedError, FEED_FORMATS
 
 
 class Command(BaseCommand):
     help = "Load categories, brands, product types, attributes & options, and warehouses from product_info.json"
 
-    def handle(self, *args, **kwargs):
-        base_dir = os.path.dirname(os.path.abspath(__file__))
-        json_path = os.path.join(base_dir, 'product_info.json')
+    def add_arguments(self, parser):
+        parser.add_argument('--file', type=str, default=None,
+                            help='Path of the feed (JSON or NDJSON, optionally gzipped); defaults to product_info.json')
+        parser.add_argument('--format', choices=FEED_FORMATS, default='auto')
+        parser.add_argument('--progress-every', type=int, default=1000,
+                            help='Report progress every N records')
+
+    def handle(self, *args, **options):
+        json_path = options['file']
+        if not json_path:
+            base_dir = os.path.dirname(os.path.abspath(__file__))
+            json_path = os.path.join(base_dir, 'product_info.json')
         if not os.path.isfile(json_path):
-            self.stderr.write(self.style.ERROR(f"product_info.json not found in {base_dir}"))
-            return
-
-        with open(json_path, encoding='utf-8') as f:
-            data = json.load(f)
-
-        # --- Categories (handle parent-child relationships) ---
-        self.stdout.write("Importing categories...")
-        # We will first create all categories without parents, then iterate to create those with parents
-        name_to_category = {}
-        categories_created = 0
-
-        # First pass: parent=None categories
-        for cat_data in data.get("categories", []):
-            if cat_data.get("parent") is None:
-                cat, created = Category.objects.get_or_create(name=cat_data["name"], parent=None)
-                name_to_category[cat.name] = cat
-                if created:
-                    categories_created += 1
-
-        # Second pass: categories with parents
-        for cat_data in data.get("categories", []):
-            parent_name = cat_data.get("parent")
-            if parent_name:
-                parent_cat = name_to_category.get(parent_name)
-                if not parent_cat:
-                    # If parent not created yet, create it as parent=None
-                    parent_cat, _ = Category.objects.get_or_create(name=parent_name, parent=None)
-                    name_to_category[parent_name] = parent_cat
-                cat, created = Category.objects.get_or_create(name=cat_data["name"], parent=parent_cat)
-                name_to_category[cat.name] = cat
-                if created:
-                    categories_created += 1
-
-        self.stdout.write(self.style.SUCCESS(f"{categories_created} categories imported/updated."))
-
-        # --- Brands ---
-        self.stdout.write("Importing brands...")
-        brands_created = 0
-        for brand_name in data.get("brands", []):
-            _, created = Brand.objects.get_or_create(name=brand_name)
-            if created:
-                brands_created += 1
-        self.stdout.write(self.style.SUCCESS(f"{brands_created} brands imported/updated."))
-
-        # --- Product Types ---
-        self.stdout.write("Importing product types...")
-        product_types_created = 0
-        product_types_map = {}
-        for pt_name in data.get("product_types", []):
-            pt, created = ProductType.objects.get_or_create(name=pt_name)
-            product_types_map[pt_name] = pt
-            if created:
-                product_types_created += 1
-        self.stdout.write(self.style.SUCCESS(f"{product_types_created} product types imported/updated."))
-
-        # --- Product Attributes and Options ---
-        self.stdout.write("Importing product attributes and options...")
-        attributes_created = 0
-        options_created = 0
-        for attr_data in data.get("product_attributes", []):
-            pt_name = attr_data["product_type"]
-            pt = product_types_map.get(pt_name)
-            if not pt:
-                # Create product type if missing
-                pt, _ = ProductType.objects.get_or_create(name=pt_name)
-                product_types_map[pt_name] = pt
-
-            attribute, created_attr = ProductAttribute.objects.get_or_create(
-                name=attr_data["name"],
-                product_type=pt
-            )
-            if created_attr:
-                attributes_created += 1
-
-            for opt_val in attr_data.get("options", []):
-                _, created_opt = ProductAttributeOption.objects.get_or_create(
-                    attribute=attribute,
-                    value=opt_val
-                )
-                if created_opt:
-                    options_created += 1
-
+            raise CommandError(f"Feed not found: {json_path}")
+
+        # The feed is read one record at a time; lookups created so far are
+        # kept in small name -> object maps.
+        self.name_to_category = {}
+        self.product_types_map = {}
+        self.counts = dict.fromkeys(
+            ('categories', 'brands', 'product_types', 'product_attributes', 'options', 'warehouses'), 0
+        )
+        handlers = {
+            'categories': self.import_category,
+            'brands': self.import_brand,
+            'product_types': self.import_product_type,
+            'product_attributes': self.import_attribute,
+            'warehouses': self.import_warehouse,
+        }
+
+        self.stdout.write(f"Importing from {json_path}...")
+        every = max(1, options['progress_every'])
+        try:
+            with Feed(json_path, options['format']) as feed:
+                for seen, (section, item) in enumerate(feed.sections(), 1):
+                    handler = handlers.get(section)
+                    if handler is None:
+                        self.stderr.write(self.style.WARNING(f"Unknown section '{section}' skipped"))
+                        continue
+                    handler(item)
+                    if seen % every == 0:
+                        self.stdout.write(f"{seen} records read ({feed.progress():.0%})")
+        except FeedError as exc:
+            raise CommandError(f"Invalid feed: {exc}")
+
+        c = self.counts
+        self.stdout.write(self.style.SUCCESS(f"{c['categories']} categories imported/updated."))
+        self.stdout.write(self.style.SUCCESS(f"{c['brands']} brands imported/updated."))
+        self.stdout.write(self.style.SUCCESS(f"{c['product_types']} product types imported/updated."))
         self.stdout.write(self.style.SUCCESS(
-            f"{attributes_created} product attributes and {options_created} options imported/updated."
+            f"{c['product_attributes']} product attributes and {c['options']} options imported/updated."
         ))
+        self.stdout.write(self.style.SUCCESS(f"{c['warehouses']} warehouses imported/updated."))
+        self.stdout.write(self.style.SUCCESS("All product information loaded successfully."))
 
-        # --- Warehouses ---
-        self.stdout.write("Importing warehouses...")
-        warehouses_created = 0
-        for wh_data in data.get("warehouses", []):
-            _, created = Warehouse.objects.get_or_create(
-                name=wh_data["name"],
-                defaults={"location": wh_data.get("location", "")}
-            )
+    # --- Categories (a parent not seen yet is created at the root) ---
+    def import_category(self, cat_data):
+        parent_name = cat_data.get("parent")
+        parent_cat = None
+        if parent_name:
+            parent_cat = self.name_to_category.get(parent_name)
+            if not parent_cat:
+                parent_cat, _ = Category.objects.get_or_create(name=parent_name, parent=None)
+                self.name_to_category[parent_name] = parent_cat
+        cat, created = Category.objects.get_or_create(name=cat_data["name"], parent=parent_cat)
+        self.name_to_category[cat.name] = cat
+        if created:
+            self.counts['categories'] += 1
+
+    # --- Brands ---
+    def import_brand(self, brand_name):
+        _, created = Brand.objects.get_or_create(name=brand_name)
+        if created:
+            self.counts['brands'] += 1
+
+    # --- Product Types ---
+    def get_product_type(self, pt_name):
+        pt = self.product_types_map.get(pt_name)
+        if pt is None:
+            pt, created = ProductType.objects.get_or_create(name=pt_name)
+            self.product_types_map[pt_name] = pt
             if created:
-                warehouses_created += 1
-        self.stdout.write(self.style.SUCCESS(f"{warehouses_created} warehouses imported/updated."))
-
-        self.stdout.write(self.style.SUCCESS("All product information loaded successfully."))
+                self.counts['product_types'] += 1
+        return pt
+
+    def import_product_type(self, pt_name):
+        self.get_product_type(pt_name)
+
+    # --- Product Attributes and Options ---
+    def import_attribute(self, attr_data):
+        pt = self.get_product_type(attr_data["product_type"])
+        attribute, created_attr = ProductAttribute.objects.get_or_create(
+            name=attr_data["name"],
+            product_type=pt
+        )
+        if created_attr:
+            self.counts['product_attributes'] += 1
+
+        for opt_val in attr_data.get("options", []):
+            _, created_opt = ProductAttributeOption.objects.get_or_create(
+                attribute=attribute,
+                value=opt_val
+            )
+            if created_opt:
+                self.counts['options'] += 1
+
+    # --- Warehouses ---
+    def import_warehouse(self, wh_data):
+        _, created = Warehouse.objects.get_or_create(
+            name=wh_data["name"],
+            defaults={"location": wh_data.get("location", "")}
+        )
+        if created:
+            self.counts['warehouses'] += 1
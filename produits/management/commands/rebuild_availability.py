@@ -0,0 +1,16 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from produits.availability import rebuild_availability
+
+
+class Command(BaseCommand):
+    help = "Recalcule la table de disponibilité des produits depuis les stocks"
+
+    def handle(self, *args, **options):
+        start = time.monotonic()
+        total = rebuild_availability()
+        self.stdout.write(self.style.SUCCESS(
+            f"Disponibilité de {total} produits recalculée en {time.monotonic() - start:.2f}s"
+        ))
@@ -0,0 +1,17 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from produits.search import get_backend
+
+
+class Command(BaseCommand):
+    help = "Reconstruit l'index de recherche plein texte des produits"
+
+    def handle(self, *args, **options):
+        backend = get_backend()
+        start = time.monotonic()
+        total = backend.rebuild()
+        self.stdout.write(self.style.SUCCESS(
+            f"{total} produits indexés ({type(backend).__name__}) en {time.monotonic() - start:.2f}s"
+        ))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from produits.reservations import release_expired
+
+
+class Command(BaseCommand):
+    help = "Libère le stock des réservations arrivées à échéance (à lancer périodiquement)"
+
+    def handle(self, *args, **options):
+        count = release_expired()
+        self.stdout.write(self.style.SUCCESS(f"{count} réservation(s) expirée(s) libérée(s)"))
@@ -0,0 +1,52 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:43
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def build_category_paths(apps, schema_editor):
+    Category = apps.get_model('produits', 'Category')
+    parents = dict(Category.objects.values_list('id', 'parent_id'))
+    paths = {}
+
+    def resolve(pk, seen=()):
+        if pk not in paths:
+            parent_id = parents.get(pk)
+            if parent_id is None or parent_id in seen:
+                prefix, depth = '', 0
+            else:
+                prefix, depth = resolve(parent_id, seen + (pk,))
+                depth += 1
+            paths[pk] = (prefix + f"{pk:08d}/", depth)
+        return paths[pk]
+
+    categories = list(Category.objects.all())
+    for category in categories:
+        category.path, category.depth = resolve(category.pk)
+    Category.objects.bulk_update(categories, ['path', 'depth'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('produits', '0005_alter_stock_warehouse'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='category',
+            name='depth',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='category',
+            name='path',
+            field=models.CharField(db_index=True, default='', editable=False, max_length=255),
+        ),
+        migrations.AlterField(
+            model_name='stock',
+            name='warehouse',
+            field=models.ForeignKey(default=1, on_delete=django.db.models.deletion.CASCADE, to='produits.warehouse'),
+        ),
+        migrations.RunPython(build_category_paths, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,43 @@
+from django.db import migrations
+
+FTS_TABLE = 'produits_product_fts'
+
+
+def create_search_index(apps, schema_editor):
+    # Index FTS5 uniquement sous SQLite ; les autres bases utilisent un autre moteur
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+        "name, description, brand, category, attributes, "
+        "tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')"
+    )
+    schema_editor.execute(f"""
+        INSERT INTO {FTS_TABLE} (rowid, name, description, brand, category, attributes)
+        SELECT p.id, p.name, p.description, b.name, c.name,
+            (SELECT group_concat(a.name || ' ' || o.value, ' ')
+             FROM produits_productattributevalue v
+             JOIN produits_productattributeoption o ON o.id = v.option_id
+             JOIN produits_productattribute a ON a.id = o.attribute_id
+             WHERE v.product_id = p.id)
+        FROM produits_product p
+        JOIN produits_brand b ON b.id = p.brand_id
+        JOIN produits_category c ON c.id = p.category_id
+        WHERE p.is_active
+    """)
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute(f"DROP TABLE IF EXISTS {FTS_TABLE}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('produits', '0006_category_path'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
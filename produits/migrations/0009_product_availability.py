@@ -0,0 +1,52 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:51
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Sum
+
+
+def build_availability(apps, schema_editor):
+    Product = apps.get_model('produits', 'Product')
+    Stock = apps.get_model('produits', 'Stock')
+    ProductAvailability = apps.get_model('produits', 'ProductAvailability')
+    fields = ('units', 'units_sold', 'units_reserved')
+    rows = {pk: ProductAvailability(product_id=pk, per_warehouse=[]) for pk in Product.objects.values_list('id', flat=True)}
+    for stock in Stock.objects.values('product_id', 'warehouse_id', 'warehouse__name').annotate(
+        **{field: Sum(field) for field in fields}
+    ).order_by('product_id', 'warehouse__name', 'warehouse_id'):
+        row = rows[stock['product_id']]
+        for field in fields:
+            setattr(row, field, getattr(row, field) + stock[field])
+        row.per_warehouse.append({
+            'warehouse_id': stock['warehouse_id'], 'warehouse': stock['warehouse__name'],
+            **{field: stock[field] for field in fields},
+        })
+    for row in rows.values():
+        row.available_units = max(row.units - row.units_reserved, 0)
+    ProductAvailability.objects.bulk_create(rows.values(), batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('produits', '0008_stock_reservations'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductAvailability',
+            fields=[
+                ('product', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='availability', serialize=False, to='produits.product')),
+                ('units', models.PositiveIntegerField(default=0)),
+                ('units_sold', models.PositiveIntegerField(default=0)),
+                ('units_reserved', models.PositiveIntegerField(default=0)),
+                ('available_units', models.PositiveIntegerField(db_index=True, default=0)),
+                ('per_warehouse', models.JSONField(default=list)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name_plural': 'product availabilities',
+            },
+        ),
+        migrations.RunPython(build_availability, migrations.RunPython.noop),
+    ]
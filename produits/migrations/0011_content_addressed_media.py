@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:59
+
+import produits.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('produits', '0010_image_derivatives'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MediaBlob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255, unique=True)),
+                ('size', models.PositiveBigIntegerField(default=0)),
+                ('refcount', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AlterField(
+            model_name='brand',
+            name='logo',
+            field=models.ImageField(blank=True, null=True, storage=produits.storage.get_media_storage, upload_to='brands/logos/'),
+        ),
+        migrations.AlterField(
+            model_name='productimage',
+            name='image',
+            field=models.ImageField(storage=produits.storage.get_media_storage, upload_to='product_images/'),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:33
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('produits', '0012_catalogue_indexes'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='productattributevalue',
+            name='product',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='attribute_values', to='produits.product'),
+        ),
+        migrations.AlterField(
+            model_name='stock',
+            name='product',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='produits.product'),
+        ),
+    ]
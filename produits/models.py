@@ -1,19 +1,113 @@
+from django.conf import settings
 from django.db import models
+from django.db.models import F, Q, Value
+from django.db.models.functions import Concat, Substr
 from django.utils.text import slugify
 
+from .storage import get_media_storage
+
+def category_path_segment(pk):
+    # Segments de largeur fixe : l'ordre alphabétique des chemins suit l'arbre
+    return f"{pk:08d}/"
+
+
+def path_ids(path):
+    return [int(segment) for segment in path.split('/') if segment]
+
+
+class CategoryQuerySet(models.QuerySet):
+    def tree(self):
+        """Arbre complet, parents avant enfants, en une requête."""
+        return self.order_by('path')
+
+    def descendants_of(self, category, include_self=True):
+        queryset = self.filter(path__startswith=category.path)
+        if not include_self:
+            queryset = queryset.exclude(pk=category.pk)
+        return queryset.order_by('path')
+
+    def ancestors_of(self, category, include_self=False):
+        ids = path_ids(category.path)
+        if not include_self:
+            ids = ids[:-1]
+        return self.filter(pk__in=ids).order_by('depth')
+
+    def rebuild_paths(self):
+        """Recalcule path/depth de toute la taxonomie (après un bulk_create)."""
+        parents = dict(self.model.objects.values_list('id', 'parent_id'))
+        paths = {}
+
+        def resolve(pk, seen=()):
+            if pk not in paths:
+                parent_id = parents.get(pk)
+                if parent_id is None or parent_id in seen:
+                    prefix, depth = '', 0
+                else:
+                    prefix, depth = resolve(parent_id, seen + (pk,))
+                    depth += 1
+                paths[pk] = (prefix + category_path_segment(pk), depth)
+            return paths[pk]
+
+        changed = []
+        for category in self.model.objects.only('path', 'depth'):
+            path, depth = resolve(category.pk)
+            if (category.path, category.depth) != (path, depth):
+                category.path, category.depth = path, depth
+                changed.append(category)
+        self.model.objects.bulk_update(changed, ['path', 'depth'], batch_size=500)
+        return len(changed)
+
+
 class Category(models.Model):
     name = models.CharField(max_length=255)
     parent = models.ForeignKey('self', null=True, blank=True, on_delete=models.SET_NULL, related_name='children')
+    # Chemin matérialisé ("00000001/00000004/") maintenu à chaque enregistrement
+    path = models.CharField(max_length=255, db_index=True, editable=False, default='')
+    depth = models.PositiveIntegerField(default=0, editable=False)
+
+    objects = CategoryQuerySet.as_manager()
 
     class Meta:
         verbose_name_plural = "Categories"
+        indexes = [
+            # Recherche par (nom, parent) : import du catalogue, get_or_create
+            models.Index(fields=['name', 'parent'], name='category_name_parent_idx'),
+        ]
+
+    def save(self, *args, **kwargs):
+        parent = self.parent
+        if parent is not None and self.path and parent.path.startswith(self.path):
+            raise ValueError("Une catégorie ne peut pas être déplacée sous sa propre descendance.")
+        super().save(*args, **kwargs)
+
+        old_path, old_depth = self.path, self.depth
+        prefix = parent.path if parent is not None else ''
+        self.path = prefix + category_path_segment(self.pk)
+        self.depth = parent.depth + 1 if parent is not None else 0
+        if (self.path, self.depth) == (old_path, old_depth):
+            return
+        Category.objects.filter(pk=self.pk).update(path=self.path, depth=self.depth)
+        if old_path:
+            # Déplacement : on réécrit le préfixe de toute la sous-arborescence
+            Category.objects.filter(path__startswith=old_path).exclude(pk=self.pk).update(
+                path=Concat(Value(self.path), Substr('path', len(old_path) + 1)),
+                depth=F('depth') + (self.depth - old_depth),
+            )
+
+    def get_descendants(self, include_self=False):
+        return Category.objects.descendants_of(self, include_self=include_self)
+
+    def get_ancestors(self, include_self=False):
+        return Category.objects.ancestors_of(self, include_self=include_self)
 
     def __str__(self):
         return self.name
 
 class Brand(models.Model):
     name = models.CharField(max_length=255, unique=True)
-    logo = models.ImageField(upload_to='brands/logos/', blank=True, null=True)
+    logo = models.ImageField(upload_to='brands/logos/', storage=get_media_storage, blank=True, null=True)
+    # Déclinaisons redimensionnées du logo (cf. produits.images)
+    logo_derivatives = models.JSONField(default=dict, blank=True, editable=False)
 
     def __str__(self):
         return self.name
@@ -36,6 +130,15 @@ class Product(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            # Pagination par clé des listes (keyset_ordering = created_at, id)
+            models.Index(fields=['created_at', 'id'], name='product_created_idx'),
+            # Produits actifs par prix : index des facettes, tri par prix
+            models.Index(fields=['price', 'id'], condition=Q(is_active=True), name='product_active_price_idx'),
+            models.Index(fields=['name'], name='product_name_idx'),
+        ]
+
     def save(self, *args, **kwargs):
         if not self.slug:
             self.slug = slugify(self.name)
@@ -46,9 +149,11 @@ class Product(models.Model):
 
 class ProductImage(models.Model):
     product = models.ForeignKey('Product', on_delete=models.CASCADE, related_name='images')
-    image = models.ImageField(upload_to='product_images/')
+    image = models.ImageField(upload_to='product_images/', storage=get_media_storage)
     is_feature = models.BooleanField(default=False)
     alt_text = models.CharField(max_length=255, blank=True)
+    # Déclinaisons redimensionnées (cf. produits.images)
+    derivatives = models.JSONField(default=dict, blank=True, editable=False)
 
     def __str__(self):
         return f"Image for {self.product.name}"
@@ -73,9 +178,16 @@ class ProductAttributeOption(models.Model):
         return f"{self.attribute.name}: {self.value}"
 
 class ProductAttributeValue(models.Model):
-    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='attribute_values')
+    # Index simple inutile : préfixe de attrvalue_product_option_idx
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='attribute_values', db_index=False)
     option = models.ForeignKey(ProductAttributeOption, on_delete=models.CASCADE, related_name='product_values')
 
+    class Meta:
+        indexes = [
+            # Couvrant : valeurs d'un produit et lecture (produit, option) des facettes
+            models.Index(fields=['product', 'option'], name='attrvalue_product_option_idx'),
+        ]
+
     def __str__(self):
         return f"{self.product.name} - {self.option.attribute.name}: {self.option.value}"
 
@@ -86,8 +198,82 @@ class Warehouse(models.Model):
     def __str__(self):
         return self.name    
 class Stock(models.Model):
-    product = models.ForeignKey(Product, on_delete=models.CASCADE)
+    # Index simple inutile : préfixe de stock_product_warehouse_idx
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, db_index=False)
     warehouse = models.ForeignKey(Warehouse, on_delete=models.CASCADE , default=1)
     units = models.PositiveIntegerField(default=0)  # ex
     units_sold = models.PositiveIntegerField(default=0)
+    # Unités bloquées par des réservations en cours (disponible = units - units_reserved)
+    units_reserved = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            # Stock d'un produit dans un entrepôt : réservations, import
+            models.Index(fields=['product', 'warehouse'], name='stock_product_warehouse_idx'),
+        ]
+
+
+class MediaBlob(models.Model):
+    """Fichier média stocké par contenu, avec le nombre de lignes qui le référencent."""
+    name = models.CharField(max_length=255, unique=True)
+    size = models.PositiveBigIntegerField(default=0)
+    refcount = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.name} ({self.refcount})"
+
+
+class ProductAvailability(models.Model):
+    """
+    Disponibilité agrégée d'un produit, recalculée à chaque écriture sur ses
+    stocks (cf. produits.availability) : lue par jointure, sans agréger Stock.
+    """
+    product = models.OneToOneField(Product, on_delete=models.CASCADE, primary_key=True, related_name='availability')
+    units = models.PositiveIntegerField(default=0)
+    units_sold = models.PositiveIntegerField(default=0)
+    units_reserved = models.PositiveIntegerField(default=0)
+    available_units = models.PositiveIntegerField(default=0, db_index=True)
+    # [{"warehouse_id", "warehouse", "units", "units_sold", "units_reserved"}, ...]
+    per_warehouse = models.JSONField(default=list)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name_plural = 'product availabilities'
+
+    def __str__(self):
+        return f"{self.product_id} : {self.available_units} disponible(s)"
+
+
+class StockReservation(models.Model):
+    PENDING = 'pending'
+    CONFIRMED = 'confirmed'
+    RELEASED = 'released'
+    EXPIRED = 'expired'
+    STATUS_CHOICES = [
+        (PENDING, 'En attente'),
+        (CONFIRMED, 'Confirmée'),
+        (RELEASED, 'Libérée'),
+        (EXPIRED, 'Expirée'),
+    ]
+
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, null=True, blank=True, on_delete=models.SET_NULL, related_name='stock_reservations')
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=PENDING)
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField()
+
+    class Meta:
+        indexes = [models.Index(fields=['status', 'expires_at'])]
+
+    def __str__(self):
+        return f"Réservation #{self.pk} ({self.get_status_display()})"
+
+
+class StockReservationLine(models.Model):
+    reservation = models.ForeignKey(StockReservation, on_delete=models.CASCADE, related_name='lines')
+    stock = models.ForeignKey(Stock, on_delete=models.CASCADE, related_name='reservation_lines')
+    quantity = models.PositiveIntegerField()
+
+    def __str__(self):
+        return f"{self.quantity} x {self.stock.product.name} ({self.stock.warehouse.name})"
     
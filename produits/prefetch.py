@@ -0,0 +1,212 @@
+from functools import lru_cache
+
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Prefetch
+from rest_framework import serializers
+from rest_framework.exceptions import ValidationError
+
+
+# Planification des requêtes : on parcourt l'arbre des serializers imbriqués
+# pour en déduire les select_related / Prefetch nécessaires, afin qu'une liste
+# de produits coûte un nombre constant de requêtes quelle que soit sa taille.
+
+def _resolve_relation(model, name):
+    """Retourne (champ, est_multiple) pour une relation du modèle, ou None."""
+    try:
+        field = model._meta.get_field(name)
+    except FieldDoesNotExist:
+        # Relations inverses sans related_name (ex: stock_set)
+        for rel in model._meta.related_objects:
+            if rel.get_accessor_name() == name:
+                field = rel
+                break
+        else:
+            return None
+    if not field.is_relation:
+        return None
+    return field, bool(field.one_to_many or field.many_to_many)
+
+
+def _unwrap(field):
+    if isinstance(field, serializers.ListSerializer):
+        return field.child
+    if isinstance(field, serializers.ManyRelatedField):
+        return field.child_relation
+    return field
+
+
+def _plan(model, serializer):
+    """Retourne (select, prefetch) ; prefetch = [(lookup, modèle, sous-plan)]."""
+    select, prefetch = [], []
+    for field in serializer.fields.values():
+        if field.write_only or field.source == '*':
+            continue
+        nested = _unwrap(field)
+        bits = field.source.split('.')
+
+        if isinstance(nested, serializers.BaseSerializer) or isinstance(field, serializers.ManyRelatedField):
+            resolved = _resolve_relation(model, field.source) if len(bits) == 1 else None
+            if resolved is None:
+                continue
+            rel_field, many = resolved
+            related = rel_field.related_model
+            if not isinstance(nested, serializers.BaseSerializer):
+                # Liste de clés primaires : une requête par relation, pas par ligne
+                prefetch.append((field.source, related, ([], [])))
+                continue
+            child_select, child_prefetch = _plan(related, nested)
+            if many:
+                prefetch.append((field.source, related, (child_select, child_prefetch)))
+            else:
+                select.append(field.source)
+                select.extend(f'{field.source}__{s}' for s in child_select)
+                prefetch.extend(
+                    (f'{field.source}__{lookup}', m, sub) for lookup, m, sub in child_prefetch
+                )
+            continue
+
+        # Source pointée (ex: 'brand.name') ou champ relationnel affiché
+        # autrement que par sa clé : jointure sur les relations traversées.
+        if not isinstance(field, serializers.RelatedField) or field.use_pk_only_optimization():
+            bits = bits[:-1]
+        path, current = [], model
+        for bit in bits:
+            resolved = _resolve_relation(current, bit)
+            if resolved is None or resolved[1]:
+                break
+            path.append(bit)
+            current = resolved[0].related_model
+        if path:
+            select.append('__'.join(path))
+    return select, prefetch
+
+
+@lru_cache(maxsize=None)
+def _plan_for_class(serializer_class):
+    return _plan(serializer_class.Meta.model, serializer_class())
+
+
+def _build_prefetch(lookup, model, plan):
+    select, prefetch = plan
+    queryset = model._default_manager.all()
+    if select:
+        queryset = queryset.select_related(*select)
+    if prefetch:
+        queryset = queryset.prefetch_related(*(_build_prefetch(*p) for p in prefetch))
+    return Prefetch(lookup, queryset=queryset)
+
+
+def apply_plan(queryset, plan):
+    select, prefetch = plan
+    if select:
+        queryset = queryset.select_related(*select)
+    if prefetch:
+        queryset = queryset.prefetch_related(*(_build_prefetch(*p) for p in prefetch))
+    return queryset
+
+
+def plan_queryset(queryset, serializer):
+    """
+    Applique au queryset les jointures et préchargements requis par le
+    serializer (classe ou instance).
+    """
+    if isinstance(serializer, type):
+        return apply_plan(queryset, _plan_for_class(serializer))
+    return apply_plan(queryset, _plan(queryset.model, serializer))
+
+
+class PlannedQuerysetMixin:
+    """Mixin de vue générique : planifie le queryset selon le serializer utilisé."""
+
+    def get_queryset(self):
+        return apply_plan(super().get_queryset(), self.get_query_plan())
+
+    def get_query_plan(self):
+        return _plan_for_class(self.get_serializer_class())
+
+
+# --- Champs à la demande (?fields= / ?expand=) -------------------------------
+#
+# ?fields=id,name,brand.name ne garde que les champs cités (chemins pointés
+# pour les serializers imbriqués). ?expand=brand,images.product ne déploie que
+# les relations citées : les autres sont rendues par leur clé primaire (liste
+# de clés pour les relations multiples). Sans ces paramètres, l'arbre complet.
+# Le queryset est planifié sur le serializer élagué : une relation absente ne
+# coûte ni jointure ni préchargement.
+
+def parse_paths(value):
+    """'id,brand.name' -> {'id': {}, 'brand': {'name': {}}} ; None si absent."""
+    if value is None:
+        return None
+    tree = {}
+    for path in value.split(','):
+        node = tree
+        for bit in filter(None, path.strip().split('.')):
+            node = node.setdefault(bit, {})
+    return tree
+
+
+def prune_serializer(serializer, only=None, expand=None):
+    """Élague serializer.fields selon les arbres only (?fields) et expand (?expand)."""
+    errors = []
+    _prune(serializer, only, expand, '', errors)
+    if errors:
+        raise ValidationError({'fields': [f"Champ inconnu ou non déployable : {path}" for path in errors]})
+
+
+def _prune(serializer, only, expand, prefix, errors):
+    fields = serializer.fields
+    errors.extend(prefix + name for name in {**(only or {}), **(expand or {})} if name not in fields)
+    for name in list(fields):
+        field = fields[name]
+        if only is not None and name not in only:
+            del fields[name]
+            continue
+        nested = _unwrap(field)
+        if not isinstance(nested, serializers.BaseSerializer):
+            if expand and name in expand:
+                errors.append(prefix + name)
+            continue
+        sub_only = (only or {}).get(name) or None
+        if expand is not None and name not in expand and sub_only is None:
+            # Relation non déployée : clé(s) primaire(s), lue(s) sans jointure
+            kwargs = {'read_only': True, 'many': isinstance(field, serializers.ListSerializer)}
+            if field.source != name:
+                kwargs['source'] = field.source
+            fields[name] = serializers.PrimaryKeyRelatedField(**kwargs)
+            continue
+        _prune(nested, sub_only, None if expand is None else expand.get(name, {}), f'{prefix}{name}.', errors)
+
+
+@lru_cache(maxsize=256)
+def _sparse_plan(serializer_class, fields, expand):
+    serializer = serializer_class()
+    prune_serializer(serializer, parse_paths(fields), parse_paths(expand))
+    return _plan(serializer_class.Meta.model, serializer)
+
+
+class SparseFieldsetMixin(PlannedQuerysetMixin):
+    """PlannedQuerysetMixin avec ?fields= et ?expand= sur les GET."""
+
+    def get_sparse_fieldset(self):
+        params = self.request.query_params
+        if self.request.method != 'GET' or ('fields' not in params and 'expand' not in params):
+            return None
+        return params.get('fields') or None, params.get('expand')
+
+    def get_query_plan(self):
+        sparse = self.get_sparse_fieldset()
+        if sparse is None:
+            return super().get_query_plan()
+        return _sparse_plan(self.get_serializer_class(), *sparse)
+
+    def get_serializer(self, *args, **kwargs):
+        serializer = super().get_serializer(*args, **kwargs)
+        sparse = self.get_sparse_fieldset()
+        if sparse is not None:
+            fields, expand = sparse
+            prune_serializer(
+                serializer.child if isinstance(serializer, serializers.ListSerializer) else serializer,
+                parse_paths(fields), parse_paths(expand),
+            )
+        return serializer
@@ -0,0 +1,235 @@
+import random
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import OperationalError, connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Stock, StockReservation, StockReservationLine
+from .signals import notify_products_changed
+
+# Réservations de stock.
+#
+# Une réservation bloque des unités (Stock.units_reserved) sur un ou plusieurs
+# entrepôts, pour toutes ses lignes ou pour aucune. Chaque incrément est un
+# UPDATE conditionnel (units >= units_reserved + quantité) : deux réservations
+# concurrentes ne peuvent pas dépasser le stock, même sans verrou de ligne.
+# Là où la base le permet, les lignes de stock sont en plus verrouillées
+# (SELECT ... FOR UPDATE) pour éviter les tentatives perdues.
+
+DEFAULT_TTL = 15 * 60
+MAX_ATTEMPTS = 10
+
+
+class ReservationError(Exception):
+    pass
+
+
+class InsufficientStock(ReservationError):
+
+    def __init__(self, product_id, requested, available):
+        self.product_id = product_id
+        self.requested = requested
+        self.available = available
+        super().__init__(
+            f"Stock insuffisant pour le produit {product_id} : {requested} demandé(s), {available} disponible(s)"
+        )
+
+
+class ReservationClosed(ReservationError):
+
+    def __init__(self, reservation):
+        self.reservation = reservation
+        super().__init__(f"La réservation #{reservation.pk} est {reservation.get_status_display().lower()}.")
+
+
+def get_ttl():
+    return getattr(settings, 'PRODUITS_RESERVATION_TTL', DEFAULT_TTL)
+
+
+def _retry_on_lock(func):
+    """
+    SQLite refuse parfois immédiatement un verrou d'écriture (database is
+    locked) ; la transaction entière est alors rejouée. Jamais à l'intérieur
+    d'une transaction englobante, qui serait déjà compromise.
+    """
+    def wrapper(*args, **kwargs):
+        for attempt in range(MAX_ATTEMPTS):
+            try:
+                return func(*args, **kwargs)
+            except OperationalError as exc:
+                if connection.in_atomic_block or 'locked' not in str(exc) or attempt == MAX_ATTEMPTS - 1:
+                    raise
+                time.sleep(random.uniform(0, min(0.2, 0.005 * 2 ** attempt)))
+    wrapper.__name__ = func.__name__
+    wrapper.__doc__ = func.__doc__
+    return wrapper
+
+
+def _locked(queryset):
+    if connection.features.has_select_for_update:
+        return queryset.select_for_update()
+    return queryset
+
+
+def _merge(lines):
+    """Regroupe les lignes identiques : {(produit, entrepôt ou None): quantité}."""
+    merged = {}
+    for line in lines:
+        key = (line['product'], line.get('warehouse'))
+        merged[key] = merged.get(key, 0) + line['quantity']
+    return merged
+
+
+def _lock_order(item):
+    # Sans entrepôt (None) avant les entrepôts explicites d'un même produit
+    (product_id, warehouse_id), _ = item
+    return product_id, warehouse_id is not None, warehouse_id or 0
+
+
+def _take(stock_id, available, wanted):
+    """Réserve jusqu'à wanted unités sur un stock ; renvoie le nombre obtenu."""
+    while available > 0:
+        quantity = min(wanted, available)
+        updated = Stock.objects.filter(
+            pk=stock_id, units__gte=F('units_reserved') + quantity
+        ).update(units_reserved=F('units_reserved') + quantity)
+        if updated:
+            return quantity
+        # Une autre réservation est passée entre-temps : on relit le disponible
+        available = Stock.objects.filter(pk=stock_id).values_list(
+            F('units') - F('units_reserved'), flat=True
+        ).first() or 0
+    return 0
+
+
+def _notify(product_ids):
+    # Les update() ne déclenchent pas post_save. Hors de la transaction
+    # rejouable : une réservation validée ne doit jamais être refaite.
+    transaction.on_commit(lambda: _retry_on_lock(notify_products_changed)(product_ids, Stock))
+
+
+def reserve(lines, ttl=None, user=None):
+    """
+    Réserve les lignes [{'product': id, 'quantity': n, 'warehouse': id|None}].
+    Sans entrepôt, la quantité est répartie sur les entrepôts les mieux
+    fournis. Lève InsufficientStock (et n'écrit rien) si une ligne ne peut
+    pas être servie entièrement.
+    """
+    release_expired()
+    ttl = get_ttl() if ttl is None else ttl
+    wanted = _merge(lines)
+    reservation = _reserve(wanted, ttl, user)
+    _notify({product_id for product_id, _ in wanted})
+    return reservation
+
+
+@_retry_on_lock
+def _reserve(wanted, ttl, user):
+    with transaction.atomic():
+        reservation = StockReservation.objects.create(
+            user=user, expires_at=timezone.now() + timedelta(seconds=ttl)
+        )
+        reserved = []
+        # Verrous pris dans le même ordre par toutes les réservations (produit,
+        # puis clé primaire du stock) : pas d'interblocage entre deux paniers
+        for (product_id, warehouse_id), quantity in sorted(wanted.items(), key=_lock_order):
+            stocks = Stock.objects.filter(product_id=product_id)
+            if warehouse_id is not None:
+                stocks = stocks.filter(warehouse_id=warehouse_id)
+            candidates = sorted(
+                _locked(stocks).order_by('pk').annotate(
+                    available=F('units') - F('units_reserved')
+                ).filter(available__gt=0).values_list('id', 'available'),
+                key=lambda row: (-row[1], row[0]),
+            )
+
+            remaining = quantity
+            for stock_id, available in candidates:
+                taken = _take(stock_id, available, remaining)
+                if taken:
+                    reserved.append(StockReservationLine(reservation=reservation, stock_id=stock_id, quantity=taken))
+                    remaining -= taken
+                if not remaining:
+                    break
+            if remaining:
+                # L'exception annule la transaction : rien n'est réservé
+                raise InsufficientStock(product_id, quantity, quantity - remaining)
+        StockReservationLine.objects.bulk_create(reserved)
+    return reservation
+
+
+def _close(reservation_id, status, apply):
+    """
+    Passe une réservation en attente à status puis applique apply(ligne) à
+    chacune de ses lignes. La transition est un UPDATE conditionnel : une
+    seule confirmation ou libération peut l'emporter.
+    """
+    reservation, product_ids = _close_atomic(reservation_id, status, apply)
+    _notify(product_ids)
+    return reservation
+
+
+@_retry_on_lock
+def _close_atomic(reservation_id, status, apply):
+    with transaction.atomic():
+        closed = StockReservation.objects.filter(
+            pk=reservation_id, status=StockReservation.PENDING
+        ).update(status=status)
+        reservation = StockReservation.objects.get(pk=reservation_id)
+        if not closed:
+            raise ReservationClosed(reservation)
+        lines = list(reservation.lines.select_related('stock'))
+        for line in lines:
+            apply(line)
+    return reservation, {line.stock.product_id for line in lines}
+
+
+def _unreserve(line):
+    Stock.objects.filter(
+        pk=line.stock_id, units_reserved__gte=line.quantity
+    ).update(units_reserved=F('units_reserved') - line.quantity)
+
+
+def _sell(line):
+    updated = Stock.objects.filter(
+        pk=line.stock_id, units_reserved__gte=line.quantity, units__gte=line.quantity
+    ).update(
+        units=F('units') - line.quantity,
+        units_reserved=F('units_reserved') - line.quantity,
+        units_sold=F('units_sold') + line.quantity,
+    )
+    if not updated:
+        # Stock modifié à la main sous la réservation
+        raise InsufficientStock(line.stock.product_id, line.quantity, 0)
+
+
+def confirm(reservation_id):
+    """Transforme les unités réservées en ventes (units -> units_sold)."""
+    reservation = StockReservation.objects.get(pk=reservation_id)
+    if reservation.status == StockReservation.PENDING and reservation.expires_at <= timezone.now():
+        release(reservation_id, status=StockReservation.EXPIRED)
+    return _close(reservation_id, StockReservation.CONFIRMED, _sell)
+
+
+def release(reservation_id, status=StockReservation.RELEASED):
+    """Rend les unités réservées au stock disponible."""
+    return _close(reservation_id, status, _unreserve)
+
+
+@_retry_on_lock
+def release_expired(now=None):
+    """Libère les réservations en attente arrivées à échéance ; renvoie leur nombre."""
+    expired = StockReservation.objects.filter(
+        status=StockReservation.PENDING, expires_at__lte=now or timezone.now()
+    ).values_list('id', flat=True)
+    count = 0
+    for reservation_id in list(expired):
+        try:
+            release(reservation_id, status=StockReservation.EXPIRED)
+        except ReservationClosed:
+            continue  # confirmée ou libérée entre-temps
+        count += 1
+    return count
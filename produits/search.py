@@ -0,0 +1,155 @@
+import re
+import unicodedata
+from collections import defaultdict
+from functools import reduce
+from itertools import islice
+from operator import or_
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils.module_loading import import_string
+
+from .models import Product, ProductAttributeValue
+
+# Recherche plein texte sur les produits : nom, description, marque,
+# catégorie et valeurs d'attributs. Index FTS5 sous SQLite, moteur
+# interchangeable via PRODUITS_SEARCH_BACKEND ailleurs.
+
+FTS_TABLE = 'produits_product_fts'
+COLUMNS = ('name', 'description', 'brand', 'category', 'attributes')
+# Poids bm25 par colonne, dans l'ordre de COLUMNS
+WEIGHTS = (10.0, 1.0, 4.0, 3.0, 2.0)
+INDEX_CHUNK = 500
+
+
+def fold(text):
+    """Minuscules sans accents : « Écran » -> « ecran »."""
+    decomposed = unicodedata.normalize('NFKD', text)
+    return ''.join(c for c in decomposed if not unicodedata.combining(c)).lower()
+
+
+def tokenize(query):
+    return re.findall(r'\w+', fold(query))
+
+
+def iter_documents(product_ids):
+    """(id, {colonne: texte}) pour chaque produit actif parmi product_ids."""
+    attributes = defaultdict(list)
+    for product_id, value, name in ProductAttributeValue.objects.filter(
+        product_id__in=product_ids
+    ).values_list('product_id', 'option__value', 'option__attribute__name'):
+        attributes[product_id].append(f'{name} {value}')
+    for pk, name, description, brand, category in Product.objects.filter(
+        pk__in=product_ids, is_active=True
+    ).values_list(
+        'id', 'name', 'description', 'brand__name', 'category__name'
+    ):
+        yield pk, {
+            'name': name, 'description': description, 'brand': brand,
+            'category': category, 'attributes': ' '.join(attributes[pk]),
+        }
+
+
+class BaseSearchBackend:
+
+    def index_products(self, product_ids):
+        """
+        (Ré)indexe les produits ; ceux qui n'existent plus ou sont inactifs
+        sont retirés (LIMIT de la recherche appliqué aux seuls produits actifs).
+        """
+        raise NotImplementedError
+
+    def search(self, query, limit=20):
+        """Ids des produits correspondants, du plus pertinent au moins pertinent."""
+        raise NotImplementedError
+
+    def rebuild(self):
+        ids = Product.objects.filter(is_active=True).values_list('id', flat=True).iterator(chunk_size=INDEX_CHUNK)
+        total = 0
+        while chunk := list(islice(ids, INDEX_CHUNK)):
+            self.index_products(chunk)
+            total += len(chunk)
+        return total
+
+
+class SQLiteFTSBackend(BaseSearchBackend):
+    """FTS5 : tokenizer unicode61 sans diacritiques, index de préfixes, tri bm25."""
+
+    def index_products(self, product_ids):
+        product_ids = list(product_ids)
+        if not product_ids:
+            return
+        rows = [(pk, *(doc[column] for column in COLUMNS)) for pk, doc in iter_documents(product_ids)]
+        # DELETE + INSERT d'un seul tenant : deux réindexations simultanées
+        # du même produit ne doivent pas s'entrelacer
+        with transaction.atomic(), connection.cursor() as cursor:
+            for start in range(0, len(product_ids), INDEX_CHUNK):
+                chunk = product_ids[start:start + INDEX_CHUNK]
+                cursor.execute(
+                    f"DELETE FROM {FTS_TABLE} WHERE rowid IN ({', '.join(['%s'] * len(chunk))})", chunk
+                )
+            cursor.executemany(
+                f"INSERT INTO {FTS_TABLE} (rowid, {', '.join(COLUMNS)}) "
+                f"VALUES (%s, {', '.join(['%s'] * len(COLUMNS))})",
+                rows,
+            )
+
+    def match_expression(self, query):
+        # Chaque mot est un préfixe ; tous doivent être présents
+        return ' '.join(f'"{token}"*' for token in tokenize(query))
+
+    def search(self, query, limit=20):
+        expression = self.match_expression(query)
+        if not expression:
+            return []
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s "
+                f"ORDER BY bm25({FTS_TABLE}, {', '.join(map(str, WEIGHTS))}) LIMIT %s",
+                [expression, limit],
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+    def rebuild(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {FTS_TABLE}")
+        return super().rebuild()
+
+
+class DatabaseSearchBackend(BaseSearchBackend):
+    """
+    Repli sans index dédié (autres bases) : icontains sur chaque mot, les
+    correspondances sur le nom d'abord. Sans repli des accents.
+    """
+    lookups = (
+        'name__icontains', 'description__icontains', 'brand__name__icontains',
+        'category__name__icontains', 'attribute_values__option__value__icontains',
+    )
+
+    def index_products(self, product_ids):
+        pass
+
+    def search(self, query, limit=20):
+        words = re.findall(r'\w+', query)
+        if not words:
+            return []
+        queryset = Product.objects.filter(is_active=True)
+        for word in words:
+            queryset = queryset.filter(reduce(or_, (Q(**{lookup: word}) for lookup in self.lookups)))
+        in_name = Q(*(Q(name__icontains=word) for word in words))
+        ids = list(queryset.filter(in_name).values_list('id', flat=True).distinct()[:limit])
+        if len(ids) < limit:
+            ids += list(
+                queryset.exclude(pk__in=ids).values_list('id', flat=True).distinct()[:limit - len(ids)]
+            )
+        return ids
+
+
+def get_backend():
+    path = getattr(settings, 'PRODUITS_SEARCH_BACKEND', None)
+    if path:
+        return import_string(path)()
+    if connection.vendor == 'sqlite':
+        return SQLiteFTSBackend()
+    return DatabaseSearchBackend()
@@ -1,10 +1,35 @@
 from rest_framework import serializers
+from . import images
 from .models import (
     Category, Brand, ProductType, Product,
     ProductAttribute, ProductAttributeValue,
-    ProductAttributeOption, ProductImage, Stock, Warehouse
+    ProductAttributeOption, ProductImage, Stock, Warehouse,
+    StockReservation, StockReservationLine
 )
 
+
+class PrefetchedPrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+    """
+    PrimaryKeyRelatedField qui lit les objets préchargés par les écritures en
+    masse (context['prefetched'][nom du champ], cf. produits.bulk) au lieu
+    d'une requête par élément. Sans préchargement : comportement habituel.
+    """
+
+    def to_internal_value(self, data):
+        prefetched = self.context.get('prefetched', {}).get(self.field_name)
+        if prefetched is None:
+            return super().to_internal_value(data)
+        if isinstance(data, bool):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        try:
+            pk = int(data)
+        except (TypeError, ValueError):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        if pk not in prefetched:
+            self.fail('does_not_exist', pk_value=data)
+        return prefetched[pk]
+
+
 class WarehouseSerializer(serializers.ModelSerializer):
     class Meta:
         model = Warehouse
@@ -15,16 +40,43 @@ class CategorySerializer(serializers.ModelSerializer):
         model = Category
         fields = ['id', 'name', 'parent']
 
+    def validate_parent(self, parent):
+        if parent is not None and self.instance is not None and self.instance.path \
+                and parent.path.startswith(self.instance.path):
+            raise serializers.ValidationError("Une catégorie ne peut pas être déplacée sous sa propre descendance.")
+        return parent
+
+def image_srcset(context, kind, obj, field_file, derivatives):
+    """Carte {format: srcset} des déclinaisons d'une image (vide si aucune)."""
+    if not field_file:
+        return {}
+    request = context.get('request')
+
+    def build_url(url):
+        return request.build_absolute_uri(url) if request is not None else url
+
+    if derivatives.get('variants') and derivatives.get('source') == field_file.name:
+        return images.srcset(derivatives, lambda name: build_url(field_file.storage.url(name)))
+    if images.is_lazy():
+        return images.lazy_srcset(kind, obj.pk, build_url)
+    return {}
+
 class BrandSerializer(serializers.ModelSerializer):
     logo = serializers.SerializerMethodField()
+    srcset = serializers.SerializerMethodField()
 
     class Meta:
         model = Brand
-        fields = ['id', 'name', 'logo']
+        fields = ['id', 'name', 'logo', 'srcset']
+
+    def get_srcset(self, obj):
+        return image_srcset(self.context, 'brand', obj, obj.logo, obj.logo_derivatives)
 
     def get_logo(self, obj):
         request = self.context.get('request')
         if obj.logo and hasattr(obj.logo, 'url'):
+            if request is None:
+                return obj.logo.url
             return request.build_absolute_uri(obj.logo.url)
         return None
 
@@ -66,10 +118,10 @@ class ProductAttributeOptionSerializer(serializers.ModelSerializer):
 #         fields = ['id', 'product', 'option']
 
 class ProductAttributeValueWriteSerializer(serializers.ModelSerializer):
-    option = serializers.PrimaryKeyRelatedField(
+    option = PrefetchedPrimaryKeyRelatedField(
         queryset=ProductAttributeOption.objects.all()
     )
-    product = serializers.PrimaryKeyRelatedField(
+    product = PrefetchedPrimaryKeyRelatedField(
         queryset=Product.objects.all()
     )
 
@@ -86,15 +138,19 @@ class ProductAttributeValueReadSerializer(serializers.ModelSerializer):
         fields = ['id', 'product', 'option']
 class ProductImageSerializer(serializers.ModelSerializer):
     image = serializers.ImageField()
+    srcset = serializers.SerializerMethodField()
 
     class Meta:
         model = ProductImage
-        fields = ['id', 'product', 'image', 'is_feature', 'alt_text']
+        fields = ['id', 'product', 'image', 'srcset', 'is_feature', 'alt_text']
         extra_kwargs = {
             'product': {'required': True},
             'image': {'required': True},
         }
 
+    def get_srcset(self, obj):
+        return image_srcset(self.context, 'product-image', obj, obj.image, obj.derivatives)
+
 '''class StockSerializer(serializers.ModelSerializer):
     warehouse = WarehouseSerializer(read_only=True)
     warehouse_id = serializers.PrimaryKeyRelatedField(
@@ -113,7 +169,19 @@ class StockSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Stock
-        fields = ['id', 'product', 'warehouse', 'warehouse_id', 'units', 'units_sold']
+        fields = ['id', 'product', 'warehouse', 'warehouse_id', 'units', 'units_sold', 'units_reserved']
+        read_only_fields = ['units_reserved']
+
+
+class StockWriteSerializer(serializers.ModelSerializer):
+    product = PrefetchedPrimaryKeyRelatedField(queryset=Product.objects.all())
+    warehouse = PrefetchedPrimaryKeyRelatedField(queryset=Warehouse.objects.all())
+
+    class Meta:
+        model = Stock
+        fields = ['id', 'product', 'warehouse', 'units', 'units_sold', 'units_reserved']
+        read_only_fields = ['units_reserved']
+
 class ProductDetailSerializer(serializers.ModelSerializer):
     brand = BrandSerializer(read_only=True)
     category = CategorySerializer(read_only=True)
@@ -121,15 +189,16 @@ class ProductDetailSerializer(serializers.ModelSerializer):
     attribute_values = ProductAttributeValueReadSerializer(many=True, read_only=True)
     images = ProductImageSerializer(many=True, read_only=True)
     stocks = StockSerializer(many=True, read_only=True)
+    available_units = serializers.IntegerField(source='availability.available_units', read_only=True)
 
     class Meta:
         model = Product
         fields = '__all__'
         
 class ProductCreateUpdateSerializer(serializers.ModelSerializer):
-    brand_id = serializers.PrimaryKeyRelatedField(queryset=Brand.objects.all(), source='brand')
-    category_id = serializers.PrimaryKeyRelatedField(queryset=Category.objects.all(), source='category')
-    product_type_id = serializers.PrimaryKeyRelatedField(queryset=ProductType.objects.all(), source='product_type')
+    brand_id = PrefetchedPrimaryKeyRelatedField(queryset=Brand.objects.all(), source='brand')
+    category_id = PrefetchedPrimaryKeyRelatedField(queryset=Category.objects.all(), source='category')
+    product_type_id = PrefetchedPrimaryKeyRelatedField(queryset=ProductType.objects.all(), source='product_type')
 
     class Meta:
         model = Product
@@ -152,14 +221,45 @@ class ProductSerializer(serializers.ModelSerializer):
     attribute_values = ProductAttributeValueReadSerializer(many=True, read_only=True)
     images = ProductImageSerializer(many=True, read_only=True)
     stocks = StockSerializer(many=True, read_only=True, source='stock_set')  # <-- Ajout important
+    # Lu dans la table ProductAvailability (jointure), sans agréger les stocks
+    available_units = serializers.IntegerField(source='availability.available_units', read_only=True)
 
     class Meta:
         model = Product
         fields = [
             'id', 'name', 'slug', 'category', 'category_id',
             'brand', 'brand_id', 'product_type', 'product_type_id',
-            'description', 'price', 'is_active',
+            'description', 'price', 'is_active', 'available_units',
             'created_at', 'updated_at',
             'attribute_values', 'images', 'stocks'
         ]
 
+
+
+# Réservations de stock
+class ReservationLineRequestSerializer(serializers.Serializer):
+    product = serializers.IntegerField(min_value=1)
+    quantity = serializers.IntegerField(min_value=1)
+    warehouse = serializers.IntegerField(min_value=1, required=False, allow_null=True, default=None)
+
+
+class ReservationRequestSerializer(serializers.Serializer):
+    lines = ReservationLineRequestSerializer(many=True, allow_empty=False)
+    ttl = serializers.IntegerField(min_value=30, max_value=24 * 3600, required=False)
+
+
+class StockReservationLineSerializer(serializers.ModelSerializer):
+    product = serializers.IntegerField(source='stock.product_id', read_only=True)
+    warehouse = serializers.IntegerField(source='stock.warehouse_id', read_only=True)
+
+    class Meta:
+        model = StockReservationLine
+        fields = ['id', 'product', 'warehouse', 'stock', 'quantity']
+
+
+class StockReservationSerializer(serializers.ModelSerializer):
+    lines = StockReservationLineSerializer(many=True, read_only=True)
+
+    class Meta:
+        model = StockReservation
+        fields = ['id', 'status', 'created_at', 'expires_at', 'lines']
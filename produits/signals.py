@@ -0,0 +1,142 @@
+from django.db import transaction
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import Signal, receiver
+
+from . import availability, cache, images, search, storage
+from .models import (
+    Category, Brand, ProductType, Product,
+    ProductAttribute, ProductAttributeOption, ProductAttributeValue,
+    ProductImage, Stock, Warehouse
+)
+
+# Envoyé avec product_ids=[...] chaque fois que la représentation de produits
+# change, y compris pour les écritures en masse qui ne déclenchent pas
+# post_save (bulk_create, update()).
+products_changed = Signal()
+
+
+def notify_products_changed(product_ids, sender=Product):
+    product_ids = set(product_ids)
+    if product_ids:
+        products_changed.send(sender=sender, product_ids=product_ids)
+
+
+# Écritures qui modifient la disponibilité (création du produit, stocks,
+# nom d'un entrepôt). Branché avant l'invalidation du cache, pour que la
+# réponse recalculée lise la table à jour.
+AVAILABILITY_SENDERS = (Product, Stock, Warehouse)
+
+
+@receiver(products_changed)
+def refresh_product_availability(sender, product_ids, **kwargs):
+    if sender in AVAILABILITY_SENDERS:
+        availability.refresh_availability(product_ids)
+
+
+# Versions du cache changées après validation de la transaction : une requête
+# concurrente ne doit pas remettre en cache l'état d'avant sous la nouvelle
+# version.
+def bump_on_commit(scopes):
+    transaction.on_commit(lambda: cache.bump_versions(scopes))
+
+
+@receiver(products_changed)
+def invalidate_product_cache(sender, product_ids, **kwargs):
+    product_ids = set(product_ids)
+    transaction.on_commit(lambda: cache.invalidate_products(product_ids))
+
+
+# Écritures qui modifient l'index à facettes (prix, marque, catégorie,
+# activité, options, noms) ; stocks, entrepôts et images n'y figurent pas.
+FACET_SENDERS = (Product, ProductAttributeValue, Brand, Category, ProductAttributeOption, ProductAttribute)
+
+
+@receiver(products_changed)
+def invalidate_facet_index(sender, product_ids, **kwargs):
+    if sender in FACET_SENDERS:
+        bump_on_commit([cache.FACETS_SCOPE])
+
+
+@receiver(products_changed)
+def update_search_index(sender, product_ids, **kwargs):
+    search.get_backend().index_products(product_ids)
+
+
+@receiver([post_save, post_delete], sender=Product)
+def product_changed(sender, instance, **kwargs):
+    notify_products_changed([instance.pk], sender)
+
+
+@receiver([post_save, post_delete], sender=ProductImage)
+@receiver([post_save, post_delete], sender=ProductAttributeValue)
+@receiver([post_save, post_delete], sender=Stock)
+def product_child_changed(sender, instance, **kwargs):
+    notify_products_changed([instance.product_id], sender)
+
+
+# Références vers les fichiers du stockage par contenu (MediaBlob)
+@receiver(pre_save, sender=ProductImage)
+@receiver(pre_save, sender=Brand)
+def remember_media(sender, instance, **kwargs):
+    _, field, _ = images.target_for(instance)
+    previous = None
+    if instance.pk is not None:
+        previous = sender.objects.filter(pk=instance.pk).values_list(field, flat=True).first()
+    instance._previous_media = previous
+
+
+@receiver(post_save, sender=ProductImage)
+@receiver(post_save, sender=Brand)
+def image_uploaded(sender, instance, **kwargs):
+    _, field, _ = images.target_for(instance)
+    name = getattr(instance, field).name or None
+    previous = getattr(instance, '_previous_media', None)
+    if name != previous:
+        storage.acquire(name)
+        storage.release(previous)
+    if images.needs_refresh(instance):
+        images.schedule(instance)
+
+
+@receiver(post_delete, sender=ProductImage)
+@receiver(post_delete, sender=Brand)
+def image_deleted(sender, instance, **kwargs):
+    _, field, _ = images.target_for(instance)
+    storage.release(getattr(instance, field).name)
+
+
+# Objets partagés : on invalide précisément les produits qui les affichent.
+RELATED_LOOKUPS = {
+    Brand: 'brand',
+    Category: 'category',
+    ProductType: 'product_type',
+    ProductAttributeOption: 'attribute_values__option',
+    ProductAttribute: 'attribute_values__option__attribute',
+    Warehouse: 'stock__warehouse',
+}
+
+
+@receiver([post_save, post_delete], sender=Brand)
+@receiver([post_save, post_delete], sender=Category)
+@receiver([post_save, post_delete], sender=ProductType)
+@receiver([post_save, post_delete], sender=ProductAttributeOption)
+@receiver([post_save, post_delete], sender=ProductAttribute)
+@receiver([post_save, post_delete], sender=Warehouse)
+def shared_object_changed(sender, instance, **kwargs):
+    lookup = RELATED_LOOKUPS[sender]
+    product_ids = Product.objects.filter(**{lookup: instance.pk}).values_list('id', flat=True).distinct()
+    notify_products_changed(product_ids, sender)
+    if sender is Category:
+        # L'appartenance aux sous-arbres (?category_tree=) peut avoir changé
+        bump_on_commit([cache.LIST_SCOPE, cache.FACETS_SCOPE])
+
+
+@receiver(post_delete, sender=Category)
+def reroot_orphan_categories(sender, instance, **kwargs):
+    # SET_NULL met les enfants à la racine par un UPDATE, sans save() :
+    # on recalcule leur chemin et celui de leur sous-arbre.
+    orphans = Category.objects.filter(
+        parent__isnull=True, path__startswith=instance.path, depth=instance.depth + 1
+    )
+    for child in orphans:
+        child.save()
@@ -0,0 +1,151 @@
+import hashlib
+import os
+import posixpath
+import re
+import tempfile
+
+from django.core.files.storage import FileSystemStorage
+from django.db import IntegrityError, transaction
+from django.db.models import F
+
+# Stockage adressé par le contenu des photos produits et logos.
+#
+# Chaque fichier envoyé est haché pendant son écriture (un seul passage, par
+# blocs) puis rangé sous « <dossier>/<2 premiers caractères>/<sha256>.<ext> ».
+# Un contenu déjà présent n'est pas réécrit : le même fichier envoyé quatre
+# fois n'occupe qu'une place. MediaBlob compte les lignes qui référencent
+# chaque fichier ; il est supprimé quand plus aucune ne le référence.
+
+BLOB_NAME = re.compile(r'(^|/)[0-9a-f]{2}/[0-9a-f]{64}\.\w+$')
+# Déclinaisons (cf. produits.images) : « <original>.<largeur>w.<empreinte>.<ext> »
+DERIVATIVE_SUFFIX = re.compile(r'\.\d+w\.[0-9a-f]{16}\.\w+$')
+
+
+def blob_name(directory, digest, extension):
+    return posixpath.join(directory, digest[:2], f"{digest}{extension.lower()}")
+
+
+def is_blob_name(name):
+    return bool(BLOB_NAME.search(name))
+
+
+def is_hashed_name(name):
+    """Nom qui dépend du contenu : le fichier derrière ne change jamais."""
+    return is_blob_name(name) or bool(DERIVATIVE_SUFFIX.search(name))
+
+
+def content_name(storage, name):
+    """Nom par contenu d'un fichier déjà stocké (lu par blocs)."""
+    digest = hashlib.sha256()
+    with storage.open(name, 'rb') as f:
+        for chunk in f.chunks():
+            digest.update(chunk)
+    return blob_name(posixpath.dirname(name), digest.hexdigest(), posixpath.splitext(name)[1])
+
+
+class ContentAddressedStorage(FileSystemStorage):
+
+    def get_available_name(self, name, max_length=None):
+        # Le nom définitif dépend du contenu : jamais de suffixe aléatoire
+        return name
+
+    def _save(self, name, content):
+        if is_hashed_name(name):
+            # Déjà nommé d'après son contenu (déclinaisons) : écrit une seule fois
+            return name if self.exists(name) else super()._save(name, content)
+        directory = posixpath.dirname(name)
+        extension = posixpath.splitext(name)[1]
+        os.makedirs(self.path(directory), exist_ok=True)
+        digest = hashlib.sha256()
+        fd, tmp = tempfile.mkstemp(dir=self.path(directory), suffix='.part')
+        try:
+            with os.fdopen(fd, 'wb') as out:
+                if hasattr(content, 'seek'):
+                    content.seek(0)
+                for chunk in content.chunks():
+                    digest.update(chunk)
+                    out.write(chunk)
+            final = blob_name(directory, digest.hexdigest(), extension)
+            full_path = self.path(final)
+            os.makedirs(os.path.dirname(full_path), exist_ok=True)
+            if os.path.exists(full_path):
+                os.remove(tmp)   # déjà stocké
+            else:
+                if self.file_permissions_mode is not None:
+                    os.chmod(tmp, self.file_permissions_mode)
+                os.replace(tmp, full_path)
+        except BaseException:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+        return final
+
+
+media_storage = ContentAddressedStorage()
+
+
+def get_media_storage():
+    return media_storage
+
+
+# --- Comptage des références ------------------------------------------------
+
+def acquire(name, storage=media_storage):
+    """Ajoute une référence au fichier name (s'il est stocké par contenu)."""
+    from .models import MediaBlob
+
+    if not name or not is_blob_name(name):
+        return
+    with transaction.atomic():
+        # Même verrou que release() : pas d'incrément pendant un dernier départ
+        if MediaBlob.objects.select_for_update().filter(name=name).exists():
+            MediaBlob.objects.filter(name=name).update(refcount=F('refcount') + 1)
+            return
+        try:
+            with transaction.atomic():
+                size = storage.size(name) if storage.exists(name) else 0
+                MediaBlob.objects.create(name=name, size=size, refcount=1)
+        except IntegrityError:
+            # Créé en parallèle : on incrémente
+            MediaBlob.objects.filter(name=name).update(refcount=F('refcount') + 1)
+
+
+def release(name, storage=media_storage):
+    """
+    Retire une référence ; au dernier départ, supprime le fichier et ses
+    déclinaisons. Les fichiers antérieurs au stockage par contenu ne sont
+    pas comptés, donc jamais supprimés ici (cf. dedupe_media).
+    """
+    from .models import MediaBlob
+
+    if not name or not is_blob_name(name):
+        return
+    with transaction.atomic():
+        refcount = MediaBlob.objects.select_for_update().filter(name=name).values_list('refcount', flat=True).first()
+        if refcount is None:
+            return
+        if refcount > 1:
+            MediaBlob.objects.filter(name=name).update(refcount=F('refcount') - 1)
+            return
+        MediaBlob.objects.filter(name=name).delete()
+        transaction.on_commit(lambda: delete_blob(name, storage))
+
+
+def delete_blob(name, storage=media_storage):
+    """Supprime le fichier et les déclinaisons rangées à côté de lui."""
+    from .models import MediaBlob
+
+    # Référencé de nouveau depuis le dernier départ (même contenu renvoyé) :
+    # le fichier déjà sur le disque est réutilisé, on le garde
+    if MediaBlob.objects.filter(name=name).exists():
+        return
+    directory, filename = posixpath.split(name)
+    stem = posixpath.splitext(filename)[0]
+    try:
+        _, files = storage.listdir(directory)
+    except FileNotFoundError:
+        files = []
+    for other in files:
+        if other.startswith(f"{stem}.") and DERIVATIVE_SUFFIX.search(other):
+            storage.delete(posixpath.join(directory, other))
+    storage.delete(name)
@@ -1,3 +1,1506 @@
-from django.test import TestCase
+import asyncio
+import gzip
+import io
+import json
+import os
+import shutil
+import tempfile
+import threading
+from collections import Counter
+from unittest import mock
+from datetime import timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection, connections
+from django.db.backends.signals import connection_created
+from asgiref.sync import sync_to_async
+from django.test import AsyncClient, RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.http import JsonResponse
+from django.utils import timezone
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from PIL import Image
+from rest_framework.renderers import JSONRenderer
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+from rest_framework.throttling import ScopedRateThrottle
+
+from utilisateurs.models import User
+from .models import (
+    Category, Brand, ProductType, Product,
+    ProductAttribute, ProductAttributeOption, ProductAttributeValue,
+    ProductImage, Stock, Warehouse, StockReservation, ProductAvailability, MediaBlob
+)
+from . import benchmark, cache, explain, facets, reservations, search
+from .storage import media_storage
+from .fastpath import ProductListing
+from .feeds import Feed, FeedError
+from .importer import CatalogueImporter, Checkpoint
+from .prefetch import plan_queryset
+from .serializers import BrandSerializer, CategorySerializer, ProductSerializer
+from storer import metrics
+from storer.database import database_config, replica_databases, sqlite_pragmas
+from storer.routers import STICKY_COOKIE, ReplicaRouter
+from storer.renderers import FastJSONRenderer
+
+
+def create_catalogue(nb_products, prefix='Produit'):
+    """Crée nb_products produits complets (attributs, images, stocks)."""
+    category, _ = Category.objects.get_or_create(name='Ordinateurs', parent=None)
+    brand, _ = Brand.objects.get_or_create(name='Lenovo')
+    ptype, _ = ProductType.objects.get_or_create(name='Portable')
+    warehouses = [
+        Warehouse.objects.get_or_create(name=name)[0]
+        for name in ('Ouagadougou', 'Bobo-Dioulasso')
+    ]
+    options = []
+    for attr_name, value in (('RAM', '16 Go'), ('Couleur', 'Noir'), ('Processeur', 'Intel Core i7')):
+        attribute, _ = ProductAttribute.objects.get_or_create(name=attr_name, product_type=ptype)
+        options.append(ProductAttributeOption.objects.get_or_create(attribute=attribute, value=value)[0])
+
+    products = []
+    start = Product.objects.count()
+    for i in range(start, start + nb_products):
+        product = Product.objects.create(
+            name=f'{prefix} {i}', category=category, brand=brand,
+            product_type=ptype, price=Decimal('100.00') + i,
+        )
+        for option in options:
+            ProductAttributeValue.objects.create(product=product, option=option)
+        for j in range(2):
+            ProductImage.objects.create(product=product, image=f'product_images/{i}_{j}.jpg', is_feature=j == 0)
+        for warehouse in warehouses:
+            Stock.objects.create(product=product, warehouse=warehouse, units=10, units_sold=1)
+        products.append(product)
+    return products
+
+
+class APITestMixin:
+    def setUp(self):
+        # Les versions ne changent qu'à la validation, jamais dans un TestCase :
+        # pas de réponse d'un test précédent
+        cache.get_cache().clear()
+        self.user = User.objects.create_user(
+            email='tests@rohstore.com', password='motdepasse', first_name='Test', last_name='Test'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+
+class ProductQueryCountTests(APITestMixin, TestCase):
+    """Le nombre de requêtes des endpoints produits ne dépend pas du nombre de lignes."""
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(ctx.captured_queries)
+
+    def test_list_query_count_is_constant(self):
+        create_catalogue(1)
+        url = reverse('product-list-create')
+        small = self.count_queries(url)
+        with self.captureOnCommitCallbacks(execute=True):
+            create_catalogue(20)
+        self.assertEqual(self.count_queries(url), small)
+
+    def test_detail_query_count(self):
+        product = create_catalogue(1)[0]
+        url = reverse('product-detail', args=[product.pk])
+        # produit + jointures, attributs, images
+        with self.assertNumQueries(3):
+            response = self.client.get(url)
+        self.assertEqual(len(response.data['attribute_values']), 3)
+        self.assertEqual(response.data['attribute_values'][0]['option']['attribute']['name'], 'RAM')
+
+    def test_nested_lists_query_count_is_constant(self):
+        create_catalogue(1)
+        urls = [
+            reverse('product-attribute-value-list-create'),
+            reverse('product-attribute-option-list-create'),
+            reverse('stock-list-create'),
+        ]
+        small = [self.count_queries(url) for url in urls]
+        create_catalogue(10)
+        self.assertEqual([self.count_queries(url) for url in urls], small)
+
+
+class SparseFieldsetTests(APITestMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.product = create_catalogue(3)[0]
+        self.list_url = reverse('product-list-create')
+        self.detail_url = reverse('product-detail', args=[self.product.pk])
+
+    def get(self, url, **params):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url, params)
+        return response, [query['sql'] for query in ctx.captured_queries]
+
+    def test_fields_prune_queryset(self):
+        response, queries = self.get(self.list_url, fields='id,name,price')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(set(response.data[0]), {'id', 'name', 'price'})
+        self.assertEqual(len(queries), 1)
+        self.assertNotIn('JOIN', queries[0])
+
+    def test_nested_fields(self):
+        response, queries = self.get(self.detail_url, fields='id,brand.name,images.image')
+        self.assertEqual(response.data['brand'], {'name': 'Lenovo'})
+        self.assertEqual(set(response.data['images'][0]), {'image'})
+        # produit + marque (jointure), images
+        self.assertEqual(len(queries), 2)
+
+    def test_expand(self):
+        response, _ = self.get(self.detail_url, expand='')
+        self.assertEqual(response.data['brand'], self.product.brand_id)
+        self.assertEqual(len(response.data['attribute_values']), 3)
+        self.assertIsInstance(response.data['attribute_values'][0], int)
+
+        response, queries = self.get(self.list_url, fields='id,name,images', expand='images')
+        self.assertIn('srcset', response.data[0]['images'][0])
+        self.assertEqual(len(queries), 2)
+        response, _ = self.get(self.detail_url, expand='attribute_values.option')
+        option = response.data['attribute_values'][0]['option']
+        self.assertEqual(option['attribute'], ProductAttributeOption.objects.get(pk=option['id']).attribute_id)
+
+    def test_unknown_field(self):
+        response, _ = self.get(self.list_url, fields='id,prix')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.get(self.list_url, expand='name')[0].status_code, 400)
+        # Sans paramètres : arbre complet
+        self.assertIn('images', self.get(self.detail_url)[0].data)
+
+
+class ProductExportTests(APITestMixin, TestCase):
+    """Export en flux (produits.export) : blocs de chunk_size produits."""
+
+    def setUp(self):
+        super().setUp()
+        self.products = create_catalogue(5)
+        self.url = reverse('product-export')
+
+    def export(self, **params):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(self.url, params)
+            body = b''.join(response.streaming_content).decode()
+        self.assertEqual(response.status_code, 200)
+        return response, body, len(ctx.captured_queries)
+
+    def assertAllProducts(self, rows):
+        self.assertEqual([row['id'] for row in rows], sorted(p.pk for p in self.products))
+        self.assertEqual(len(rows[0]['attribute_values']), 3)
+
+    def test_ndjson(self):
+        response, body, _ = self.export(chunk_size=2)
+        self.assertTrue(response['Content-Type'].startswith('application/x-ndjson'))
+        self.assertTrue(body.endswith('\n'))
+        self.assertAllProducts([json.loads(line) for line in body.splitlines()])
+
+    def test_json_array(self):
+        response, body, _ = self.export(export_format='json', chunk_size=2)
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="catalogue.json"')
+        self.assertAllProducts(json.loads(body))
+
+    def test_query_count_is_constant_per_chunk(self):
+        # 5 produits : 1, 2 puis 3 blocs
+        one, two, three = (self.export(chunk_size=size)[2] for size in (5, 4, 2))
+        self.assertGreater(two, one)
+        self.assertEqual(three - two, two - one)
+        create_catalogue(5)
+        self.assertEqual(self.export(chunk_size=4)[2], three)
+
+    def test_invalid_parameters(self):
+        self.assertEqual(self.client.get(self.url, {'export_format': 'csv'}).status_code, 400)
+        self.assertEqual(self.client.get(self.url, {'chunk_size': 'x'}).status_code, 400)
+
+
+def feed_record(i, price='10.00', units=5):
+    return {
+        'name': f'Importé {i}', 'category': 'Portables', 'category_parent': 'Ordinateurs',
+        'brand': 'Dell', 'product_type': 'Portable', 'price': price,
+        'attributes': [{'attribute_name': 'RAM', 'value': '8 Go'}],
+        'stock': {'warehouse_name': 'Ouagadougou', 'units': units, 'units_sold': 1},
+    }
+
+
+class CatalogueImporterTests(TestCase):
+    """Import par blocs (produits.importer) et commande seed_full_products."""
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp)
+        self.checkpoint = os.path.join(self.tmp, 'import.checkpoint')
+
+    def write_feed(self, records):
+        path = os.path.join(self.tmp, 'produits.json')
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(records, f)
+        return path
+
+    def test_upsert_by_slug(self):
+        CatalogueImporter(chunk_size=2).run(iter([feed_record(i) for i in range(3)]))
+        stats = CatalogueImporter(chunk_size=2).run(iter([feed_record(1, price='12.50', units=8), feed_record(3)]))
+        self.assertEqual(stats['products'], 2)
+        self.assertEqual(Product.objects.count(), 4)
+        product = Product.objects.get(slug='importe-1')
+        self.assertEqual(product.price, Decimal('12.50'))
+        self.assertEqual(product.category.parent.name, 'Ordinateurs')
+        self.assertEqual(list(Stock.objects.filter(product=product).values_list('units', flat=True)), [8])
+        self.assertEqual(ProductAttributeValue.objects.filter(product=product).count(), 1)
+
+    def test_resume_after_interruption(self):
+        def interrupted():
+            yield from (feed_record(i) for i in range(4))
+            raise RuntimeError("coupure")
+
+        with self.assertRaises(RuntimeError):
+            CatalogueImporter(chunk_size=2, checkpoint=Checkpoint(self.checkpoint)).run(interrupted())
+        self.assertEqual(Checkpoint(self.checkpoint).load(), 4)
+        self.assertEqual(Product.objects.count(), 4)
+
+        # Les 4 premiers enregistrements, déjà validés, ne sont pas relus
+        out = io.StringIO()
+        call_command(
+            'seed_full_products', file=self.write_feed([feed_record(i, price='99.00') for i in range(6)]),
+            checkpoint=self.checkpoint, chunk_size=2, resume=True, stdout=out,
+        )
+        self.assertIn('Reprise après 4 enregistrements', out.getvalue())
+        self.assertEqual(
+            list(Product.objects.order_by('slug').values_list('price', flat=True)),
+            [Decimal('10.00')] * 4 + [Decimal('99.00')] * 2,
+        )
+        self.assertFalse(os.path.exists(self.checkpoint))
+
+    def test_invalid_records_are_skipped_and_reported(self):
+        records = [feed_record(0), {'name': 'Sans prix', 'brand': 'Dell'}, feed_record(1, price='gratuit'), 'texte']
+        out = io.StringIO()
+        call_command('seed_full_products', file=self.write_feed(records), checkpoint=self.checkpoint, stdout=out)
+        self.assertEqual(list(Product.objects.values_list('slug', flat=True)), ['importe-0'])
+        output = out.getvalue()
+        self.assertIn("Enregistrement ignoré (KeyError('price')) : 'Sans prix'", output)
+        self.assertIn('3 enregistrements invalides ignorés', output)
+
+
+class FeedTests(TestCase):
+    """Lecture incrémentale des flux (produits.feeds)."""
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp)
+
+    def write(self, name, content):
+        path = os.path.join(self.tmp, name)
+        opener = gzip.open if name.endswith('.gz') else open
+        with opener(path, 'wt', encoding='utf-8') as f:
+            f.write(content)
+        return path
+
+    def read(self, path, method='records'):
+        with Feed(path) as feed:
+            return list(getattr(feed, method)())
+
+    def test_json_array_across_buffer_boundaries(self):
+        records = [{'name': f'Produit {i}', 'price': 1000 + i, 'description': 'é' * (i % 7)} for i in range(50)]
+        path = self.write('flux.json', json.dumps(records, ensure_ascii=False, indent=1))
+        # Tampons de quelques octets : valeurs, nombres et séparateurs coupés
+        for size in (1, 3, 7, 64):
+            with self.subTest(size=size), mock.patch('produits.feeds.READ_SIZE', size):
+                self.assertEqual(self.read(path), records)
+
+    def test_sections_across_buffer_boundaries(self):
+        path = self.write('infos.json', json.dumps({'brands': ['Dell', 'HP'], 'warehouses': [{'name': 'Ouaga'}]}))
+        with mock.patch('produits.feeds.READ_SIZE', 5):
+            self.assertEqual(
+                self.read(path, 'sections'), [('brands', 'Dell'), ('brands', 'HP'), ('warehouses', {'name': 'Ouaga'})]
+            )
+
+    def test_gzip(self):
+        records = [{'name': f'Produit {i}'} for i in range(20)]
+        path = self.write('flux.ndjson.gz', ''.join(json.dumps(r) + '\n' for r in records))
+        with Feed(path) as feed:
+            self.assertEqual(feed.format, 'ndjson')
+            self.assertEqual(list(feed.records()), records)
+            self.assertEqual(feed.progress(), 1.0)
+        path = self.write('flux.json.gz', json.dumps(records))
+        self.assertEqual(self.read(path), records)
+
+    def test_malformed_ndjson_line_number(self):
+        path = self.write('flux.ndjson', '{"name": "A"}\n\n{"name": "B"}\n{"name": \n')
+        with Feed(path) as feed:
+            records = feed.records()
+            self.assertEqual([next(records), next(records)], [{'name': 'A'}, {'name': 'B'}])
+            with self.assertRaisesMessage(FeedError, 'Ligne 4 invalide'):
+                next(records)
+
+    def test_malformed_json(self):
+        for content in ('[{"name": "A"} {"name": "B"}]', '[{"name": "A"}', '[1] 2'):
+            with self.subTest(content=content), self.assertRaises(FeedError):
+                self.read(self.write('flux.json', content))
+
+    def test_syntax_error_stops_reading(self):
+        path = self.write('flux.json', '[{"name": "A" "price": 1}, ' + ', '.join(['{"name": "C"}'] * 20000) + ']')
+        with Feed(path) as feed, mock.patch('produits.feeds.READ_SIZE', 64):
+            with self.assertRaisesMessage(FeedError, 'JSON invalide'):
+                list(feed.records())
+            self.assertLess(feed.progress(), 0.5)
+
+    @override_settings(PRODUITS_FEED_MAX_RECORD_SIZE=1000)
+    def test_record_size_is_capped(self):
+        for name, content in (
+            ('flux.json', '[{"name": "' + 'x' * 100_000),
+            ('flux.ndjson', '{"name": "A"}\n{"name": "' + 'x' * 100_000),
+        ):
+            path = self.write(name, content)
+            with self.subTest(name=name), Feed(path) as feed:
+                with self.assertRaisesMessage(FeedError, 'PRODUITS_FEED_MAX_RECORD_SIZE'):
+                    list(feed.records())
+                self.assertLess(feed.progress(), 1.0)
+
+
+class ProductListingParityTests(APITestMixin, TestCase):
+    """produits.fastpath produit octet pour octet la sortie de ProductSerializer."""
+
+    def setUp(self):
+        super().setUp()
+        products = create_catalogue(4)
+        parent = Category.objects.create(name='Informatique')
+        child = Category.objects.create(name='Écrans « 4K »', parent=parent)
+        brand = Brand.objects.create(
+            name='Dell', logo='brands/logos/dell.png',
+            logo_derivatives={'source': 'brands/logos/dell.png', 'digest': 'ab' * 32, 'width': 400,
+                              'variants': {'webp': {'320': 'brands/logos/dell.320w.abababababababab.webp'}}},
+        )
+        Brand.objects.filter(pk=brand.pk).update(logo_derivatives=brand.logo_derivatives)
+        special = products[1]
+        special.name = 'Écran "pro"\n\u2028 😀'
+        special.description = 'Ligne 1\nLigne 2\t<b>&</b> \\ \u2029 \x1f'
+        special.price = Decimal('1234.5')
+        special.category, special.brand = child, brand
+        special.save()
+        image = ProductImage.objects.filter(product=special).first()
+        ProductImage.objects.filter(pk=image.pk).update(
+            image='product_images/photo été (1).jpg',
+            derivatives={'source': 'product_images/photo été (1).jpg', 'digest': 'cd' * 32, 'width': 640,
+                         'variants': {'jpeg': {'640': 'product_images/x.640w.cdcdcdcdcdcdcdcd.jpg',
+                                               '160': 'product_images/x.160w.cdcdcdcdcdcdcdcd.jpg'}}},
+        )
+        ProductImage.objects.filter(product=products[2]).delete()
+        ProductAvailability.objects.filter(product=products[3]).delete()
+        self.queryset = Product.objects.order_by('id')
+
+    def reference(self, request):
+        queryset = plan_queryset(self.queryset, ProductSerializer)
+        data = ProductSerializer(queryset, many=True, context={'request': request}).data
+        return JSONRenderer().render(data)
+
+    def fast(self, request):
+        return FastJSONRenderer().render(ProductListing(request).build(self.queryset))
+
+    def test_byte_identical(self):
+        request = RequestFactory().get('/api/products/listing/')
+        self.assertEqual(self.fast(request), self.reference(request))
+        self.assertEqual(self.fast(None), self.reference(None))
+
+    @override_settings(PRODUITS_IMAGE_LAZY=False)
+    def test_byte_identical_without_lazy_derivatives(self):
+        request = RequestFactory().get('/api/products/listing/', secure=True)
+        self.assertEqual(self.fast(request), self.reference(request))
+
+    def test_plain_json_renderer(self):
+        with mock.patch('storer.renderers.orjson', None):
+            self.assertEqual(self.fast(None), self.reference(None))
+
+    def test_endpoint(self):
+        url = reverse('product-listing')
+        with self.assertNumQueries(4):
+            response = self.client.get(url)
+        request = RequestFactory().get(url)
+        self.assertEqual(response.content, self.reference(request))
+
+        response = self.client.get(url, {'page_size': 2})
+        ids = [product['id'] for product in response.data['results']]
+        self.assertEqual(ids, list(Product.objects.order_by('created_at', 'id').values_list('id', flat=True)[:2]))
+        following = self.client.get(response.data['next']).data['results']
+        self.assertEqual(len(following), 2)
+
+
+async def async_get(url, params=None, **headers):
+    """(réponse, corps) d'un appel par le client asynchrone, flux lu en entier."""
+    response = await AsyncClient().get(url, params or {}, headers=headers)
+    if response.streaming:
+        return response, b''.join([chunk async for chunk in response.streaming_content])
+    return response, response.content
+
+
+@override_settings(PRODUITS_ASYNC_FANOUT=False)
+class AsyncCatalogueTests(APITestMixin, TestCase):
+    """Vues asynchrones du catalogue (produits.async_views) : mêmes données que l'API."""
+
+    def setUp(self):
+        super().setUp()
+        self.products = create_catalogue(5)
+        Category.objects.create(name='Accessoires', parent=self.products[0].category)
+        Brand.objects.create(name='Acer')
+        self.auth = {'Authorization': f'Token {Token.objects.create(user=self.user).key}'}
+
+    async def test_product_list_matches_listing(self):
+        listing = await sync_to_async(self.client.get)(reverse('product-listing'))
+        url = reverse('async-product-list')
+        response, body = await async_get(url, {'chunk_size': 2}, **self.auth)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/json')
+        self.assertEqual(body, listing.content)
+
+        _, body = await async_get(url, {'limit': 3}, **self.auth)
+        self.assertEqual([p['id'] for p in json.loads(body)], [p['id'] for p in listing.json()[:3]])
+        _, body = await async_get(url, {'limit': 0}, **self.auth)
+        self.assertEqual(body, b'[]')
+        _, body = await async_get(url, {'category_tree': self.products[0].category_id}, **self.auth)
+        self.assertEqual(len(json.loads(body)), 5)
+
+    async def test_product_detail(self):
+        listing = (await sync_to_async(self.client.get)(reverse('product-listing'))).json()
+        pk = self.products[2].pk
+        response, body = await async_get(reverse('async-product-detail', args=[pk]), **self.auth)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(body), next(p for p in listing if p['id'] == pk))
+
+        response, body = await async_get(reverse('async-product-detail', args=[0]), **self.auth)
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(json.loads(body), {'detail': 'Not found.'})
+
+    async def test_brands_and_categories_match_serializers(self):
+        request = RequestFactory().get('/')
+
+        def reference(serializer_class, model):
+            queryset = model.objects.order_by('name', 'id')
+            return JSONRenderer().render(serializer_class(queryset, many=True, context={'request': request}).data)
+
+        for name, serializer_class, model in (
+            ('async-brand-list', BrandSerializer, Brand), ('async-category-list', CategorySerializer, Category),
+        ):
+            _, body = await async_get(reverse(name), {'chunk_size': 1}, **self.auth)
+            self.assertEqual(body, await sync_to_async(reference)(serializer_class, model))
+
+    async def test_authentication_and_errors(self):
+        url = reverse('async-category-list')
+        response, body = await async_get(url)
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response['WWW-Authenticate'], 'Token')
+        response, _ = await async_get(url, Authorization='Token inconnu')
+        self.assertEqual(response.status_code, 401)
+        response, body = await async_get(reverse('async-product-list'), {'limit': 'x'}, **self.auth)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(json.loads(body), {'limit': 'Entier attendu'})
+        response = await AsyncClient().post(url, headers=self.auth)
+        self.assertEqual(response.status_code, 405)
+
+
+class AsyncFanoutTests(TransactionTestCase):
+    """Requêtes filles en parallèle dans les threads du pool, mesures comprises."""
+
+    def setUp(self):
+        # Les images de create_catalogue n'existent pas sur le disque
+        with self.assertLogs('produits.images', 'WARNING'):
+            self.products = create_catalogue(3)
+        user = User.objects.create_user(email='async@rohstore.com', password='motdepasse', first_name='A', last_name='B')
+        self.auth = {'Authorization': f'Token {Token.objects.create(user=user).key}'}
+        metrics.registry.reset()
+
+    async def test_fanout_matches_sequential_reads(self):
+        url = reverse('async-product-list')
+        _, parallel = await async_get(url, **self.auth)
+        with override_settings(PRODUITS_ASYNC_FANOUT=False):
+            _, sequential = await async_get(url, **self.auth)
+        self.assertEqual(parallel, sequential)
+        self.assertEqual(len(json.loads(parallel)[0]['stocks']), 2)
+
+    async def test_queries_of_other_threads_are_measured(self):
+        response, _ = await async_get(reverse('async-product-detail', args=[self.products[0].pk]), **self.auth)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('db;dur=', response['Server-Timing'])
+        stats = metrics.registry.snapshot()['GET /api/async/products/<int:pk>/']
+        # Produit + attributs, images et stocks (sans compter l'authentification)
+        self.assertGreaterEqual(stats['mean']['queries'], 4)
+
+    async def test_streamed_lists_are_measured(self):
+        response, body = await async_get(reverse('async-product-list'), {'chunk_size': 2}, **self.auth)
+        self.assertEqual(len(json.loads(body)), 3)
+        stats = metrics.registry.snapshot()['GET /api/async/products/']
+        # Deux blocs : produits + attributs, images et stocks, chacun
+        self.assertGreaterEqual(stats['mean']['queries'], 8)
+
+    async def test_benchmark_load(self):
+        url_for = lambda i: reverse('async-category-list')
+        stats = await benchmark.load(url_for, requests=6, concurrency=3, headers=self.auth)
+        self.assertEqual((stats['status'], stats['errors'], stats['requests']), (200, 0, 6))
+        self.assertLessEqual(stats['peak_in_flight'], 3)
+        stats = await benchmark.load(url_for, requests=4, concurrency=4, headers=self.auth, threads=1)
+        self.assertEqual(stats['peak_in_flight'], 1)
+
+    def test_benchmark_modes_share_the_thread_budget(self):
+        urls = {
+            'sync': lambda i: reverse('product-listing') + '?page_size=2',
+            'async': lambda i: reverse('async-product-list') + '?limit=2',
+        }
+        for mode, url_for in urls.items():
+            stats = asyncio.run(benchmark.load(url_for, requests=8, concurrency=8, headers=self.auth, threads=2, mode=mode))
+            self.assertEqual((stats['status'], stats['errors']), (200, 0))
+            self.assertIn(stats['peak_threads'], (1, 2))
+
+
+class BenchmarkTests(APITestMixin, TestCase):
+    """Catalogue synthétique et mesures de la commande benchmark_api."""
+
+    def test_seed_is_incremental(self):
+        self.assertEqual(benchmark.seed_catalogue(12), 12)
+        self.assertEqual(benchmark.seed_catalogue(12), 0)
+        self.assertEqual(benchmark.seed_catalogue(15), 3)
+        self.assertEqual(benchmark.seeded_count(), 15)
+        self.assertEqual(ProductAvailability.objects.filter(product__slug__startswith='bench-').count(), 15)
+
+    @override_settings(PRODUITS_FACETS_BACKGROUND=False)
+    def test_seed_invalidates_the_facet_index(self):
+        for name, value in (('_index', None), ('_rebuilding', False)):
+            patcher = mock.patch.object(facets, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        for size in (10, 25):
+            with self.captureOnCommitCallbacks(execute=True):
+                benchmark.seed_catalogue(size)
+            response = self.client.get(reverse('product-facets'))
+            self.assertEqual(response.data['count'], Product.objects.filter(is_active=True).count())
+        self.assertGreater(response.data['count'], 10)
+
+    def test_measure(self):
+        benchmark.seed_catalogue(5)
+        urls = benchmark.endpoints()
+        for name in ('products-page', 'product-detail'):
+            stats = benchmark.measure(self.client, urls[name], requests=3, warmup=0)
+            self.assertEqual(stats['status'], 200)
+            self.assertGreater(stats['queries'], 0)
+            self.assertLessEqual(stats['p50_ms'], stats['p99_ms'])
+
+    def test_compare_flags_regressions(self):
+        before = {'sizes': {'10': {'endpoints': {'a': {'p50_ms': 10, 'p95_ms': 20, 'queries': 3}}}}}
+        after = {'sizes': {'10': {'endpoints': {'a': {'p50_ms': 11, 'p95_ms': 30, 'queries': 4}}}}}
+        flagged = [(name, metric) for _, name, metric, *_ in benchmark.compare(before, after, 0.2)]
+        self.assertEqual(flagged, [('a', 'p95_ms'), ('a', 'queries')])
+
+
+@override_settings(PRODUITS_FACETS_BACKGROUND=False)
+class ExplainTests(APITestMixin, TestCase):
+    """Plans d'exécution des requêtes de l'API (commande explain_api)."""
+
+    def test_keyset_pages_use_indexes(self):
+        create_catalogue(3)
+        report = explain.check(self.client, {
+            'products': reverse('product-list-create') + '?page_size=2',
+            'listing': reverse('product-listing') + '?page_size=2',
+            'product-facets': reverse('product-facets') + '?ordering=-price',
+        })
+        for name, result in report.items():
+            self.assertEqual(result['status'], 200)
+            self.assertTrue(result['queries'])
+            self.assertEqual([q['sql'] for q in result['queries'] if q['full_scans']], [], name)
+
+    def test_flags_unindexed_filter(self):
+        sql, params = Product.objects.filter(description='x').query.sql_with_params()
+        steps = explain.explain(sql, params)
+        self.assertIn('produits_product', [table for _, table, _ in steps])
+
+
+@override_settings(PRODUITS_FACETS_BACKGROUND=False)
+class FacetSearchTests(APITestMixin, TestCase):
+    """Recherche à facettes (produits.facets) : filtres, comptes et index."""
+
+    def setUp(self):
+        super().setUp()
+        # Index du processus, propre à chaque test
+        for name, value in (('_index', None), ('_rebuilding', False)):
+            patcher = mock.patch.object(facets, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.lenovo = create_catalogue(3)   # 100, 101, 102 ; RAM 16 Go
+        first = self.lenovo[0]
+        ram = ProductAttribute.objects.get(name='RAM')
+        self.ram16 = ProductAttributeOption.objects.get(attribute=ram, value='16 Go')
+        self.ram8 = ProductAttributeOption.objects.create(attribute=ram, value='8 Go')
+        self.dell = Brand.objects.create(name='Dell')
+        refs = {'category': first.category, 'product_type': first.product_type, 'brand': self.dell}
+        self.dell8 = Product.objects.create(name='Dell 8', price=Decimal('250.00'), **refs)
+        self.dell16 = Product.objects.create(name='Dell 16', price=Decimal('300.00'), **refs)
+        inactive = Product.objects.create(name='Dell retiré', price=Decimal('50.00'), is_active=False, **refs)
+        ProductAttributeValue.objects.create(product=self.dell8, option=self.ram8)
+        for product in (self.dell16, inactive):
+            ProductAttributeValue.objects.create(product=product, option=self.ram16)
+
+    def search(self, **params):
+        response = self.client.get(reverse('product-facets'), params)
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_filters_intersect(self):
+        data = self.search(brand=self.dell.pk, option=self.ram16.pk)
+        self.assertEqual([p['id'] for p in data['results']], [self.dell16.pk])
+        # OU entre les options d'un même attribut
+        data = self.search(brand=self.dell.pk, option=[self.ram8.pk, self.ram16.pk])
+        self.assertEqual(data['count'], 2)
+        self.assertEqual([p['id'] for p in data['results']], [self.dell8.pk, self.dell16.pk])
+
+    def test_counts_are_disjunctive_within_a_facet(self):
+        facets_ = self.search(brand=self.dell.pk)['facets']
+        # Les marques ignorent le filtre de marque ; les options le suivent
+        self.assertEqual({f['name']: f['count'] for f in facets_['brands']}, {'Lenovo': 3, 'Dell': 2})
+        ram, = [a for a in facets_['attributes'] if a['name'] == 'RAM']
+        self.assertEqual({o['value']: o['count'] for o in ram['options']}, {'8 Go': 1, '16 Go': 1})
+        ram, = [a for a in self.search(option=self.ram8.pk)['facets']['attributes'] if a['name'] == 'RAM']
+        self.assertEqual({o['value']: o['count'] for o in ram['options']}, {'8 Go': 1, '16 Go': 4})
+
+    def test_price_bounds(self):
+        data = self.search(price_min='101', price_max='250')
+        self.assertEqual([p['price'] for p in data['results']], ['101.00', '102.00', '250.00'])
+        self.assertEqual(data['facets']['price'], {'min': '101.00', 'max': '250.00'})
+        data = self.search(ordering='-price', limit=2)
+        self.assertEqual((data['count'], [p['price'] for p in data['results']]), (5, ['300.00', '250.00']))
+        data = self.search(price_min='400')
+        self.assertEqual((data['count'], data['results'], data['facets']['price']), (0, [], None))
+
+    def test_only_facet_writes_change_the_index(self):
+        before = facets.current_version()
+        stock = Stock.objects.filter(product=self.lenovo[0]).first()
+        stock.units += 5
+        with self.captureOnCommitCallbacks(execute=True):
+            stock.save()
+        self.assertEqual(facets.current_version(), before)
+
+        self.dell8.price = Decimal('99.00')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.dell8.save()
+        self.assertNotEqual(facets.current_version(), before)
+        self.assertEqual(self.search(limit=1)['results'][0]['id'], self.dell8.pk)
+
+    @override_settings(PRODUITS_FACETS_BACKGROUND=True)
+    def test_stale_index_is_served_while_rebuilding(self):
+        stale = facets.get_index()
+        self.dell8.is_active = False
+        with self.captureOnCommitCallbacks(execute=True):
+            self.dell8.save()
+        with mock.patch('produits.facets.threading.Thread') as thread:
+            self.assertIs(facets.get_index(), stale)
+            self.assertIs(facets.get_index(), stale)
+            data = self.search(brand=self.dell.pk)
+        # Une seule reconstruction lancée ; réponse périmée non mise en cache
+        self.assertEqual(thread.call_count, 1)
+        self.assertEqual(data['count'], 2)
+        target, args = thread.call_args.kwargs['target'], thread.call_args.kwargs['args']
+        with mock.patch('produits.facets.connections'):
+            target(*args)
+        self.assertEqual(self.search(brand=self.dell.pk)['count'], 1)
+
+
+class BulkWriteTests(APITestMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.product = create_catalogue(1)[0]
+        self.refs = {
+            'brand_id': self.product.brand_id, 'category_id': self.product.category_id,
+            'product_type_id': self.product.product_type_id,
+        }
+
+    def post(self, name, items):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.post(reverse(name), items, format='json')
+        return response, len(ctx.captured_queries)
+
+    def products(self, count, prefix):
+        return [{'name': f'{prefix} {i}', 'price': '10.00', **self.refs} for i in range(count)]
+
+    def test_query_count_is_constant(self):
+        response, small = self.post('product-bulk', self.products(2, 'Petit lot'))
+        self.assertEqual(response.status_code, 201)
+        response, large = self.post('product-bulk', self.products(30, 'Grand lot'))
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(large, small)
+        self.assertEqual([r['status'] for r in response.data['results']], ['created'] * 30)
+        self.assertEqual(response.data['results'][0]['data']['slug'], 'grand-lot-0')
+        ids = [r['id'] for r in response.data['results']]
+        self.assertEqual(ProductAvailability.objects.filter(product_id__in=ids).count(), 30)
+
+        options = list(ProductAttributeOption.objects.values_list('pk', flat=True))
+        warehouses = list(Warehouse.objects.values_list('pk', flat=True))
+        response, small = self.post('product-attribute-value-bulk', [
+            {'product': ids[0], 'option': option} for option in options
+        ])
+        self.assertEqual(response.status_code, 201)
+        response, large = self.post('product-attribute-value-bulk', [
+            {'product': pk, 'option': option} for pk in ids[1:] for option in options
+        ])
+        self.assertEqual(large, small)
+        response, small = self.post('stock-bulk', [
+            {'product': ids[0], 'warehouse': warehouse, 'units': 5} for warehouse in warehouses
+        ])
+        self.assertEqual(response.status_code, 201)
+        response, large = self.post('stock-bulk', [
+            {'product': pk, 'warehouse': warehouse, 'units': 5} for pk in ids[1:] for warehouse in warehouses
+        ])
+        self.assertEqual(large, small)
+        self.assertEqual(ProductAvailability.objects.get(product_id=ids[-1]).available_units, 10)
+
+    def test_invalid_item_rolls_back_whole_batch(self):
+        items = self.products(3, 'Lot')
+        items[1]['brand_id'] = 999
+        items[2]['slug'] = self.product.slug
+        before = Product.objects.count()
+        response, _ = self.post('product-bulk', items)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual([r['status'] for r in response.data['results']], ['valid', 'error', 'error'])
+        self.assertIn('brand_id', response.data['results'][1]['errors'])
+        self.assertIn('slug', response.data['results'][2]['errors'])
+        self.assertEqual(Product.objects.count(), before)
+
+    def test_update_by_id(self):
+        stock = Stock.objects.filter(product=self.product).first()
+        response, _ = self.post('product-bulk', [{'id': self.product.pk, 'price': '42.00'}])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['results'][0]['status'], 'updated')
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.price, Decimal('42.00'))
+        self.assertEqual(self.product.name, 'Produit 0')
+
+        response, _ = self.post('stock-bulk', [{'id': stock.pk, 'units': 3}, {'id': 999, 'units': 1}])
+        self.assertEqual(response.status_code, 400)
+        response, _ = self.post('stock-bulk', [{'id': stock.pk, 'units': 3}])
+        self.assertEqual(response.status_code, 200)
+        # 10 + 10 unités -> 3 + 10
+        self.assertEqual(ProductAvailability.objects.get(product=self.product).available_units, 13)
+
+
+class KeysetPaginationTests(APITestMixin, TestCase):
+
+    def test_walks_all_pages_forward_and_back(self):
+        products = create_catalogue(7)
+        url = reverse('product-list-create')
+        response = self.client.get(url, {'page_size': 3})
+        seen = [p['id'] for p in response.data['results']]
+        self.assertIsNone(response.data['previous'])
+        pages = [response.data]
+        while response.data['next']:
+            response = self.client.get(response.data['next'])
+            pages.append(response.data)
+            seen.extend(p['id'] for p in response.data['results'])
+        self.assertEqual(seen, [p.pk for p in products])
+
+        response = self.client.get(pages[-1]['previous'])
+        self.assertEqual(response.data['results'], pages[-2]['results'])
+
+    def test_unpaginated_without_parameters(self):
+        create_catalogue(2)
+        response = self.client.get(reverse('product-list-create'))
+        self.assertIsInstance(response.data, list)
+
+    def test_invalid_cursor(self):
+        response = self.client.get(reverse('product-list-create'), {'cursor': 'abc'})
+        self.assertEqual(response.status_code, 404)
+
+
+class ProductResponseCacheTests(APITestMixin, TestCase):
+
+    def test_detail_is_cached_and_invalidated(self):
+        product = create_catalogue(1)[0]
+        url = reverse('product-detail', args=[product.pk])
+        etag = self.client.get(url)['ETag']
+        with self.assertNumQueries(0):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        image = product.images.first()
+        image.alt_text = 'Vue de face'
+        with self.captureOnCommitCallbacks(execute=True):
+            image.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_versions_change_after_commit(self):
+        product = create_catalogue(1)[0]
+        scopes = [cache.LIST_SCOPE, cache.FACETS_SCOPE, cache.product_scope(product.pk)]
+        before = cache.get_versions(scopes)
+        with self.captureOnCommitCallbacks() as callbacks:
+            product.price = Decimal('90.00')
+            product.save()
+        self.assertEqual(cache.get_versions(scopes), before)
+        for callback in callbacks:
+            callback()
+        after = cache.get_versions(scopes)
+        self.assertTrue(all(after[scope] != before[scope] for scope in scopes))
+
+    def test_list_invalidated_by_brand_change(self):
+        product = create_catalogue(1)[0]
+        url = reverse('product-list-create')
+        self.client.get(url)
+        Brand.objects.filter(pk=product.brand_id).update(name='Ignoré')  # pas de signal
+        self.assertEqual(self.client.get(url).data[0]['brand']['name'], 'Lenovo')
+        brand = product.brand
+        brand.name = 'Lenovo Pro'
+        with self.captureOnCommitCallbacks(execute=True):
+            brand.save()
+        self.assertEqual(self.client.get(url).data[0]['brand']['name'], 'Lenovo Pro')
+
+
+@override_settings(PRODUITS_SEARCH_BACKEND='produits.search.SQLiteFTSBackend')
+class SearchTests(APITestMixin, TestCase):
+    """Recherche plein texte (index FTS5 de produits.search)."""
+
+    def setUp(self):
+        super().setUp()
+        first = create_catalogue(1)[0]
+        self.refs = {'category': first.category, 'brand': first.brand, 'product_type': first.product_type}
+
+    def create(self, name, description='', **kwargs):
+        return Product.objects.create(name=name, description=description, price=Decimal('10.00'), **self.refs, **kwargs)
+
+    def search(self, q, **params):
+        response = self.client.get(reverse('product-search'), {'q': q, **params})
+        self.assertEqual(response.status_code, 200)
+        return [product['id'] for product in response.data]
+
+    def test_prefix_matching(self):
+        laptop = self.create('Laptop Harmattan')
+        self.assertEqual(self.search('lapt'), [laptop.pk])
+        self.assertEqual(self.search('harm lap'), [laptop.pk])
+        self.assertEqual(self.search('laptops'), [])
+
+    def test_accent_folding(self):
+        screen = self.create('Écran Savane')
+        self.assertEqual(self.search('ecran'), [screen.pk])
+        self.assertEqual(self.search('ÉCRAN sav'), [screen.pk])
+
+    def test_bm25_ranks_name_matches_first(self):
+        in_description = self.create('Chargeur', 'Compatible avec le Baobab')
+        in_name = self.create('Baobab Max')
+        self.assertEqual(self.search('baobab'), [in_name.pk, in_description.pk])
+
+    def test_inactive_products_are_not_indexed(self):
+        for i in range(3):
+            self.create(f'Sahel {i}', is_active=False)
+        active = self.create('Sahel actif')
+        # LIMIT appliqué aux seuls produits actifs
+        self.assertEqual(self.search('sahel', limit=1), [active.pk])
+        active.is_active = False
+        active.save()
+        self.assertEqual(search.get_backend().search('sahel'), [])
+        active.is_active = True
+        active.save()
+        search.get_backend().rebuild()
+        self.assertEqual(search.get_backend().search('sahel'), [active.pk])
+
+
+class CategoryTreeTests(APITestMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.electronics = Category.objects.create(name='Electronics')
+        self.computers = Category.objects.create(name='Computers', parent=self.electronics)
+        self.laptops = Category.objects.create(name='Laptops', parent=self.computers)
+        self.software = Category.objects.create(name='Software')
+
+    def test_descendants_and_ancestors(self):
+        self.assertEqual(list(self.electronics.get_descendants()), [self.computers, self.laptops])
+        with self.assertNumQueries(1):
+            self.assertEqual(list(self.laptops.get_ancestors()), [self.electronics, self.computers])
+
+    def test_move_subtree(self):
+        self.computers.parent = self.software
+        self.computers.save()
+        self.laptops.refresh_from_db()
+        self.assertEqual(self.laptops.depth, 2)
+        self.assertEqual(list(self.laptops.get_ancestors()), [self.software, self.computers])
+        self.assertEqual(list(self.electronics.get_descendants()), [])
+
+    def test_cannot_move_under_descendant(self):
+        response = self.client.patch(
+            reverse('category-detail', args=[self.electronics.pk]), {'parent': self.laptops.pk}, format='json'
+        )
+        self.assertEqual(response.status_code, 400)
+
+    def test_delete_reroots_children(self):
+        self.electronics.delete()
+        self.laptops.refresh_from_db()
+        self.assertEqual(list(self.laptops.get_ancestors()), [self.computers])
+
+    def test_product_list_category_tree_filter(self):
+        product = create_catalogue(1)[0]
+        product.category = self.laptops
+        product.save()
+        url = reverse('product-list-create')
+        response = self.client.get(url, {'category_tree': self.electronics.pk})
+        self.assertEqual([p['id'] for p in response.data], [product.pk])
+        self.assertEqual(self.client.get(url, {'category_tree': self.software.pk}).data, [])
+
+    def test_full_tree(self):
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('category-tree'))
+        self.assertEqual(response.data[0]['children'][0]['children'][0]['name'], 'Laptops')
+
+
+class StockReservationTests(APITestMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.product = create_catalogue(1)[0]
+        self.stocks = list(Stock.objects.filter(product=self.product).order_by('id'))  # 10 unités chacun
+
+    def units(self, field):
+        return [getattr(s, field) for s in Stock.objects.filter(product=self.product).order_by('id')]
+
+    def test_split_across_warehouses(self):
+        reservation = reservations.reserve([{'product': self.product.pk, 'quantity': 15}])
+        self.assertEqual(sorted(line.quantity for line in reservation.lines.all()), [5, 10])
+        self.assertEqual(sum(self.units('units_reserved')), 15)
+
+    def test_all_or_nothing(self):
+        other = create_catalogue(1, prefix='Autre')[0]
+        with self.assertRaises(reservations.InsufficientStock):
+            reservations.reserve([
+                {'product': other.pk, 'quantity': 5},
+                {'product': self.product.pk, 'quantity': 21},
+            ])
+        self.assertFalse(StockReservation.objects.exists())
+        self.assertEqual(Stock.objects.filter(units_reserved__gt=0).count(), 0)
+
+    def test_lines_with_and_without_warehouse(self):
+        other = create_catalogue(1, prefix='Autre')[0]
+        reservations.reserve([
+            {'product': self.product.pk, 'quantity': 4, 'warehouse': self.stocks[1].warehouse_id},
+            {'product': other.pk, 'quantity': 1},
+            {'product': self.product.pk, 'quantity': 12},
+        ])
+        self.assertEqual(self.units('units_reserved'), [10, 6])
+
+    def test_confirm_and_release(self):
+        sold = reservations.reserve([{'product': self.product.pk, 'quantity': 3, 'warehouse': self.stocks[0].warehouse_id}])
+        reservations.confirm(sold.pk)
+        released = reservations.reserve([{'product': self.product.pk, 'quantity': 4}])
+        reservations.release(released.pk)
+        self.assertEqual(self.units('units'), [7, 10])
+        self.assertEqual(self.units('units_sold'), [4, 1])
+        self.assertEqual(self.units('units_reserved'), [0, 0])
+        with self.assertRaises(reservations.ReservationClosed):
+            reservations.confirm(released.pk)
+
+    def test_expired_reservations_are_released(self):
+        reservation = reservations.reserve([{'product': self.product.pk, 'quantity': 20}])
+        StockReservation.objects.filter(pk=reservation.pk).update(expires_at=timezone.now() - timedelta(seconds=1))
+        # L'échéance libère le stock pour la réservation suivante
+        reservations.reserve([{'product': self.product.pk, 'quantity': 20}])
+        reservation.refresh_from_db()
+        self.assertEqual(reservation.status, StockReservation.EXPIRED)
+        with self.assertRaises(reservations.ReservationClosed):
+            reservations.confirm(reservation.pk)
+
+    def test_api(self):
+        url = reverse('reservation-list-create')
+        response = self.client.post(url, {'lines': [{'product': self.product.pk, 'quantity': 25}]}, format='json')
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.data['available'], 20)
+
+        response = self.client.post(url, {'lines': [{'product': self.product.pk, 'quantity': 2}]}, format='json')
+        self.assertEqual(response.status_code, 201)
+        confirm_url = reverse('reservation-confirm', args=[response.data['id']])
+        self.assertEqual(self.client.post(confirm_url).data['status'], 'confirmed')
+        self.assertEqual(self.client.post(confirm_url).status_code, 409)
+
+
+def read_uncommitted(sender, connection, **kwargs):
+    connection.cursor().execute('PRAGMA read_uncommitted = 1')
+
+
+# L'index FTS5 supporte mal le cache partagé de la base de test en mémoire
+@override_settings(
+    PRODUITS_SEARCH_BACKEND='produits.search.DatabaseSearchBackend', PRODUITS_IMAGE_WORKERS=0,
+)
+class ConcurrentStockReservationTests(TransactionTestCase):
+    """
+    Réservations simultanées par l'API, un client par thread : paniers de
+    plusieurs lignes sur plusieurs entrepôts, dans des ordres différents.
+    Jamais de survente, ni de réservation partielle.
+    """
+    threads = 10
+    requests_per_thread = 30
+
+    def test_no_oversell_under_contention(self):
+        # Les images de create_catalogue n'existent pas sur le disque
+        with self.assertLogs('produits.images', 'WARNING'):
+            a, b, c = (p.pk for p in create_catalogue(3))   # 2 entrepôts x 10 unités chacun
+        first, second = Warehouse.objects.order_by('pk').values_list('pk', flat=True)
+        baskets = [
+            [{'product': a, 'quantity': 1, 'warehouse': first}, {'product': b, 'quantity': 1, 'warehouse': second}],
+            [{'product': b, 'quantity': 2}, {'product': a, 'quantity': 1, 'warehouse': second}],
+            [{'product': c, 'quantity': 1, 'warehouse': second}, {'product': a, 'quantity': 1},
+             {'product': c, 'quantity': 1, 'warehouse': first}],
+            [{'product': c, 'quantity': 3}],
+        ]
+        users = [
+            User.objects.create_user(email=f'client{n}@rohstore.com', password='motdepasse', first_name='C', last_name=str(n))
+            for n in range(self.threads)
+        ]
+        # La base de test en mémoire (cache partagé) verrouille les tables en
+        # lecture et refuse un verrou occupé sans attendre busy_timeout, là où
+        # le journal WAL fait attendre : lectures sans verrou et plus de
+        # tentatives. Les écritures restent en concurrence.
+        connection_created.connect(read_uncommitted, dispatch_uid='tests.read_uncommitted')
+        self.addCleanup(connection_created.disconnect, dispatch_uid='tests.read_uncommitted')
+        patcher = mock.patch.object(reservations, 'MAX_ATTEMPTS', 100)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        url = reverse('reservation-list-create')
+        results = []
+        barrier = threading.Barrier(self.threads)
+
+        def worker(n):
+            client = APIClient()
+            client.force_authenticate(users[n])
+            barrier.wait()
+            try:
+                for i in range(self.requests_per_thread):
+                    basket = baskets[(n + i) % len(baskets)]
+                    response = client.post(url, {'lines': basket}, format='json')
+                    results.append((basket, response.status_code, response.data))
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=worker, args=(n,)) for n in range(self.threads)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(results), self.threads * self.requests_per_thread)
+        self.assertEqual({status for _, status, _ in results}, {201, 409})
+        created = [(basket, data) for basket, status, data in results if status == 201]
+        # Tout ou rien : chaque réservation porte exactement ses lignes demandées
+        for basket, data in created:
+            requested, obtained = Counter(), Counter()
+            for line in basket:
+                requested[line['product'], line.get('warehouse')] += line['quantity']
+            for line in data['lines']:
+                key = (line['product'], line['warehouse'])
+                obtained[key if key in requested else (line['product'], None)] += line['quantity']
+            self.assertEqual(obtained, requested)
+        self.assertEqual(StockReservation.objects.count(), len(created))
+        for stock in Stock.objects.all():
+            reserved = sum(stock.reservation_lines.values_list('quantity', flat=True))
+            self.assertEqual(stock.units_reserved, reserved)
+            self.assertLessEqual(stock.units_reserved, stock.units)
+
+
+class ProductAvailabilityTests(APITestMixin, TestCase):
+
+    def test_kept_in_sync_with_stock_writes(self):
+        product = create_catalogue(1)[0]
+        self.assertEqual(product.availability.available_units, 20)
+        stock = Stock.objects.filter(product=product).first()
+        stock.units = 4
+        stock.save()
+        with self.captureOnCommitCallbacks(execute=True):
+            reservations.reserve([{'product': product.pk, 'quantity': 3}])
+        availability = ProductAvailability.objects.get(product=product)
+        self.assertEqual((availability.units, availability.units_reserved, availability.available_units), (14, 3, 11))
+        self.assertEqual(sorted(w['warehouse'] for w in availability.per_warehouse), ['Bobo-Dioulasso', 'Ouagadougou'])
+        stock.delete()
+        self.assertEqual(ProductAvailability.objects.get(product=product).units, 10)
+
+    def test_removed_with_its_product(self):
+        product = create_catalogue(1)[0]
+        self.assertEqual(self.client.delete(reverse('product-detail', args=[product.pk])).status_code, 204)
+        self.assertFalse(ProductAvailability.objects.exists())
+        connection.check_constraints()
+
+    def test_exposed_on_product_detail(self):
+        product = create_catalogue(1)[0]
+        response = self.client.get(reverse('product-detail', args=[product.pk]))
+        self.assertEqual(response.data['available_units'], 20)
+
+    def test_admin_changelist_query_count_is_constant(self):
+        admin = User.objects.create_superuser(
+            email='admin@rohstore.com', password='motdepasse', first_name='Admin', last_name='Admin'
+        )
+        self.client.force_login(admin)
+        url = reverse('admin:produits_product_changelist')
+        create_catalogue(2)
+        with CaptureQueriesContext(connection) as small:
+            self.assertEqual(self.client.get(url).status_code, 200)
+        create_catalogue(20)
+        with CaptureQueriesContext(connection) as large:
+            self.assertContains(self.client.get(url), 'Bobo-Dioulasso: 10')
+        self.assertEqual(len(small), len(large))
+
+
+def make_upload(name='photo.png', size=(1200, 800)):
+    buffer = io.BytesIO()
+    Image.new('RGBA', size, (200, 30, 30, 255)).save(buffer, 'PNG')
+    return SimpleUploadedFile(name, buffer.getvalue(), content_type='image/png')
+
+
+class ImageDerivativeTests(APITestMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        overrides = override_settings(
+            MEDIA_ROOT=media_root, PRODUITS_IMAGE_WORKERS=0, PRODUITS_IMAGE_WIDTHS=(320, 640, 2048),
+        )
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        self.product = create_catalogue(1)[0]
+
+    def test_generated_on_upload(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            image = ProductImage.objects.create(product=self.product, image=make_upload())
+        image.refresh_from_db()
+        variants = image.derivatives['variants']
+        # Pas d'agrandissement : 2048 se ramène à la largeur de l'original
+        self.assertEqual(sorted(variants['webp'], key=int), ['320', '640', '1200'])
+        name = variants['webp']['320']
+        self.assertIn(f".320w.{image.derivatives['digest'][:16]}.webp", name)
+        with image.image.storage.open(name) as f:
+            self.assertEqual(Image.open(f).size, (320, 213))
+
+        data = self.client.get(reverse('product-image-detail', args=[image.pk])).data
+        self.assertTrue(data['srcset']['jpeg'].endswith('1200w'))
+        self.assertIn('http://testserver/media/', data['srcset']['webp'])
+
+    def test_lazy_generation(self):
+        brand = Brand.objects.create(name='Dell', logo=make_upload('logo.png', (500, 100)))
+        srcset = self.client.get(reverse('brand-detail', args=[brand.pk])).data['srcset']
+        self.assertIn(reverse('image-derivative', args=['brand', brand.pk, 320, 'webp']), srcset['webp'])
+
+        response = self.client.get(reverse('image-derivative', args=['brand', brand.pk, 640, 'jpeg']))
+        self.assertEqual(response.status_code, 302)
+        brand.refresh_from_db()
+        self.assertEqual(response['Location'], brand.logo.storage.url(brand.logo_derivatives['variants']['jpeg']['500']))
+        # Deuxième appel : servi depuis le cache disque, sans régénération
+        with self.assertNumQueries(1):
+            self.client.get(reverse('image-derivative', args=['brand', brand.pk, 640, 'jpeg']))
+        self.assertEqual(self.client.get(reverse('image-derivative', args=['brand', brand.pk, 123, 'jpeg'])).status_code, 404)
+
+    def test_generations_are_throttled(self):
+        brand = Brand.objects.create(name='Dell', logo=make_upload('logo.png', (500, 100)))
+        url = lambda width, fmt: reverse('image-derivative', args=['brand', brand.pk, width, fmt])
+        with mock.patch.object(ScopedRateThrottle, 'THROTTLE_RATES', {'image-derivatives': '2/min'}):
+            self.assertEqual(self.client.get(url(320, 'webp')).status_code, 302)
+            self.assertEqual(self.client.get(url(320, 'jpeg')).status_code, 302)
+            self.assertEqual(self.client.get(url(640, 'webp')).status_code, 429)
+            # Déclinaison déjà générée : redirection sans limite
+            self.assertEqual(self.client.get(url(320, 'webp')).status_code, 302)
+
+
+class ContentAddressedStorageTests(APITestMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        overrides = override_settings(MEDIA_ROOT=media_root, PRODUITS_IMAGE_WORKERS=0)
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        self.product = create_catalogue(1)[0]
+
+    def test_same_upload_stored_once_and_refcounted(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            first = ProductImage.objects.create(product=self.product, image=make_upload('a.png'))
+            second = ProductImage.objects.create(product=self.product, image=make_upload('b.png'))
+        self.assertEqual(first.image.name, second.image.name)
+        self.assertRegex(first.image.name, r'^product_images/[0-9a-f]{2}/[0-9a-f]{64}\.png$')
+        self.assertEqual(MediaBlob.objects.get(name=first.image.name).refcount, 2)
+
+        name = first.image.name
+        variant = ProductImage.objects.get(pk=first.pk).derivatives['variants']['webp']['320']
+        with self.captureOnCommitCallbacks(execute=True):
+            first.delete()
+        self.assertTrue(media_storage.exists(name))
+        with self.captureOnCommitCallbacks(execute=True):
+            second.delete()
+        self.assertFalse(media_storage.exists(name))
+        self.assertFalse(media_storage.exists(variant))
+        self.assertFalse(MediaBlob.objects.exists())
+
+    def test_reupload_before_deletion_keeps_the_file(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            first = ProductImage.objects.create(product=self.product, image=make_upload())
+        name = first.image.name
+        # Dernier départ puis même contenu renvoyé avant la suppression du fichier
+        with self.captureOnCommitCallbacks(execute=True):
+            first.delete()
+            image = ProductImage.objects.create(product=self.product, image=make_upload())
+        self.assertEqual(image.image.name, name)
+        self.assertTrue(media_storage.exists(name))
+        self.assertEqual(MediaBlob.objects.get(name=name).refcount, 1)
+
+    def test_dedupe_existing_media(self):
+        # Copies renommées par Django lors des collisions, antérieures au stockage par contenu
+        content = make_upload().read()
+        os.makedirs(media_storage.path('product_images'))
+        legacy = []
+        for suffix in ('', '_5c6RVkk', '_6igEoNj', '_mdYZDpO'):
+            name = f'product_images/518283214_n{suffix}.jpg'
+            with open(media_storage.path(name), 'wb') as f:
+                f.write(content)
+            legacy.append(ProductImage.objects.create(product=self.product, image=name).pk)
+
+        call_command('dedupe_media', stdout=io.StringIO())
+        names = set(ProductImage.objects.filter(pk__in=legacy).values_list('image', flat=True))
+        self.assertEqual(len(names), 1)
+        name = names.pop()
+        self.assertTrue(media_storage.exists(name))
+        self.assertFalse(media_storage.exists('product_images/518283214_n_5c6RVkk.jpg'))
+        self.assertEqual(MediaBlob.objects.get(name=name).refcount, 4)
+
+
+class MediaViewTests(TestCase):
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        overrides = override_settings(MEDIA_ROOT=media_root, MEDIA_SENDFILE=None)
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        self.content = bytes(range(256)) * 4
+        os.makedirs(os.path.join(media_root, 'brand_logos'))
+        with open(os.path.join(media_root, 'brand_logos', 'logo.png'), 'wb') as f:
+            f.write(self.content)
+        self.url = '/media/brand_logos/logo.png'
+
+    def test_conditional_requests(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), self.content)
+        self.assertEqual(response['Cache-Control'], 'public, max-age=3600')
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+        self.assertEqual(
+            self.client.get(self.url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified']).status_code, 304
+        )
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH='"autre"').status_code, 200)
+
+    def test_range_requests(self):
+        response = self.client.get(self.url, HTTP_RANGE='bytes=10-19')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], f'bytes 10-19/{len(self.content)}')
+        self.assertEqual(b''.join(response.streaming_content), self.content[10:20])
+        response = self.client.get(self.url, HTTP_RANGE='bytes=-5')
+        self.assertEqual(b''.join(response.streaming_content), self.content[-5:])
+        response = self.client.get(self.url, HTTP_RANGE=f'bytes={len(self.content)}-')
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], f'bytes */{len(self.content)}')
+        # If-Range périmé : fichier complet
+        self.assertEqual(self.client.get(self.url, HTTP_RANGE='bytes=0-1', HTTP_IF_RANGE='"ancien"').status_code, 200)
+
+    def test_content_addressed_names_are_immutable(self):
+        name = media_storage.save('brand_logos/logo.png', SimpleUploadedFile('logo.png', self.content))
+        response = self.client.get(f'/media/{name}')
+        self.assertEqual(response['Cache-Control'], 'public, max-age=31536000, immutable')
+
+    @override_settings(MEDIA_SENDFILE='x-accel-redirect')
+    def test_accel_redirect(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response['X-Accel-Redirect'], '/protected-media/brand_logos/logo.png')
+        self.assertEqual(response.content, b'')
+
+    def test_outside_media_root(self):
+        self.assertEqual(self.client.get('/media/../manage.py').status_code, 404)
+        self.assertEqual(self.client.get('/media/brand_logos/').status_code, 404)
+
+
+class MetricsTests(APITestMixin, TestCase):
+    """Instrumentation des requêtes (storer.metrics)."""
+
+    def setUp(self):
+        super().setUp()
+        metrics.registry.reset()
+
+    def test_server_timing_and_registry(self):
+        create_catalogue(3)
+        response = self.client.get(reverse('product-list-create'))
+        timing = dict(entry.split(';', 1) for entry in response['Server-Timing'].split(', '))
+        self.assertEqual(set(timing), {'total', 'db', 'serialize', 'render'})
+        self.assertRegex(timing['db'], r'desc="\d+ queries"')
+        stats = metrics.registry.snapshot()['GET /api/products/']
+        self.assertEqual(stats['count'], 1)
+        self.assertGreater(stats['mean']['queries'], 0)
+        self.assertEqual(stats['window']['size'], 1)
+        self.assertEqual(sum(stats['window']['histogram_ms'].values()), 1)
+
+    def test_duplicate_queries(self):
+        products = create_catalogue(3)
+
+        def n_plus_one(request):
+            for product in products:
+                list(Stock.objects.filter(product=product))
+            return JsonResponse({})
+
+        request = RequestFactory().get('/')
+        metrics.MetricsMiddleware(n_plus_one)(request)
+        duplicates = metrics.registry.snapshot()['GET /unresolved']['duplicate_queries']
+        self.assertEqual(len(duplicates), 1)
+        self.assertIn('produits_stock', duplicates[0]['sql'])
+
+    def test_schema_generation_sees_original_serializers(self):
+        response = self.client.get('/swagger.json/')
+        self.assertEqual(response.status_code, 200)
+        paths = response.json()['paths']
+        self.assertIn('Product', json.dumps(paths['/products/listing/']['get']['responses']['200']))
+        self.assertIn('/categories/{id}/descendants/', paths)
+
+    def test_metrics_endpoint_is_admin_only(self):
+        url = reverse('metrics')
+        self.assertEqual(self.client.get(url).status_code, 403)
+        self.user.is_staff = True
+        self.user.save()
+        self.client.get(reverse('category-tree'))
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('GET /api/categories/tree/', response.data['endpoints'])
+        self.assertEqual(self.client.delete(url).status_code, 204)
+        # Seule reste la remise à zéro elle-même
+        self.assertEqual(list(metrics.registry.snapshot()), ['DELETE /api/_metrics/'])
+
+
+class DatabaseConfigTests(TestCase):
+    """Configuration de la base par l'environnement (storer.database)."""
+
+    def test_sqlite_defaults(self):
+        config = database_config('/srv/storer', environ={})
+        self.assertEqual(config['ENGINE'], 'django.db.backends.sqlite3')
+        self.assertEqual(config['NAME'], '/srv/storer/db.sqlite3')
+        self.assertEqual(config['CONN_MAX_AGE'], 0)
+        self.assertFalse(config['CONN_HEALTH_CHECKS'])
+        self.assertEqual(config['OPTIONS'], {'transaction_mode': 'IMMEDIATE'})
+        self.assertEqual(sqlite_pragmas({})['journal_mode'], 'WAL')
+
+    def test_persistent_connections_are_health_checked(self):
+        config = database_config('/srv/storer', environ={'DB_CONN_MAX_AGE': '60'})
+        self.assertEqual(config['CONN_MAX_AGE'], 60)
+        self.assertTrue(config['CONN_HEALTH_CHECKS'])
+
+    def test_postgresql_pool(self):
+        config = database_config('/srv/storer', environ={
+            'DB_ENGINE': 'postgresql', 'DB_NAME': 'boutique', 'DB_HOST': 'db',
+            'DB_POOL': '1', 'DB_POOL_MAX_SIZE': '20', 'DB_CONN_MAX_AGE': '60',
+        })
+        self.assertEqual(config['ENGINE'], 'django.db.backends.postgresql')
+        self.assertEqual((config['NAME'], config['HOST']), ('boutique', 'db'))
+        # Le pool de Django refuse les connexions persistantes
+        self.assertEqual(config['CONN_MAX_AGE'], 0)
+        self.assertEqual(config['OPTIONS']['pool'], {'min_size': 2, 'max_size': 20, 'timeout': 10.0})
+
+    def test_unknown_engine(self):
+        with self.assertRaises(ValueError):
+            database_config('/srv/storer', environ={'DB_ENGINE': 'oracle'})
+
+    def test_pragmas_applied_on_connect(self):
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA busy_timeout')
+            self.assertEqual(cursor.fetchone()[0], settings.SQLITE_PRAGMAS['busy_timeout'])
+
+    def test_replicas(self):
+        replicas = replica_databases(database_config('/srv/storer', environ={}), environ={'DB_REPLICAS': 'a.sqlite3, b.sqlite3'})
+        self.assertEqual(list(replicas), ['replica1', 'replica2'])
+        self.assertEqual(replicas['replica2']['NAME'], 'b.sqlite3')
+        self.assertEqual(replicas['replica1']['TEST'], {'MIRROR': 'default'})
+
+
+@override_settings(DATABASE_REPLICAS=['replica'])
+class ReplicaRoutingTests(APITestMixin, TestCase):
+    """Lectures sur réplica avec deux fichiers SQLite (storer.routers)."""
+    # Résolu à setUpClass, une fois l'alias « replica » déclaré
+    databases = '__all__'
+
+    @classmethod
+    def setUpClass(cls):
+        # Réplica vide et jamais alimenté : ce qui s'y lit vient bien de lui
+        cls.replica_dir = tempfile.mkdtemp()
+        connections.settings['replica'] = {
+            **connections.settings['default'], 'NAME': os.path.join(cls.replica_dir, 'replica.sqlite3'),
+        }
+        call_command('migrate', database='replica', verbosity=0)
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        connections['replica'].close()
+        del connections['replica']
+        del connections.settings['replica']
+        shutil.rmtree(cls.replica_dir, ignore_errors=True)
+
+    def test_safe_requests_read_the_replica(self):
+        Warehouse.objects.create(name='Ouagadougou')
+        response = self.client.get(reverse('warehouse-list-create'))
+        self.assertEqual(response.data, [])
+        self.assertNotIn(STICKY_COOKIE, response.cookies)
+
+    def test_reads_follow_writes(self):
+        response = self.client.post(reverse('warehouse-list-create'), {'name': 'Bobo-Dioulasso'}, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertIn(STICKY_COOKIE, response.cookies)
+        # Le client renvoie le cookie : lecture sur la principale
+        response = self.client.get(reverse('warehouse-list-create'))
+        self.assertEqual([w['name'] for w in response.data], ['Bobo-Dioulasso'])
+        # Un autre client, sans écriture récente, lit le réplica
+        other = APIClient()
+        other.force_authenticate(self.user)
+        self.assertEqual(other.get(reverse('warehouse-list-create')).data, [])
+
+    def test_token_clients_are_pinned_without_cookies(self):
+        token = Token.objects.create(user=self.user)
+        client = APIClient(HTTP_AUTHORIZATION=f'Token {token.key}')
+        response = client.post(reverse('warehouse-list-create'), {'name': 'Koudougou'}, format='json')
+        self.assertEqual(response.status_code, 201)
+        client.cookies.clear()
+        response = client.get(reverse('warehouse-list-create'))
+        self.assertEqual([w['name'] for w in response.data], ['Koudougou'])
+
+    def test_outside_requests_use_the_primary(self):
+        self.assertEqual(ReplicaRouter().db_for_read(Product), 'default')
+
+    def test_cached_responses_are_filled_from_the_primary(self):
+        # Les images de create_catalogue n'existent pas sur le disque
+        with (
+            self.assertLogs('produits.images', 'WARNING'), override_settings(PRODUITS_IMAGE_WORKERS=0),
+            self.captureOnCommitCallbacks(execute=True),
+        ):
+            create_catalogue(2)
+        # Le réplica n'a pas encore les produits : rien de vide ne doit être rangé
+        # sous la nouvelle version
+        self.assertEqual(len(self.client.get(reverse('product-list-create')).data), 2)
+        self.assertEqual(len(self.client.get(reverse('product-list-create')).data), 2)
+
+    def test_issued_token_reads_the_primary(self):
+        response = APIClient().post(
+            reverse('login'), {'email': 'tests@rohstore.com', 'password': 'motdepasse'}, format='json'
+        )
+        client = APIClient(HTTP_AUTHORIZATION=f"Token {response.data['token']}")
+        Warehouse.objects.create(name='Banfora')
+        # Jeton et entrepôt absents du réplica
+        response = client.get(reverse('warehouse-list-create'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([w['name'] for w in response.data], ['Banfora'])
+
+    async def test_streamed_lists_read_the_replica(self):
+        await sync_to_async(create_catalogue)(1)
+        token = await Token.objects.acreate(user=self.user)
+        _, body = await async_get(reverse('async-product-list'), Authorization=f'Token {token.key}')
+        self.assertEqual(json.loads(body), [])
+
+    def test_token_lookups_read_the_primary(self):
+        client = APIClient(HTTP_AUTHORIZATION=f'Token {Token.objects.create(user=self.user).key}')
+        self.assertEqual(client.get(reverse('user_profile')).status_code, 200)
 
-# Create your tests here.
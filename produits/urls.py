@@ -1,10 +1,13 @@
 from django.urls import path
-from . import views
+from . import async_views, views
 
 urlpatterns = [
     # Category
     path('categories/', views.CategoryListCreateAPIView.as_view(), name='category-list-create'),
     path('categories/<int:pk>/', views.CategoryRetrieveUpdateDestroyAPIView.as_view(), name='category-detail'),
+    path('categories/tree/', views.CategoryTreeAPIView.as_view(), name='category-tree'),
+    path('categories/<int:pk>/descendants/', views.CategoryDescendantsAPIView.as_view(), name='category-descendants'),
+    path('categories/<int:pk>/ancestors/', views.CategoryAncestorsAPIView.as_view(), name='category-ancestors'),
 
     # Brand
     path('brands/', views.BrandListCreateAPIView.as_view(), name='brand-list-create'),
@@ -20,6 +23,7 @@ urlpatterns = [
 
     # Product Attribute Value
     path('attribute-values/', views.ProductAttributeValueListCreateAPIView.as_view(), name='product-attribute-value-list-create'),
+    path('attribute-values/bulk/', views.ProductAttributeValueBulkAPIView.as_view(), name='product-attribute-value-bulk'),
     path('attribute-values/<int:pk>/', views.ProductAttributeValueRetrieveUpdateDestroyAPIView.as_view(), name='product-attribute-value-detail'),
 
     path('attribute-options/', views.ProductAttributeOptionListCreateAPIView.as_view(), name='product-attribute-option-list-create'),
@@ -27,6 +31,7 @@ urlpatterns = [
     # Product Image
     path('images/', views.ProductImageListCreateAPIView.as_view(), name='product-image-list-create'),
     path('images/<int:pk>/', views.ProductImageRetrieveUpdateDestroyAPIView.as_view(), name='product-image-detail'),
+    path('derivatives/<slug:kind>/<int:pk>/<int:width>/<slug:fmt>/', views.ImageDerivativeAPIView.as_view(), name='image-derivative'),
 
     # Warehouse
     path('warehouses/', views.WarehouseListCreateAPIView.as_view(), name='warehouse-list-create'),
@@ -34,9 +39,26 @@ urlpatterns = [
 
     # Stock
     path('stocks/', views.StockListCreateAPIView.as_view(), name='stock-list-create'),
+    path('stocks/bulk/', views.StockBulkAPIView.as_view(), name='stock-bulk'),
     path('stocks/<int:pk>/', views.StockRetrieveUpdateDestroyAPIView.as_view(), name='stock-detail'),
 
+    # Réservations de stock
+    path('reservations/', views.StockReservationCreateAPIView.as_view(), name='reservation-list-create'),
+    path('reservations/<int:pk>/', views.StockReservationDetailAPIView.as_view(), name='reservation-detail'),
+    path('reservations/<int:pk>/confirm/', views.StockReservationConfirmAPIView.as_view(), name='reservation-confirm'),
+
     # Product
     path('products/', views.ProductListCreateAPIView.as_view(), name='product-list-create'),
     path('products/<int:pk>/', views.ProductRetrieveUpdateDestroyAPIView.as_view(), name='product-detail'),
+    path('products/bulk/', views.ProductBulkAPIView.as_view(), name='product-bulk'),
+    path('products/listing/', views.ProductListingAPIView.as_view(), name='product-listing'),
+    path('products/export/', views.ProductExportAPIView.as_view(), name='product-export'),
+    path('products/facets/', views.ProductFacetSearchAPIView.as_view(), name='product-facets'),
+    path('products/search/', views.ProductSearchAPIView.as_view(), name='product-search'),
+
+    # Lectures asynchrones (ASGI)
+    path('async/products/', async_views.AsyncProductListView.as_view(), name='async-product-list'),
+    path('async/products/<int:pk>/', async_views.AsyncProductDetailView.as_view(), name='async-product-detail'),
+    path('async/brands/', async_views.AsyncBrandListView.as_view(), name='async-brand-list'),
+    path('async/categories/', async_views.AsyncCategoryListView.as_view(), name='async-category-list'),
 ]
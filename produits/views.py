@@ -2,7 +2,7 @@ from rest_framework import generics
 from .models import (
     Category, Brand, ProductType, Product,
     ProductAttribute, ProductAttributeValue,
-    ProductImage, Stock, Warehouse, ProductAttributeOption
+    ProductImage, Stock, Warehouse, ProductAttributeOption, StockReservation
 )
 from .serializers import (
     CategorySerializer,
@@ -17,12 +17,36 @@ from .serializers import (
     StockSerializer,
     WarehouseSerializer,
     ProductCreateUpdateSerializer,
-    ProductAttributeOptionSerializer
+    ProductAttributeOptionSerializer,
+    ReservationRequestSerializer,
+    StockReservationSerializer
 )
 from rest_framework.parsers import MultiPartParser, FormParser
+from rest_framework.views import APIView
+from rest_framework.response import Response
+from django.db.models import Subquery
+from rest_framework.exceptions import ValidationError
+from django.http import StreamingHttpResponse
+from .prefetch import PlannedQuerysetMixin, SparseFieldsetMixin, plan_queryset
+from .cache import CachedResponseMixin, LIST_SCOPE, product_scope
+from .export import EXPORT_FORMATS, DEFAULT_CHUNK_SIZE, iter_products, iter_export
+from .facets import current_version, get_index
+from . import search
+from . import reservations
+from . import images
+from . import bulk
+from .fastpath import ProductListing
+from storer.metrics import InstrumentedViewMixin
+from storer.renderers import FastJSONRenderer
+from django.http import Http404, HttpResponseRedirect
+from rest_framework.permissions import AllowAny
+from rest_framework.throttling import ScopedRateThrottle
+from rest_framework import status
+from decimal import Decimal, InvalidOperation
 
 # CATEGORY
 class CategoryListCreateAPIView(generics.ListCreateAPIView):
+    keyset_ordering = ('name', 'id')
     queryset = Category.objects.all()
     serializer_class = CategorySerializer
 
@@ -32,8 +56,43 @@ class CategoryRetrieveUpdateDestroyAPIView(generics.RetrieveUpdateDestroyAPIView
     serializer_class = CategorySerializer
 
 
+class CategoryDescendantsAPIView(generics.ListAPIView):
+    keyset_ordering = ('path', 'id')
+    serializer_class = CategorySerializer
+
+    def get_queryset(self):
+        if getattr(self, 'swagger_fake_view', False):
+            return Category.objects.none()
+        category = generics.get_object_or_404(Category, pk=self.kwargs['pk'])
+        return Category.objects.descendants_of(category, include_self=False)
+
+
+class CategoryAncestorsAPIView(generics.ListAPIView):
+    serializer_class = CategorySerializer
+    pagination_class = None
+
+    def get_queryset(self):
+        if getattr(self, 'swagger_fake_view', False):
+            return Category.objects.none()
+        category = generics.get_object_or_404(Category, pk=self.kwargs['pk'])
+        return Category.objects.ancestors_of(category)
+
+
+class CategoryTreeAPIView(APIView):
+    """Taxonomie complète imbriquée, construite à partir d'une seule requête."""
+
+    def get(self, request):
+        nodes, roots = {}, []
+        for pk, name, parent_id, depth in Category.objects.tree().values_list('id', 'name', 'parent_id', 'depth'):
+            node = nodes[pk] = {'id': pk, 'name': name, 'parent': parent_id, 'depth': depth, 'children': []}
+            parent = nodes.get(parent_id)
+            (parent['children'] if parent is not None else roots).append(node)
+        return Response(roots)
+
+
 # BRAND
 class BrandListCreateAPIView(generics.ListCreateAPIView):
+    keyset_ordering = ('name', 'id')
     queryset = Brand.objects.all()
     serializer_class = BrandSerializer
     parser_classes = (MultiPartParser, FormParser)  # Important pour 
@@ -49,6 +108,7 @@ class BrandRetrieveUpdateDestroyAPIView(generics.RetrieveUpdateDestroyAPIView):
         return {'request': self.request}
 # PRODUCT TYPE
 class ProductTypeListCreateAPIView(generics.ListCreateAPIView):
+    keyset_ordering = ('name', 'id')
     queryset = ProductType.objects.all()
     serializer_class = ProductTypeSerializer
 
@@ -60,6 +120,7 @@ class ProductTypeRetrieveUpdateDestroyAPIView(generics.RetrieveUpdateDestroyAPIV
 
 # PRODUCT ATTRIBUTE
 class ProductAttributeListCreateAPIView(generics.ListCreateAPIView):
+    keyset_ordering = ('name', 'id')
     queryset = ProductAttribute.objects.all()
     serializer_class = ProductAttributeSerializer
 
@@ -70,7 +131,7 @@ class ProductAttributeRetrieveUpdateDestroyAPIView(generics.RetrieveUpdateDestro
 
 
 # PRODUCT ATTRIBUTE VALUE
-class ProductAttributeValueListCreateAPIView(generics.ListCreateAPIView):
+class ProductAttributeValueListCreateAPIView(InstrumentedViewMixin, PlannedQuerysetMixin, generics.ListCreateAPIView):
     queryset = ProductAttributeValue.objects.all()
 
     def get_serializer_class(self):
@@ -79,7 +140,7 @@ class ProductAttributeValueListCreateAPIView(generics.ListCreateAPIView):
         return ProductAttributeValueReadSerializer
 
 
-class ProductAttributeValueRetrieveUpdateDestroyAPIView(generics.RetrieveUpdateDestroyAPIView):
+class ProductAttributeValueRetrieveUpdateDestroyAPIView(InstrumentedViewMixin, PlannedQuerysetMixin, generics.RetrieveUpdateDestroyAPIView):
     queryset = ProductAttributeValue.objects.all()
 
     def get_serializer_class(self):
@@ -91,7 +152,7 @@ class ProductAttributeValueRetrieveUpdateDestroyAPIView(generics.RetrieveUpdateD
 # PRODUCT ATTRIBUTE OPTION
 from django_filters.rest_framework import DjangoFilterBackend
 
-class ProductAttributeOptionListCreateAPIView(generics.ListCreateAPIView):
+class ProductAttributeOptionListCreateAPIView(InstrumentedViewMixin, PlannedQuerysetMixin, generics.ListCreateAPIView):
     queryset = ProductAttributeOption.objects.all()
     serializer_class = ProductAttributeOptionSerializer
     filter_backends = [DjangoFilterBackend]
@@ -99,7 +160,7 @@ class ProductAttributeOptionListCreateAPIView(generics.ListCreateAPIView):
 
 
 
-class ProductAttributeOptionRetrieveUpdateDestroyAPIView(generics.RetrieveUpdateDestroyAPIView):
+class ProductAttributeOptionRetrieveUpdateDestroyAPIView(InstrumentedViewMixin, PlannedQuerysetMixin, generics.RetrieveUpdateDestroyAPIView):
     queryset = ProductAttributeOption.objects.all()
     serializer_class = ProductAttributeOptionSerializer
 
@@ -119,6 +180,7 @@ class ProductImageRetrieveUpdateDestroyAPIView(generics.RetrieveUpdateDestroyAPI
 
 # WAREHOUSE
 class WarehouseListCreateAPIView(generics.ListCreateAPIView):
+    keyset_ordering = ('name', 'id')
     queryset = Warehouse.objects.all()
     serializer_class = WarehouseSerializer
 
@@ -129,16 +191,105 @@ class WarehouseRetrieveUpdateDestroyAPIView(generics.RetrieveUpdateDestroyAPIVie
 
 
 # STOCK
-class StockListCreateAPIView(generics.ListCreateAPIView):
+class StockListCreateAPIView(InstrumentedViewMixin, PlannedQuerysetMixin, generics.ListCreateAPIView):
     queryset = Stock.objects.all()
     serializer_class = StockSerializer
 
 
-class StockRetrieveUpdateDestroyAPIView(generics.RetrieveUpdateDestroyAPIView):
+class StockRetrieveUpdateDestroyAPIView(InstrumentedViewMixin, PlannedQuerysetMixin, generics.RetrieveUpdateDestroyAPIView):
     queryset = Stock.objects.all()
     serializer_class = StockSerializer
 
 
+# RÉSERVATIONS DE STOCK
+class StockReservationQuerysetMixin:
+    """Chacun ne voit que ses réservations ; le staff les voit toutes."""
+
+    def get_queryset(self):
+        queryset = StockReservation.objects.prefetch_related('lines__stock')
+        if not self.request.user.is_staff:
+            queryset = queryset.filter(user=self.request.user)
+        return queryset
+
+
+class StockReservationCreateAPIView(StockReservationQuerysetMixin, generics.ListCreateAPIView):
+    keyset_ordering = ('created_at', 'id')
+    serializer_class = StockReservationSerializer
+
+    def create(self, request, *args, **kwargs):
+        data = ReservationRequestSerializer(data=request.data)
+        data.is_valid(raise_exception=True)
+        try:
+            reservation = reservations.reserve(
+                data.validated_data['lines'], ttl=data.validated_data.get('ttl'), user=request.user
+            )
+        except reservations.InsufficientStock as exc:
+            return Response({
+                'detail': str(exc), 'product': exc.product_id,
+                'requested': exc.requested, 'available': exc.available,
+            }, status=status.HTTP_409_CONFLICT)
+        reservation = self.get_queryset().get(pk=reservation.pk)
+        return Response(self.get_serializer(reservation).data, status=status.HTTP_201_CREATED)
+
+
+class StockReservationDetailAPIView(StockReservationQuerysetMixin, generics.RetrieveDestroyAPIView):
+    """GET : détail ; DELETE : libère les unités réservées."""
+    serializer_class = StockReservationSerializer
+
+    def destroy(self, request, *args, **kwargs):
+        return self.close(reservations.release)
+
+    def close(self, action):
+        reservation = self.get_object()
+        try:
+            action(reservation.pk)
+        except reservations.ReservationError as exc:
+            return Response({'detail': str(exc)}, status=status.HTTP_409_CONFLICT)
+        return Response(self.get_serializer(self.get_queryset().get(pk=reservation.pk)).data)
+
+
+class StockReservationConfirmAPIView(StockReservationDetailAPIView):
+    http_method_names = ['post', 'options']
+
+    def post(self, request, *args, **kwargs):
+        return self.close(reservations.confirm)
+
+
+# ÉCRITURES EN MASSE
+class BulkWriteAPIView(APIView):
+    """
+    POST d'une liste d'éléments (avec « id » : mise à jour, sans : création),
+    écrite en une transaction. Réponse : un résultat par élément, dans l'ordre ;
+    400 et aucune écriture si un élément est invalide.
+    """
+    writer_class = None
+
+    def post(self, request, *args, **kwargs):
+        items = request.data
+        if not isinstance(items, list) or not all(isinstance(item, dict) for item in items):
+            raise ValidationError({'detail': "Liste d'objets attendue"})
+        if len(items) > bulk.get_max_items():
+            raise ValidationError({'detail': f"Au plus {bulk.get_max_items()} éléments par lot"})
+        written, results = self.writer_class(context={'request': request, 'view': self}).run(items)
+        if not written:
+            return Response({'detail': "Lot invalide, rien n'a été écrit", 'results': results},
+                            status=status.HTTP_400_BAD_REQUEST)
+        created = any(result['status'] == bulk.CREATED for result in results)
+        return Response({'results': results}, status=status.HTTP_201_CREATED if created else status.HTTP_200_OK)
+
+
+class ProductBulkAPIView(BulkWriteAPIView):
+    writer_class = bulk.ProductBulkWriter
+
+
+class ProductAttributeValueBulkAPIView(BulkWriteAPIView):
+    writer_class = bulk.ProductAttributeValueBulkWriter
+
+
+class StockBulkAPIView(BulkWriteAPIView):
+    writer_class = bulk.StockBulkWriter
+
+
 # # PRODUCT
 # class ProductListCreateAPIView(generics.ListCreateAPIView):
 #     queryset = Product.objects.all()
@@ -150,19 +301,209 @@ class StockRetrieveUpdateDestroyAPIView(generics.RetrieveUpdateDestroyAPIView):
 #     serializer_class = ProductSerializer
 
 
-class ProductListCreateAPIView(generics.ListCreateAPIView):
+def filter_category_tree(queryset, params):
+    tree = params.get('category_tree')
+    if tree:
+        try:
+            tree = int(tree)
+        except ValueError:
+            raise ValidationError({'category_tree': "Identifiant de catégorie attendu"})
+        # Sous-arbre complet en une seule requête (préfixe du chemin matérialisé)
+        queryset = queryset.filter(
+            category__path__startswith=Subquery(Category.objects.filter(pk=tree).values('path')[:1])
+        )
+    return queryset
+
+
+class ProductListCreateAPIView(InstrumentedViewMixin, CachedResponseMixin, SparseFieldsetMixin, generics.ListCreateAPIView):
+    keyset_ordering = ('created_at', 'id')
     queryset = Product.objects.all()
 
+    def get_cache_scopes(self):
+        return [LIST_SCOPE]
+
+    def get_queryset(self):
+        return filter_category_tree(super().get_queryset(), self.request.query_params)
+
     def get_serializer_class(self):
         if self.request.method == 'POST':
             return ProductCreateUpdateSerializer
         return ProductDetailSerializer  # GET list utilise lecture enrichie
 
 
-class ProductRetrieveUpdateDestroyAPIView(generics.RetrieveUpdateDestroyAPIView):
+class ProductRetrieveUpdateDestroyAPIView(InstrumentedViewMixin, CachedResponseMixin, SparseFieldsetMixin, generics.RetrieveUpdateDestroyAPIView):
     queryset = Product.objects.all()
 
+    def get_cache_scopes(self):
+        return [product_scope(self.kwargs['pk'])]
+
     def get_serializer_class(self):
         if self.request.method in ['PUT', 'PATCH']:
             return ProductCreateUpdateSerializer
         return ProductDetailSerializer  # GET détail utilise lecture enrichie
+
+
+class ProductListingAPIView(CachedResponseMixin, generics.ListAPIView):
+    """
+    Liste en lecture seule au format ProductSerializer, construite sans
+    serializer (cf. produits.fastpath) et encodée par FastJSONRenderer.
+    """
+    keyset_ordering = ('created_at', 'id')
+    queryset = Product.objects.all()
+    # Schéma de l'API uniquement : list() ne passe pas par le serializer
+    serializer_class = ProductSerializer
+    renderer_classes = [FastJSONRenderer]
+
+    def get_cache_scopes(self):
+        return [LIST_SCOPE]
+
+    def get_queryset(self):
+        return filter_category_tree(super().get_queryset(), self.request.query_params)
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        listing = ProductListing(request)
+        page = self.paginate_queryset(queryset.only(*self.keyset_ordering))
+        if page is not None:
+            return self.get_paginated_response(listing.build_for_ids([product.pk for product in page]))
+        return Response(listing.build(queryset))
+
+
+# RECHERCHE À FACETTES
+class ProductFacetSearchAPIView(CachedResponseMixin, APIView):
+    """
+    Filtre les produits actifs par options d'attribut (?option=), marque
+    (?brand=), catégorie et sous-catégories (?category=) et prix
+    (?price_min=, ?price_max=), et renvoie les comptes par facette.
+    """
+
+    def get_cache_scopes(self):
+        return [LIST_SCOPE]
+
+    def _ids(self, name):
+        try:
+            return [int(value) for value in self.request.query_params.getlist(name)]
+        except ValueError:
+            raise ValidationError({name: "Identifiants entiers attendus"})
+
+    def _decimal(self, name):
+        value = self.request.query_params.get(name)
+        if value in (None, ''):
+            return None
+        try:
+            return Decimal(value)
+        except InvalidOperation:
+            raise ValidationError({name: "Nombre attendu"})
+
+    def _int(self, name, default, maximum=None):
+        try:
+            value = max(0, int(self.request.query_params.get(name, default)))
+        except ValueError:
+            raise ValidationError({name: "Entier attendu"})
+        return min(value, maximum) if maximum is not None else value
+
+    def get(self, request):
+        index = get_index()
+        count, ids, facets = index.search(
+            options=self._ids('option'),
+            brands=self._ids('brand'),
+            categories=self._ids('category'),
+            price_min=self._decimal('price_min'),
+            price_max=self._decimal('price_max'),
+            offset=self._int('offset', 0),
+            limit=self._int('limit', 20, maximum=100),
+            descending=request.query_params.get('ordering') == '-price',
+        )
+        products = plan_queryset(Product.objects.filter(pk__in=ids), ProductDetailSerializer).in_bulk()
+        serializer = ProductDetailSerializer(
+            [products[pk] for pk in ids if pk in products], many=True, context={'request': request}
+        )
+        response = Response({'count': count, 'results': serializer.data, 'facets': facets})
+        # Index périmé, en cours de reconstruction : réponse servie, pas mise en cache
+        response.cacheable = index.version == current_version()
+        return response
+
+
+# RECHERCHE PLEIN TEXTE
+class ProductSearchAPIView(APIView):
+    """?q= : produits actifs classés par pertinence (préfixes, sans accents)."""
+
+    def get(self, request):
+        query = request.query_params.get('q', '').strip()
+        try:
+            limit = min(max(1, int(request.query_params.get('limit', 20))), 100)
+        except ValueError:
+            raise ValidationError({'limit': "Entier attendu"})
+        ids = search.get_backend().search(query, limit=limit) if query else []
+        products = plan_queryset(
+            Product.objects.filter(pk__in=ids, is_active=True), ProductDetailSerializer
+        ).in_bulk()
+        serializer = ProductDetailSerializer(
+            [products[pk] for pk in ids if pk in products], many=True, context={'request': request}
+        )
+        return Response(serializer.data)
+
+
+# EXPORT DU CATALOGUE (flux NDJSON ou tableau JSON)
+class ProductExportAPIView(APIView):
+    content_types = {
+        'ndjson': 'application/x-ndjson; charset=utf-8',
+        'json': 'application/json; charset=utf-8',
+    }
+
+    def get(self, request):
+        fmt = request.query_params.get('export_format', 'ndjson')
+        if fmt not in EXPORT_FORMATS:
+            raise ValidationError({'export_format': f"Formats possibles : {', '.join(EXPORT_FORMATS)}"})
+        try:
+            chunk_size = int(request.query_params.get('chunk_size', DEFAULT_CHUNK_SIZE))
+        except ValueError:
+            raise ValidationError({'chunk_size': "Entier attendu"})
+
+        products = iter_products(chunk_size=max(1, min(chunk_size, 5000)), context={'request': request})
+        response = StreamingHttpResponse(iter_export(products, fmt), content_type=self.content_types[fmt])
+        response['Content-Disposition'] = f'attachment; filename="catalogue.{fmt}"'
+        return response
+
+
+# DÉCLINAISONS D'IMAGES À LA DEMANDE
+class ImageDerivativeAPIView(APIView):
+    """
+    Génère au premier appel la déclinaison (largeur, format) d'une photo
+    produit ou d'un logo, puis redirige vers le fichier ; les appels suivants
+    trouvent le fichier en cache disque. Public, comme les médias : les
+    générations (Pillow, dans le thread de la requête) sont limitées par
+    client (taux 'image-derivatives' de DEFAULT_THROTTLE_RATES).
+    """
+    authentication_classes = []
+    permission_classes = [AllowAny]
+    throttle_scope = 'image-derivatives'
+
+    def get(self, request, kind, pk, width, fmt):
+        if width not in images.get_widths() or fmt not in images.get_formats():
+            raise Http404
+        try:
+            model, field, store = images.targets()[kind]
+        except KeyError:
+            raise Http404
+        instance = generics.get_object_or_404(model.objects.only(field, store), pk=pk)
+        field_file = getattr(instance, field)
+        if not field_file:
+            raise Http404
+        derivatives = getattr(instance, store) or {}
+        variants = derivatives.get('variants', {}).get(fmt, {}) if derivatives.get('source') == field_file.name else {}
+        target = str(min(width, derivatives.get('width') or width))
+        if target not in variants:
+            self.check_generation_throttle(request)
+            derivatives = images.build(kind, pk, widths=[width], formats=[fmt])
+            if derivatives is None:
+                raise Http404
+            variants = derivatives['variants'][fmt]
+            target = str(min(width, derivatives['width']))
+        return HttpResponseRedirect(field_file.storage.url(variants[target]))
+
+    def check_generation_throttle(self, request):
+        # Seulement avant une génération : les redirections ne coûtent rien
+        throttle = ScopedRateThrottle()
+        if not throttle.allow_request(request, self):
+            self.throttled(request, throttle.wait())
@@ -0,0 +1,107 @@
+import copy
+import os
+
+from django.db.backends.signals import connection_created
+
+# Configuration de la base par variables d'environnement.
+#
+# DB_ENGINE=sqlite (défaut) : fichier DB_NAME, réglé à chaque connexion par
+# les PRAGMA de SQLITE_PRAGMAS (journal WAL : les lecteurs ne bloquent plus
+# l'écrivain ; busy_timeout : attente du verrou au lieu de « database is
+# locked » ; mmap_size : lectures par projection mémoire).
+# DB_ENGINE=postgresql : DB_NAME, DB_USER, DB_PASSWORD, DB_HOST, DB_PORT ;
+# DB_POOL=1 active le pool de connexions de Django (psycopg[pool]).
+# Hors pool, DB_CONN_MAX_AGE garde les connexions ouvertes entre requêtes,
+# vérifiées avant réutilisation (DB_CONN_HEALTH_CHECKS).
+# DB_REPLICAS (fichiers SQLite ou hôtes PostgreSQL, séparés par des virgules)
+# déclare des réplicas en lecture, cf. storer.routers.
+
+ENGINES = {
+    'sqlite': 'django.db.backends.sqlite3',
+    'postgresql': 'django.db.backends.postgresql',
+}
+
+
+def _env(environ, name, default):
+    value = environ.get(name)
+    return default if value in (None, '') else value
+
+
+def _flag(environ, name, default):
+    return _env(environ, name, '1' if default else '0') == '1'
+
+
+def database_config(base_dir, environ=os.environ):
+    """Entrée DATABASES['default'] décrite par l'environnement."""
+    engine = _env(environ, 'DB_ENGINE', 'sqlite')
+    if engine not in ENGINES:
+        raise ValueError(f"DB_ENGINE : {engine!r} inconnu ({', '.join(ENGINES)})")
+    config = {'ENGINE': ENGINES[engine], 'OPTIONS': {}}
+    max_age = _env(environ, 'DB_CONN_MAX_AGE', '0')
+    config['CONN_MAX_AGE'] = None if max_age == 'none' else int(max_age)
+
+    if engine == 'sqlite':
+        config['NAME'] = _env(environ, 'DB_NAME', os.path.join(base_dir, 'db.sqlite3'))
+        # IMMEDIATE : les transactions prennent le verrou d'écriture dès le
+        # début, pas à la première écriture (évite les échecs immédiats
+        # d'une transaction lectrice qui se met à écrire)
+        config['OPTIONS']['transaction_mode'] = _env(environ, 'DB_SQLITE_TRANSACTION_MODE', 'IMMEDIATE')
+    else:
+        config.update({
+            'NAME': _env(environ, 'DB_NAME', 'storer'),
+            'USER': _env(environ, 'DB_USER', ''),
+            'PASSWORD': _env(environ, 'DB_PASSWORD', ''),
+            'HOST': _env(environ, 'DB_HOST', ''),
+            'PORT': _env(environ, 'DB_PORT', ''),
+        })
+        if _flag(environ, 'DB_POOL', False):
+            # Le pool remplace les connexions persistantes (CONN_MAX_AGE = 0 exigé)
+            config['CONN_MAX_AGE'] = 0
+            config['OPTIONS']['pool'] = {
+                'min_size': int(_env(environ, 'DB_POOL_MIN_SIZE', 2)),
+                'max_size': int(_env(environ, 'DB_POOL_MAX_SIZE', 10)),
+                'timeout': float(_env(environ, 'DB_POOL_TIMEOUT', 10)),
+            }
+    config['CONN_HEALTH_CHECKS'] = _flag(environ, 'DB_CONN_HEALTH_CHECKS', config['CONN_MAX_AGE'] != 0)
+    return config
+
+
+def replica_databases(default, environ=os.environ):
+    """{alias: configuration} des réplicas de DB_REPLICAS (replica1, replica2...)."""
+    replicas = {}
+    for index, target in enumerate(filter(None, (t.strip() for t in _env(environ, 'DB_REPLICAS', '').split(','))), 1):
+        config = copy.deepcopy(default)
+        if config['ENGINE'] == ENGINES['sqlite']:
+            config['NAME'] = target
+        else:
+            config['HOST'], _, port = target.partition(':')
+            config['PORT'] = port or config['PORT']
+        # Sous test, les réplicas lisent la base de test principale
+        config['TEST'] = {'MIRROR': 'default'}
+        replicas[f'replica{index}'] = config
+    return replicas
+
+
+def sqlite_pragmas(environ=os.environ):
+    """PRAGMA appliqués à chaque nouvelle connexion SQLite (SQLITE_PRAGMAS)."""
+    return {
+        'journal_mode': _env(environ, 'DB_SQLITE_JOURNAL_MODE', 'WAL'),
+        # NORMAL suffit en WAL : une coupure peut perdre la dernière
+        # transaction, jamais corrompre la base
+        'synchronous': _env(environ, 'DB_SQLITE_SYNCHRONOUS', 'NORMAL'),
+        'busy_timeout': int(_env(environ, 'DB_SQLITE_BUSY_TIMEOUT', 5000)),
+        'mmap_size': int(_env(environ, 'DB_SQLITE_MMAP_SIZE', 256 * 1024 * 1024)),
+    }
+
+
+def configure_sqlite(sender, connection, **kwargs):
+    if connection.vendor != 'sqlite':
+        return
+    from django.conf import settings
+
+    # Sur la connexion sqlite3 brute : hors execute_wrapper (métriques)
+    for name, value in getattr(settings, 'SQLITE_PRAGMAS', {}).items():
+        connection.connection.execute(f'PRAGMA {name} = {value}')
+
+
+connection_created.connect(configure_sqlite, dispatch_uid='storer.database.configure_sqlite')
@@ -0,0 +1,162 @@
+import mimetypes
+import os
+import re
+import stat
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseNotModified, StreamingHttpResponse
+from django.utils._os import safe_join
+from django.utils.http import http_date, parse_etags, parse_http_date_safe
+from django.views.decorators.http import require_safe
+
+from produits.storage import is_hashed_name
+
+# Service des médias (photos produits, logos) en production.
+#
+# Remplace django.conf.urls.static.static, qui relit tout le fichier à chaque
+# requête : réponses conditionnelles (ETag, If-Modified-Since -> 304),
+# requêtes partielles (Range -> 206 / 416), cache navigateur et CDN d'un an
+# pour les noms qui dépendent du contenu, et délégation possible de l'envoi
+# au serveur frontal (X-Sendfile pour Apache/lighttpd, X-Accel-Redirect pour
+# nginx) afin de ne pas occuper un worker WSGI pendant le transfert.
+
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+STREAM_CHUNK = 64 * 1024
+
+
+def file_etag(st):
+    return f'"{st.st_mtime_ns:x}-{st.st_size:x}"'
+
+
+def cache_control(path):
+    if is_hashed_name(path):
+        return IMMUTABLE_CACHE_CONTROL
+    return f"public, max-age={getattr(settings, 'MEDIA_CACHE_MAX_AGE', 3600)}"
+
+
+def not_modified(request, etag, mtime):
+    if_none_match = request.headers.get('If-None-Match')
+    if if_none_match is not None:
+        # If-None-Match l'emporte sur If-Modified-Since (RFC 9110)
+        return if_none_match.strip() == '*' or etag in parse_etags(if_none_match)
+    since = parse_http_date_safe(request.headers.get('If-Modified-Since', ''))
+    return since is not None and int(mtime) <= since
+
+
+def parse_range(header, size):
+    """
+    (début, fin incluse) pour un en-tête Range à une seule plage, None s'il
+    faut ignorer l'en-tête (absent, plusieurs plages, syntaxe inconnue),
+    'unsatisfiable' si la plage tombe hors du fichier.
+    """
+    match = RANGE_RE.match(header.replace(' ', '')) if header else None
+    if match is None:
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        # bytes=-N : les N derniers octets
+        length = int(last)
+        if length == 0:
+            return 'unsatisfiable'
+        return max(size - length, 0), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or (last and int(last) < start):
+        return 'unsatisfiable'
+    return start, end
+
+
+def if_range_matches(request, etag, mtime):
+    if_range = request.headers.get('If-Range')
+    if if_range is None:
+        return True
+    if if_range.startswith('"') or if_range.startswith('W/'):
+        return if_range == etag
+    date = parse_http_date_safe(if_range)
+    return date is not None and int(mtime) <= date
+
+
+def iter_file_range(path, start, length):
+    with open(path, 'rb') as f:
+        f.seek(start)
+        while length > 0:
+            chunk = f.read(min(STREAM_CHUNK, length))
+            if not chunk:
+                return
+            length -= len(chunk)
+            yield chunk
+
+
+def sendfile_response(path, relative, content_type):
+    mode = getattr(settings, 'MEDIA_SENDFILE', None)
+    response = HttpResponse(content_type=content_type)
+    if mode == 'x-accel-redirect':
+        prefix = getattr(settings, 'MEDIA_ACCEL_REDIRECT_PREFIX', '/protected-media/')
+        response['X-Accel-Redirect'] = prefix.rstrip('/') + '/' + relative.lstrip('/')
+    else:
+        response['X-Sendfile'] = path
+    return response
+
+
+@require_safe
+def serve_media(request, path, document_root=None):
+    document_root = document_root or settings.MEDIA_ROOT
+    try:
+        full_path = safe_join(document_root, path)
+        st = os.stat(full_path)
+    except (SuspiciousFileOperation, OSError):
+        # Chemin hors de document_root ou fichier absent
+        raise Http404("Fichier introuvable")
+    if not stat.S_ISREG(st.st_mode):
+        raise Http404("Fichier introuvable")
+
+    etag = file_etag(st)
+    headers = {
+        'ETag': etag,
+        'Last-Modified': http_date(st.st_mtime),
+        'Cache-Control': cache_control(path),
+        'Accept-Ranges': 'bytes',
+    }
+    if not_modified(request, etag, st.st_mtime):
+        response = HttpResponseNotModified()
+        for name, value in headers.items():
+            response[name] = value
+        return response
+
+    content_type, encoding = mimetypes.guess_type(full_path)
+    content_type = content_type or 'application/octet-stream'
+
+    if getattr(settings, 'MEDIA_SENDFILE', None):
+        # Le serveur frontal gère aussi les plages et la lecture disque
+        response = sendfile_response(full_path, path, content_type)
+    else:
+        size = st.st_size
+        byte_range = None
+        if if_range_matches(request, etag, st.st_mtime):
+            byte_range = parse_range(request.headers.get('Range'), size)
+        if byte_range == 'unsatisfiable':
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{size}'
+        elif byte_range is not None:
+            start, end = byte_range
+            length = end - start + 1
+            body = iter_file_range(full_path, start, length) if request.method == 'GET' else iter(())
+            response = StreamingHttpResponse(body, status=206, content_type=content_type)
+            response['Content-Range'] = f'bytes {start}-{end}/{size}'
+            response['Content-Length'] = str(length)
+        elif request.method == 'HEAD':
+            response = HttpResponse(content_type=content_type)
+            response['Content-Length'] = str(size)
+        else:
+            # FileResponse : wsgi.file_wrapper (sendfile) quand le serveur le fournit
+            response = FileResponse(open(full_path, 'rb'), content_type=content_type)
+            response['Content-Length'] = str(size)
+    if encoding:
+        response['Content-Encoding'] = encoding
+    for name, value in headers.items():
+        response[name] = value
+    return response
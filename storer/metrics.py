@@ -0,0 +1,322 @@
+import math
+import re
+import threading
+import time
+from collections import Counter, deque
+from contextvars import ContextVar
+from functools import lru_cache
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.db.backends.signals import connection_created
+from rest_framework import status
+from rest_framework.permissions import IsAdminUser
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from . import streaming
+
+# Instrumentation des requêtes : nombre et durée des requêtes SQL, requêtes
+# répétées (même SQL, paramètres différents : signature d'un N+1), temps de
+# sérialisation (vues DRF avec InstrumentedViewMixin) et de rendu.
+#
+# Chaque requête reçoit un en-tête Server-Timing ; les mesures alimentent un
+# registre en mémoire du processus, par endpoint (méthode + motif d'URL) :
+# compteurs cumulés et fenêtre glissante des METRICS_WINDOW derniers appels
+# pour les percentiles et l'histogramme. Lecture (administrateurs) :
+# /api/_metrics/. Le coût par requête SQL se limite à un appel de fonction,
+# deux lectures d'horloge et un incrément de compteur.
+#
+# Le wrapper d'exécution est posé une fois pour toutes sur chaque connexion
+# et lit les mesures dans le contexte (ContextVar) : les requêtes SQL des vues
+# asynchrones, exécutées dans d'autres threads (sync_to_async), sont comptées
+# avec celles de la requête HTTP qui les a lancées. Celles d'une réponse en
+# flux aussi (cf. storer.streaming) : elle est enregistrée à la fin du flux,
+# et son Server-Timing, envoyé avant le corps, s'arrête au premier octet.
+
+_current = ContextVar('storer_metrics', default=None)
+
+HISTOGRAM_BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+TOP_DUPLICATES = 10
+IN_LIST_RE = re.compile(r'\((?:%s, )+%s\)')
+
+
+def fingerprint(sql):
+    """SQL normalisé pour l'affichage : listes IN (%s, ...) réduites."""
+    return IN_LIST_RE.sub('(...)', sql)
+
+
+def percentile(ordered, fraction):
+    """Percentile par interpolation linéaire sur une liste triée."""
+    if not ordered:
+        return None
+    position = (len(ordered) - 1) * fraction
+    low, high = math.floor(position), math.ceil(position)
+    return ordered[low] + (ordered[high] - ordered[low]) * (position - low)
+
+
+def current():
+    """Mesures de la requête en cours (None hors MetricsMiddleware)."""
+    return _current.get()
+
+
+class RequestMetrics:
+    __slots__ = ('start', 'queries', 'sql', 'serialize', 'render', 'statements', 'render_start')
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.queries = 0
+        self.sql = 0.0
+        self.serialize = 0.0
+        self.render = 0.0
+        self.render_start = None
+        self.statements = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        # Wrapper d'exécution (connection.execute_wrapper)
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.sql += time.perf_counter() - start
+            self.queries += 1
+            self.statements[sql] += 1
+
+    def duplicates(self):
+        """{SQL: exécutions} des requêtes exécutées plus d'une fois."""
+        return {sql: count for sql, count in self.statements.items() if count > 1}
+
+    def server_timing(self, total):
+        entries = [
+            f'total;dur={total * 1000:.1f}',
+            f'db;dur={self.sql * 1000:.1f};desc="{self.queries} queries"',
+        ]
+        if self.serialize:
+            entries.append(f'serialize;dur={self.serialize * 1000:.1f}')
+        if self.render:
+            entries.append(f'render;dur={self.render * 1000:.1f}')
+        return ', '.join(entries)
+
+
+class EndpointStats:
+    def __init__(self, window):
+        self.count = 0
+        self.errors = 0
+        self.totals = dict.fromkeys(('duration_ms', 'sql_ms', 'queries', 'serialize_ms', 'render_ms'), 0.0)
+        self.recent = deque(maxlen=window)
+        self.duplicates = Counter()
+
+    def add(self, status_code, duration, metrics):
+        sample = (duration * 1000, metrics.sql * 1000, metrics.queries)
+        self.count += 1
+        self.errors += status_code >= 500
+        self.totals['duration_ms'] += sample[0]
+        self.totals['sql_ms'] += sample[1]
+        self.totals['queries'] += metrics.queries
+        self.totals['serialize_ms'] += metrics.serialize * 1000
+        self.totals['render_ms'] += metrics.render * 1000
+        self.recent.append(sample)
+        for sql in metrics.duplicates():
+            self.duplicates[sql] += 1
+        if len(self.duplicates) > TOP_DUPLICATES * 2:
+            # Borne la mémoire : ne garde que les plus fréquentes
+            self.duplicates = Counter(dict(self.duplicates.most_common(TOP_DUPLICATES)))
+
+    def snapshot(self):
+        durations = sorted(sample[0] for sample in self.recent)
+        queries = sorted(sample[2] for sample in self.recent)
+        histogram, index = {}, 0
+        for bound in HISTOGRAM_BUCKETS_MS:
+            start = index
+            while index < len(durations) and durations[index] <= bound:
+                index += 1
+            histogram[f'le_{bound}'] = index - start
+        histogram['inf'] = len(durations) - index
+        return {
+            'count': self.count,
+            'errors': self.errors,
+            'mean': {name: round(total / self.count, 3) for name, total in self.totals.items()},
+            'window': {
+                'size': len(durations),
+                **{f'p{int(q * 100)}_ms': round(percentile(durations, q), 3) for q in (0.5, 0.95, 0.99)},
+                'max_queries': queries[-1],
+                'sql_ms': round(sum(sample[1] for sample in self.recent) / len(durations), 3),
+                'histogram_ms': histogram,
+            },
+            'duplicate_queries': [
+                {'sql': fingerprint(sql), 'requests': requests}
+                for sql, requests in self.duplicates.most_common(TOP_DUPLICATES)
+            ],
+        }
+
+
+class MetricsRegistry:
+    """Mesures agrégées du processus, par endpoint."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.endpoints = {}
+
+    def record(self, endpoint, status_code, duration, metrics):
+        with self.lock:
+            stats = self.endpoints.get(endpoint)
+            if stats is None:
+                stats = self.endpoints[endpoint] = EndpointStats(getattr(settings, 'METRICS_WINDOW', 512))
+            stats.add(status_code, duration, metrics)
+
+    def snapshot(self):
+        with self.lock:
+            return {endpoint: stats.snapshot() for endpoint, stats in sorted(self.endpoints.items())}
+
+    def reset(self):
+        with self.lock:
+            self.endpoints.clear()
+
+
+registry = MetricsRegistry()
+
+
+def _execute(execute, sql, params, many, context):
+    metrics = _current.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    return metrics(execute, sql, params, many, context)
+
+
+def install(connection):
+    if _execute not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_execute)
+
+
+def _connection_created(sender, connection, **kwargs):
+    install(connection)
+
+
+connection_created.connect(_connection_created, dispatch_uid='storer.metrics.install')
+
+
+def endpoint_name(request):
+    match = getattr(request, 'resolver_match', None)
+    route = (match.route or match.view_name) if match is not None else 'unresolved'
+    return f'{request.method} /{route}'
+
+
+class MetricsMiddleware:
+    """
+    Mesure chaque requête (SQL sur toutes les connexions, rendu) et ajoute
+    l'en-tête Server-Timing. À placer en tête de MIDDLEWARE.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'METRICS_ENABLED', True):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.server_timing = getattr(settings, 'METRICS_SERVER_TIMING', True)
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        # Connexions du thread ouvertes avant le chargement de ce module
+        for connection in connections.all(initialized_only=True):
+            install(connection)
+        metrics = RequestMetrics()
+        token = _current.set(metrics)
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, metrics)
+
+    async def __acall__(self, request):
+        metrics = RequestMetrics()
+        token = _current.set(metrics)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, metrics)
+
+    def finish(self, request, response, metrics):
+        duration = time.perf_counter() - metrics.start
+        if self.server_timing:
+            response['Server-Timing'] = metrics.server_timing(duration)
+        endpoint = endpoint_name(request)
+        if response.streaming:
+            def record():
+                registry.record(endpoint, response.status_code, time.perf_counter() - metrics.start, metrics)
+            return streaming.bind(response, _current, metrics, on_close=record)
+        registry.record(endpoint, response.status_code, duration, metrics)
+        return response
+
+    def process_template_response(self, request, response):
+        # Appelé juste avant response.render() (réponses DRF comprises)
+        metrics = _current.get()
+        if metrics is not None:
+            metrics.render_start = time.perf_counter()
+            response.add_post_render_callback(self._rendered(metrics))
+        return response
+
+    @staticmethod
+    def _rendered(metrics):
+        def callback(response):
+            metrics.render += time.perf_counter() - metrics.render_start
+        return callback
+
+
+class TimedDataMixin:
+    @property
+    def data(self):
+        metrics = _current.get()
+        if metrics is None:
+            return super().data
+        start = time.perf_counter()
+        try:
+            return super().data
+        finally:
+            metrics.serialize += time.perf_counter() - start
+
+
+@lru_cache(maxsize=None)
+def timed_serializer_class(cls):
+    return type(cls.__name__, (TimedDataMixin, cls), {'__module__': cls.__module__, '__qualname__': cls.__qualname__})
+
+
+class InstrumentedViewMixin:
+    """
+    Compte le temps passé dans serializer.data (requêtes SQL paresseuses
+    comprises) dans les mesures de la requête.
+    """
+
+    def get_serializer(self, *args, **kwargs):
+        serializer = super().get_serializer(*args, **kwargs)
+        # Génération du schéma (drf_yasg) : classes d'origine, sinon deux
+        # serializers distincts portent le même nom
+        if getattr(self, 'swagger_fake_view', False):
+            return serializer
+        if _current.get() is not None and not isinstance(serializer, TimedDataMixin):
+            serializer.__class__ = timed_serializer_class(type(serializer))
+        return serializer
+
+
+class MetricsAPIView(APIView):
+    """Mesures du processus par endpoint ; DELETE les remet à zéro."""
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return Response({
+            'enabled': getattr(settings, 'METRICS_ENABLED', True),
+            'window': getattr(settings, 'METRICS_WINDOW', 512),
+            'endpoints': registry.snapshot(),
+        })
+
+    def delete(self, request):
+        registry.reset()
+        return Response(status=status.HTTP_204_NO_CONTENT)
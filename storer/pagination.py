@@ -0,0 +1,150 @@
+import base64
+import json
+from collections import OrderedDict
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Pagination par clé (keyset) sur un tuple de colonnes, ex: (created_at, id).
+
+    Optionnelle : sans ?cursor ni ?page_size la réponse reste une liste
+    complète, comme avant. Le coût d'une page profonde est le même que celui
+    de la première page (WHERE clé > curseur au lieu d'OFFSET).
+
+    Les vues déclarent leur clé via `keyset_ordering` ; la dernière colonne
+    doit être unique (en pratique 'id').
+    """
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    default_ordering = ('id',)
+
+    @property
+    def page_size(self):
+        return getattr(settings, 'KEYSET_PAGE_SIZE', 50)
+
+    @property
+    def max_page_size(self):
+        return getattr(settings, 'KEYSET_MAX_PAGE_SIZE', 200)
+
+    def get_ordering(self, view):
+        return tuple(getattr(view, 'keyset_ordering', self.default_ordering))
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return max(1, min(size, self.max_page_size))
+
+    def encode_cursor(self, values, reverse):
+        payload = json.dumps({'k': values, 'r': int(reverse)}, separators=(',', ':'))
+        return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+    def decode_cursor(self, request, fields):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None, False
+        try:
+            padded = encoded + '=' * (-len(encoded) % 4)
+            payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+            values = payload['k']
+            if len(values) != len(fields):
+                raise ValueError
+            values = [field.to_python(value) for field, value in zip(fields, values)]
+            return values, bool(payload.get('r'))
+        except (TypeError, ValueError, KeyError, ValidationError):
+            raise NotFound('Curseur invalide.')
+
+    def key_filter(self, ordering, values, reverse):
+        # (a, b) > (x, y)  <=>  a > x OR (a = x AND b > y)
+        op = 'lt' if reverse else 'gt'
+        condition = Q()
+        for i, name in enumerate(ordering):
+            clause = Q(**{f'{name}__{op}': values[i]})
+            for prev, value in zip(ordering[:i], values[:i]):
+                clause &= Q(**{prev: value})
+            condition |= clause
+        return condition
+
+    def key_values(self, obj, fields):
+        values = []
+        for field in fields:
+            value = field.value_from_object(obj)
+            if hasattr(value, 'isoformat'):
+                value = value.isoformat()
+            elif isinstance(value, Decimal):
+                value = str(value)
+            values.append(value)
+        return values
+
+    def paginate_queryset(self, queryset, request, view=None):
+        params = request.query_params
+        if self.cursor_query_param not in params and self.page_size_query_param not in params:
+            return None
+
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(view)
+        self.size = self.get_page_size(request)
+        fields = [queryset.model._meta.get_field(name) for name in self.ordering]
+        values, reverse = self.decode_cursor(request, fields)
+
+        order = [f'-{name}' for name in self.ordering] if reverse else list(self.ordering)
+        queryset = queryset.order_by(*order)
+        if values is not None:
+            queryset = queryset.filter(self.key_filter(self.ordering, values, reverse))
+
+        page = list(queryset[:self.size + 1])
+        has_more = len(page) > self.size
+        page = page[:self.size]
+        if reverse:
+            page.reverse()
+
+        self.next_values = self.previous_values = None
+        if page:
+            first, last = self.key_values(page[0], fields), self.key_values(page[-1], fields)
+            if has_more or reverse:
+                self.next_values = last
+            if values is not None and (not reverse or has_more):
+                self.previous_values = first
+        return page
+
+    def get_link(self, values, reverse):
+        if values is None:
+            return None
+        return replace_query_param(self.base_url, self.cursor_query_param, self.encode_cursor(values, reverse))
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_link(self.next_values, False)),
+            ('previous', self.get_link(self.previous_values, True)),
+            ('results', data),
+        ]))
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+    def get_schema_operation_parameters(self, view):
+        return [
+            {'name': self.cursor_query_param, 'required': False, 'in': 'query',
+             'description': 'Curseur opaque de pagination.', 'schema': {'type': 'string'}},
+            {'name': self.page_size_query_param, 'required': False, 'in': 'query',
+             'description': 'Nombre de résultats par page.', 'schema': {'type': 'integer'}},
+        ]
@@ -0,0 +1,29 @@
+from rest_framework.renderers import JSONRenderer
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - dépendance optionnelle
+    orjson = None
+
+
+class FastJSONRenderer(JSONRenderer):
+    """
+    JSONRenderer encodé par orjson quand il est installé, octet pour octet
+    identique à la sortie compacte de JSONRenderer pour des données déjà
+    réduites aux types JSON (chaînes, nombres entiers, booléens, None, listes,
+    dictionnaires). Sinon, ou si une indentation est demandée : JSONRenderer.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if (
+            orjson is None or data is None or self.ensure_ascii or not self.compact
+            or self.get_indent(accepted_media_type, renderer_context or {}) is not None
+        ):
+            return super().render(data, accepted_media_type, renderer_context)
+        try:
+            ret = orjson.dumps(data)
+        except TypeError:
+            # Types hors JSON (Decimal, dates...) : l'encodeur de DRF
+            return super().render(data, accepted_media_type, renderer_context)
+        # Comme JSONRenderer : \u2028 et \u2029 toujours échappés
+        return ret.replace('\u2028'.encode(), b'\\u2028').replace('\u2029'.encode(), b'\\u2029')
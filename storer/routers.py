@@ -0,0 +1,174 @@
+import hashlib
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from . import streaming
+
+# Lectures sur réplicas.
+#
+# Pendant une requête HTTP de méthode sûre (GET, HEAD, OPTIONS), les
+# lectures vont sur l'un des alias de DATABASE_REPLICAS, tiré une fois par
+# requête ; les écritures vont toujours sur la base principale. Dès qu'une
+# écriture est routée, le reste de la requête lit la principale, et les
+# requêtes suivantes du même client y sont ramenées pendant
+# DATABASE_REPLICA_STICKY_SECONDS (délai de réplication) : cookie pour les
+# navigateurs, marque en cache par en-tête Authorization pour les clients à
+# jeton (posée aussi à l'émission du jeton, cf. pin_authorization). On relit
+# ainsi ce que l'on vient d'écrire. Hors requête (commandes, tâches), dans une
+# transaction ouverte par le code et dans un bloc use_primary(), tout passe
+# par la principale. Le contenu des réponses en flux est lu comme la requête
+# (cf. storer.streaming).
+
+STICKY_COOKIE = 'storer_primary'
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+_state = ContextVar('storer_replica_routing', default=None)
+_primary = ContextVar('storer_primary_reads', default=False)
+
+
+class RoutingState:
+    __slots__ = ('replica', 'wrote')
+
+    def __init__(self, replica):
+        self.replica = replica
+        self.wrote = False
+
+
+def _authorization_key(authorization):
+    return 'storer:primary:' + hashlib.sha256(authorization.encode()).hexdigest()
+
+
+def _client_key(request):
+    authorization = request.headers.get('Authorization')
+    if not authorization:
+        return None
+    return _authorization_key(authorization)
+
+
+def get_replicas():
+    return getattr(settings, 'DATABASE_REPLICAS', ())
+
+
+def pin_authorization(authorization):
+    """
+    Ramène sur la principale les requêtes portant cet en-tête Authorization,
+    comme après une écriture : le jeton que l'on vient d'émettre n'est peut-être
+    pas encore sur les réplicas.
+    """
+    if get_replicas():
+        cache.set(_authorization_key(authorization), 1, timeout=ReplicaRoutingMiddleware.sticky_seconds())
+
+
+@contextmanager
+def use_primary():
+    """
+    Lectures du bloc sur la principale. Pour remplir un cache versionné : la
+    version vient d'être lue, un réplica en retard y rangerait d'anciennes
+    données jusqu'à l'invalidation suivante.
+    """
+    token = _primary.set(True)
+    try:
+        yield
+    finally:
+        _primary.reset(token)
+
+
+def _in_transaction():
+    # Hors transactions ouvertes par TestCase
+    connection = connections[DEFAULT_DB_ALIAS]
+    return connection.in_atomic_block and any(
+        not block._from_testcase for block in connection.atomic_blocks
+    )
+
+
+class ReplicaRouter:
+
+    def db_for_read(self, model, **hints):
+        state = _state.get()
+        if state is None or state.replica is None or state.wrote or _primary.get() or _in_transaction():
+            return DEFAULT_DB_ALIAS
+        return state.replica
+
+    def db_for_write(self, model, **hints):
+        state = _state.get()
+        if state is not None:
+            state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Les réplicas portent les mêmes données que la principale
+        databases = {DEFAULT_DB_ALIAS, *get_replicas()}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+
+class ReplicaRoutingMiddleware:
+    """Choisit, par requête, la base des lectures (cf. ReplicaRouter)."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        replicas = get_replicas()
+        client = _client_key(request) if replicas else None
+        state = self.routing_state(request, replicas, client and cache.get(client))
+        token = _state.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            _state.reset(token)
+        if response.streaming:
+            # Lectures du flux sur la même base que la requête
+            streaming.bind(response, _state, state)
+        if replicas and state.wrote:
+            self.stick(response)
+            if client:
+                cache.set(client, 1, timeout=self.sticky_seconds())
+        return response
+
+    async def __acall__(self, request):
+        replicas = get_replicas()
+        client = _client_key(request) if replicas else None
+        state = self.routing_state(request, replicas, client and await cache.aget(client))
+        token = _state.set(state)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _state.reset(token)
+        if response.streaming:
+            # Lectures du flux sur la même base que la requête
+            streaming.bind(response, _state, state)
+        if replicas and state.wrote:
+            self.stick(response)
+            if client:
+                await cache.aset(client, 1, timeout=self.sticky_seconds())
+        return response
+
+    @staticmethod
+    def routing_state(request, replicas, marked):
+        use_replica = (
+            replicas and request.method in SAFE_METHODS and STICKY_COOKIE not in request.COOKIES and not marked
+        )
+        return RoutingState(random.choice(replicas) if use_replica else None)
+
+    @staticmethod
+    def sticky_seconds():
+        return getattr(settings, 'DATABASE_REPLICA_STICKY_SECONDS', 5)
+
+    def stick(self, response):
+        response.set_cookie(STICKY_COOKIE, '1', max_age=self.sticky_seconds(), httponly=True, samesite='Lax')
@@ -12,6 +12,8 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 
 from pathlib import Path
 import os
+
+from storer.database import database_config, replica_databases, sqlite_pragmas
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -72,6 +74,9 @@ GRAPH_MODELS ={
      }
 
 MIDDLEWARE = [
+    # En tête : mesure tout le reste (cf. storer.metrics)
+    'storer.metrics.MetricsMiddleware',
+    'storer.routers.ReplicaRoutingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -111,13 +116,60 @@ WSGI_APPLICATION = 'storer.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
+# Décrite par l'environnement (DB_ENGINE, DB_NAME, DB_CONN_MAX_AGE, DB_POOL...),
+# cf. storer.database ; SQLite par défaut, en journal WAL
 DATABASES = {
+    'default': database_config(BASE_DIR),
+}
+SQLITE_PRAGMAS = sqlite_pragmas()
+
+# Réplicas en lecture (DB_REPLICAS) : lectures des requêtes GET/HEAD/OPTIONS,
+# principale pendant DB_REPLICA_STICKY_SECONDS après une écriture
+# (cf. storer.routers)
+DATABASES.update(replica_databases(DATABASES['default']))
+DATABASE_REPLICAS = [alias for alias in DATABASES if alias != 'default']
+DATABASE_ROUTERS = ['storer.routers.ReplicaRouter']
+DATABASE_REPLICA_STICKY_SECONDS = int(os.environ.get('DB_REPLICA_STICKY_SECONDS', 5))
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+# locmem par défaut ; en production, CACHE_BACKEND/CACHE_LOCATION pointent
+# vers un cache partagé (Redis, Memcached, fichiers...).
+
+CACHES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+        'BACKEND': os.environ.get('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.environ.get('CACHE_LOCATION', 'storer'),
     }
 }
 
+# Réponses produits mises en cache (invalidées par signaux sur les modèles)
+PRODUITS_CACHE_ALIAS = 'default'
+PRODUITS_CACHE_TIMEOUT = int(os.environ.get('PRODUITS_CACHE_TIMEOUT', 300))
+
+# Déclinaisons des images produits et logos (largeurs en pixels, formats).
+# PRODUITS_IMAGE_WORKERS=0 : génération synchrone ; PRODUITS_IMAGE_LAZY :
+# srcset vers la génération à la demande tant que rien n'est prêt.
+PRODUITS_IMAGE_WIDTHS = tuple(int(w) for w in os.environ.get('PRODUITS_IMAGE_WIDTHS', '160,320,640,1024').split(','))
+PRODUITS_IMAGE_FORMATS = ('webp', 'jpeg')
+PRODUITS_IMAGE_WORKERS = int(os.environ.get('PRODUITS_IMAGE_WORKERS', 2))
+PRODUITS_IMAGE_LAZY = os.environ.get('PRODUITS_IMAGE_LAZY', '1') == '1'
+
+# Taille maximale d'un enregistrement des flux fournisseurs, en caractères
+# (cf. produits.feeds)
+PRODUITS_FEED_MAX_RECORD_SIZE = int(os.environ.get('PRODUITS_FEED_MAX_RECORD_SIZE', 8 * 1024 * 1024))
+
+# Durée de vie par défaut d'une réservation de stock, en secondes
+PRODUITS_RESERVATION_TTL = int(os.environ.get('PRODUITS_RESERVATION_TTL', 900))
+
+# Index à facettes reconstruit en arrière-plan (l'ancien sert en attendant)
+PRODUITS_FACETS_BACKGROUND = os.environ.get('PRODUITS_FACETS_BACKGROUND', '1') == '1'
+
+# Vues asynchrones du catalogue (produits.async_views) : requêtes filles des
+# listes lancées en parallèle, une connexion par thread du pool
+PRODUITS_ASYNC_FANOUT = os.environ.get('PRODUITS_ASYNC_FANOUT', '1') == '1'
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -140,13 +192,37 @@ AUTH_PASSWORD_VALIDATORS = [
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',  # ou JWT selon ton cas
+        'utilisateurs.authentication.CachedTokenAuthentication',  # ou JWT selon ton cas
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
-    ]
+        # Codes exigés par la vue (required_permissions), via les rôles
+        'utilisateurs.permissions.HasRolePermission',
+    ],
+    # Pagination par clé, activée par ?cursor= ou ?page_size=
+    'DEFAULT_PAGINATION_CLASS': 'storer.pagination.KeysetPagination',
+    # Déclinaisons d'images générées à la demande, par client anonyme (IP)
+    'DEFAULT_THROTTLE_RATES': {
+        'image-derivatives': os.environ.get('PRODUITS_IMAGE_THROTTLE_RATE', '60/min'),
+    },
 }
 
+# Cache d'identité de l'authentification par jeton (jeton -> utilisateur ->
+# rôles -> permissions) : cache partagé, puis LRU local du processus
+UTILISATEURS_AUTH_CACHE_ALIAS = 'default'
+UTILISATEURS_AUTH_CACHE_TIMEOUT = int(os.environ.get('UTILISATEURS_AUTH_CACHE_TIMEOUT', 300))
+UTILISATEURS_AUTH_LOCAL_SIZE = int(os.environ.get('UTILISATEURS_AUTH_LOCAL_SIZE', 1024))
+UTILISATEURS_AUTH_LOCAL_TTL = int(os.environ.get('UTILISATEURS_AUTH_LOCAL_TTL', 30))
+
+# Instrumentation des requêtes (storer.metrics) : en-tête Server-Timing et
+# mesures par endpoint sur /api/_metrics/ (fenêtre des N derniers appels)
+METRICS_ENABLED = os.environ.get('METRICS_ENABLED', '1') == '1'
+METRICS_SERVER_TIMING = os.environ.get('METRICS_SERVER_TIMING', '1') == '1'
+METRICS_WINDOW = int(os.environ.get('METRICS_WINDOW', 512))
+
+KEYSET_PAGE_SIZE = int(os.environ.get('KEYSET_PAGE_SIZE', 50))
+KEYSET_MAX_PAGE_SIZE = int(os.environ.get('KEYSET_MAX_PAGE_SIZE', 200))
+
 
 # Internationalization
 # https://docs.djangoproject.com/en/5.2/topics/i18n/
@@ -161,6 +237,13 @@ USE_TZ = True
 
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+MEDIA_SERVE = os.environ.get('MEDIA_SERVE', '1') == '1'
+# Envoi délégué au serveur frontal : None, 'x-sendfile' ou 'x-accel-redirect'
+MEDIA_SENDFILE = os.environ.get('MEDIA_SENDFILE') or None
+# Location nginx « internal » qui pointe sur MEDIA_ROOT
+MEDIA_ACCEL_REDIRECT_PREFIX = os.environ.get('MEDIA_ACCEL_REDIRECT_PREFIX', '/protected-media/')
+# max-age des fichiers dont le nom ne dépend pas du contenu
+MEDIA_CACHE_MAX_AGE = int(os.environ.get('MEDIA_CACHE_MAX_AGE', 3600))
 
 # Static files (CSS, JavaScript, Images)
 # https://docs.djangoproject.com/en/5.2/howto/static-files/
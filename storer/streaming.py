@@ -0,0 +1,59 @@
+from django.http import FileResponse
+
+# Réponses en flux (StreamingHttpResponse).
+#
+# Le contenu d'une réponse en flux est produit après le retour des
+# middlewares, qui ont déjà remis leurs ContextVar à zéro : le SQL des blocs
+# ne serait ni mesuré (storer.metrics) ni routé (storer.routers). bind()
+# repose la valeur de la requête autour de la production de chaque bloc.
+
+
+def bind(response, var, value, on_close=None):
+    """
+    Produit le contenu de response avec var valant value ; on_close() est
+    appelé une fois le flux épuisé ou interrompu.
+    """
+    if isinstance(response, FileResponse):
+        # Pas de SQL dans un fichier ; l'envoi direct (wsgi.file_wrapper) est gardé
+        if on_close is not None:
+            on_close()
+        return response
+    if response.is_async:
+        response.streaming_content = _abind(response.streaming_content, var, value, on_close)
+    else:
+        response.streaming_content = _bind(response.streaming_content, var, value, on_close)
+    return response
+
+
+def _bind(content, var, value, on_close):
+    iterator = iter(content)
+    try:
+        while True:
+            token = var.set(value)
+            try:
+                chunk = next(iterator)
+            except StopIteration:
+                return
+            finally:
+                var.reset(token)
+            yield chunk
+    finally:
+        if on_close is not None:
+            on_close()
+
+
+async def _abind(content, var, value, on_close):
+    iterator = aiter(content)
+    try:
+        while True:
+            token = var.set(value)
+            try:
+                chunk = await anext(iterator)
+            except StopAsyncIteration:
+                return
+            finally:
+                var.reset(token)
+            yield chunk
+    finally:
+        if on_close is not None:
+            on_close()
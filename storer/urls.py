@@ -21,7 +21,8 @@ from rest_framework import permissions
 from drf_yasg.views import get_schema_view
 from drf_yasg import openapi
 from django.conf import settings
-from django.conf.urls.static import static
+from storer.media import serve_media
+from storer.metrics import MetricsAPIView
 schema_view = get_schema_view(
    openapi.Info(
       title="Snippets API",
@@ -39,7 +40,15 @@ urlpatterns = [
    path('swagger/', schema_view.with_ui('swagger', cache_timeout=0), name='schema-swagger-ui'),
    path('redoc/', schema_view.with_ui('redoc', cache_timeout=0), name='schema-redoc'),
     path('admin/', admin.site.urls),
+    path('api/_metrics/', MetricsAPIView.as_view(), name='metrics'),
     path('api/users/', include('utilisateurs.urls')),
     path('api/', include('produits.urls')),
 
-]+ static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+]
+
+# Médias : ETag / 304, Range, cache immuable des noms par contenu, X-Sendfile
+# (cf. storer.media). MEDIA_SERVE=0 quand le serveur frontal sert MEDIA_ROOT seul.
+if settings.MEDIA_SERVE:
+    urlpatterns += [
+        re_path(rf'^{settings.MEDIA_URL.lstrip("/")}(?P<path>.*)$', serve_media, name='media'),
+    ]
@@ -0,0 +1,213 @@
+import hashlib
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.translation import gettext_lazy as _
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+from storer.routers import use_primary
+
+from .models import Permission, User
+
+# Authentification par jeton mise en cache.
+#
+# jeton -> id utilisateur -> identité (champs de l'utilisateur, rôles, codes de
+# permission) est lu dans un LRU en mémoire du processus, puis dans le cache
+# partagé, avant la base. L'identité est rangée sous la version courante de
+# l'utilisateur : changer de version (déconnexion, rôles, désactivation...)
+# rend immédiatement caduques les entrées de tous les processus, le LRU local
+# vérifiant la version à chaque requête. Ce qui est rangé en cache est lu sur
+# la principale (use_primary) : un réplica en retard y figerait un jeton
+# absent ou une identité périmée sous la version courante.
+
+# Champs de l'utilisateur gardés en cache (jamais le mot de passe) ; les autres
+# sont différés et chargés à la demande.
+IDENTITY_FIELDS = ('id', 'email', 'first_name', 'last_name', 'is_active', 'is_staff', 'is_superuser', 'date_joined')
+
+
+def get_cache():
+    return caches[getattr(settings, 'UTILISATEURS_AUTH_CACHE_ALIAS', 'default')]
+
+
+def get_timeout():
+    return getattr(settings, 'UTILISATEURS_AUTH_CACHE_TIMEOUT', 300)
+
+
+def _token_key(key):
+    return f'utilisateurs:token:{hashlib.sha256(key.encode()).hexdigest()}'
+
+
+def _version_key(user_id):
+    return f'utilisateurs:version:{user_id}'
+
+
+def _identity_key(user_id, version):
+    return f'utilisateurs:identity:{user_id}:{version}'
+
+
+def get_version(user_id):
+    cache = get_cache()
+    version = cache.get(_version_key(user_id))
+    if version is None:
+        version = uuid.uuid4().hex
+        # add() : si un autre processus vient d'en créer une, c'est la sienne qui compte
+        if not cache.add(_version_key(user_id), version, timeout=None):
+            version = cache.get(_version_key(user_id), version)
+    return version
+
+
+def invalidate_users(user_ids):
+    """Rend caduques les identités en cache des utilisateurs donnés."""
+    user_ids = set(user_ids)
+    if user_ids:
+        get_cache().set_many({_version_key(pk): uuid.uuid4().hex for pk in user_ids}, timeout=None)
+        _local.discard_users(user_ids)
+
+
+def invalidate_token(key):
+    get_cache().delete(_token_key(key))
+    _local.discard(key)
+
+
+class LocalLRU:
+    """LRU borné et à durée de vie courte, partagé par les threads du processus."""
+
+    def __init__(self):
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def size(self):
+        return getattr(settings, 'UTILISATEURS_AUTH_LOCAL_SIZE', 1024)
+
+    @property
+    def ttl(self):
+        return getattr(settings, 'UTILISATEURS_AUTH_LOCAL_TTL', 30)
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry[1:]
+
+    def set(self, key, user_id, version, identity):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, user_id, version, identity)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+
+    def discard(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def discard_users(self, user_ids):
+        with self._lock:
+            for key in [k for k, entry in self._entries.items() if entry[1] in user_ids]:
+                del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+_local = LocalLRU()
+
+
+def load_identity(user):
+    """Identité calculée en base : champs, rôles et codes de permission."""
+    return {
+        'fields': {name: getattr(user, name) for name in IDENTITY_FIELDS},
+        'roles': list(user.user_roles.order_by('role__name').values_list('role__name', flat=True)),
+        'permissions': frozenset(
+            Permission.objects.filter(permission_roles__role__role_users__user=user)
+            .values_list('code', flat=True).distinct()
+        ),
+    }
+
+
+def get_identity(user, version=None):
+    """Identité de user, depuis le cache partagé si possible."""
+    version = version or get_version(user.pk)
+    cache = get_cache()
+    identity = cache.get(_identity_key(user.pk, version))
+    if identity is None:
+        with use_primary():
+            identity = load_identity(user)
+        cache.set(_identity_key(user.pk, version), identity, get_timeout())
+    return identity
+
+
+def get_roles(user):
+    roles = getattr(user, 'roles', None)
+    return list(roles) if roles is not None else get_identity(user)['roles']
+
+
+def build_user(identity):
+    """User reconstruit sans requête ; les champs absents du cache sont différés."""
+    fields = identity['fields']
+    concrete = [f.attname for f in User._meta.concrete_fields if f.attname in fields]
+    user = User.from_db('default', concrete, [fields[name] for name in concrete])
+    user.roles = tuple(identity['roles'])
+    user.permission_codes = identity['permissions']
+    return user
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """TokenAuthentication sans requête SQL tant que le cache est chaud."""
+
+    def authenticate_credentials(self, key):
+        local = _local.get(key)
+        if local is not None:
+            user_id, version, identity = local
+            if get_version(user_id) == version:
+                return self._result(key, identity)
+            _local.discard(key)
+
+        cache = get_cache()
+        user_id = cache.get(_token_key(key))
+        if user_id is None:
+            try:
+                with use_primary():
+                    token = Token.objects.select_related('user').get(key=key)
+            except Token.DoesNotExist:
+                raise exceptions.AuthenticationFailed(_('Invalid token.'))
+            user_id = token.user_id
+            cache.set(_token_key(key), user_id, get_timeout())
+            version = get_version(user_id)
+            identity = cache.get(_identity_key(user_id, version))
+            if identity is None:
+                with use_primary():
+                    identity = load_identity(token.user)
+                cache.set(_identity_key(user_id, version), identity, get_timeout())
+        else:
+            version = get_version(user_id)
+            identity = cache.get(_identity_key(user_id, version))
+            if identity is None:
+                with use_primary():
+                    user = User.objects.filter(pk=user_id).first()
+                    if user is None:
+                        invalidate_token(key)
+                        raise exceptions.AuthenticationFailed(_('Invalid token.'))
+                    identity = load_identity(user)
+                cache.set(_identity_key(user_id, version), identity, get_timeout())
+
+        _local.set(key, user_id, version, identity)
+        return self._result(key, identity)
+
+    def _result(self, key, identity):
+        user = build_user(identity)
+        if not user.is_active:
+            raise exceptions.AuthenticationFailed(_('User inactive or deleted.'))
+        return user, Token(key=key, user_id=user.pk)
@@ -1,5 +1,6 @@
 from django.core.management.base import BaseCommand
-from utilisateurs.models import User, Role, UserRole
+from utilisateurs.models import User, Role, UserRole, Permission, RolePermission
+from utilisateurs.permissions import PERMISSION_CODES, VIEW_USERS, VIEW_ROLES
 
 class Command(BaseCommand):
     help = 'Créer des utilisateurs, rôles et associations initiales'
@@ -22,6 +23,21 @@ class Command(BaseCommand):
                 self.stdout.write(f"Rôle existant : {role.name}")
             roles[role.name] = role
 
+        # Permissions et leur attribution aux rôles
+        permissions = {}
+        for code, description in PERMISSION_CODES.items():
+            permissions[code], created = Permission.objects.get_or_create(code=code, defaults={'description': description})
+            if created:
+                self.stdout.write(self.style.SUCCESS(f"Permission créée : {code}"))
+        role_permissions = {
+            'Admin Principal': list(PERMISSION_CODES),
+            'Gestionnaire Produit': [VIEW_USERS],
+            'Support': [VIEW_USERS, VIEW_ROLES],
+        }
+        for role_name, codes in role_permissions.items():
+            for code in codes:
+                RolePermission.objects.get_or_create(role=roles[role_name], permission=permissions[code])
+
         # Création des utilisateurs
         users_data = [
             {
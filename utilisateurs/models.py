@@ -35,6 +35,12 @@ class User(AbstractBaseUser, PermissionsMixin):
 
     objects = UserManager()
 
+    class Meta:
+        indexes = [
+            # Pagination par clé de la liste des comptes (date_joined, id)
+            models.Index(fields=['date_joined', 'id'], name='user_joined_idx'),
+        ]
+
     def __str__(self):
         return self.email
 
@@ -0,0 +1,84 @@
+from functools import lru_cache
+
+from rest_framework.permissions import BasePermission
+
+from .authentication import get_identity
+
+# Contrôle d'accès par rôles (Role -> RolePermission -> Permission.code).
+#
+# Une vue déclare les codes exigés par action :
+#
+#     required_permissions = {
+#         'list': VIEW_USERS, 'retrieve': VIEW_USERS,   # actions d'un ViewSet
+#         'POST': MANAGE_USERS,                         # ou méthodes HTTP
+#         '*': (VIEW_USERS, MANAGE_USERS),              # défaut ; un tuple = tous requis
+#     }
+#
+# Les codes effectifs d'un utilisateur sont compilés une fois en frozenset et
+# mis en cache avec son identité (versionnée, cf. authentication) : chaque
+# vérification est une inclusion d'ensembles, sans jointure.
+
+VIEW_USERS = 'utilisateurs.view_users'
+MANAGE_USERS = 'utilisateurs.manage_users'
+VIEW_ROLES = 'utilisateurs.view_roles'
+MANAGE_ROLES = 'utilisateurs.manage_roles'
+
+# Codes connus, créés par create_initial_users
+PERMISSION_CODES = {
+    VIEW_USERS: "Consulter les utilisateurs et leurs rôles",
+    MANAGE_USERS: "Créer, modifier et supprimer des utilisateurs",
+    VIEW_ROLES: "Consulter les rôles et permissions",
+    MANAGE_ROLES: "Gérer les rôles, permissions et leurs attributions",
+}
+
+
+def read_write(read, write):
+    """Codes usuels d'un ModelViewSet : lecture / écriture."""
+    return {
+        'list': read, 'retrieve': read, 'GET': read, 'HEAD': read, 'OPTIONS': read,
+        '*': write,
+    }
+
+
+@lru_cache(maxsize=None)
+def _compile(view_class, key):
+    declared = getattr(view_class, 'required_permissions', None) or {}
+    if isinstance(declared, str):
+        codes = declared
+    else:
+        # L'action prime sur la méthode ; () déclaré explicitement = libre
+        codes = next((declared[k] for k in (*key, '*') if k in declared), ())
+    return frozenset((codes,) if isinstance(codes, str) else codes)
+
+
+def required_codes(view, method):
+    """Codes exigés par la vue pour cette requête (frozenset, compilé par classe)."""
+    return _compile(type(view), (getattr(view, 'action', None), method))
+
+
+def get_permission_codes(user):
+    codes = getattr(user, 'permission_codes', None)
+    if codes is None:
+        # Utilisateur non issu de CachedTokenAuthentication (session, tests...)
+        codes = user.permission_codes = get_identity(user)['permissions']
+    return codes
+
+
+class HasRolePermission(BasePermission):
+    """
+    Autorise si l'utilisateur possède, via ses rôles, tous les codes exigés
+    par la vue. Les vues qui ne déclarent rien ne sont pas restreintes ; les
+    superutilisateurs passent toujours.
+    """
+    message = "Vous n'avez pas la permission d'effectuer cette action."
+
+    def has_permission(self, request, view):
+        required = required_codes(view, request.method)
+        if not required:
+            return True
+        user = request.user
+        if not user or not user.is_authenticated:
+            return False
+        if user.is_superuser:
+            return True
+        return required <= get_permission_codes(user)
@@ -0,0 +1,52 @@
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from .authentication import invalidate_token, invalidate_users
+from .models import User, Role, UserRole, Permission, RolePermission
+
+# Invalidation des identités mises en cache par CachedTokenAuthentication.
+# Après validation de la transaction : une requête concurrente ne doit pas
+# remettre en cache l'état d'avant sous la nouvelle version.
+
+
+def users_changed(user_ids):
+    user_ids = set(user_ids)
+    transaction.on_commit(lambda: invalidate_users(user_ids))
+
+
+@receiver([post_save, post_delete], sender=User)
+def user_changed(sender, instance, **kwargs):
+    # Désactivation, changement d'email, suppression...
+    users_changed([instance.pk])
+
+
+@receiver([post_save, post_delete], sender=UserRole)
+def user_role_changed(sender, instance, **kwargs):
+    users_changed([instance.user_id])
+
+
+@receiver([post_save, post_delete], sender=Role)
+def role_changed(sender, instance, **kwargs):
+    users_changed(UserRole.objects.filter(role_id=instance.pk).values_list('user_id', flat=True))
+
+
+@receiver([post_save, post_delete], sender=RolePermission)
+def role_permission_changed(sender, instance, **kwargs):
+    users_changed(UserRole.objects.filter(role_id=instance.role_id).values_list('user_id', flat=True))
+
+
+@receiver([post_save, post_delete], sender=Permission)
+def permission_changed(sender, instance, **kwargs):
+    users_changed(
+        UserRole.objects.filter(role__role_permissions__permission_id=instance.pk).values_list('user_id', flat=True)
+    )
+
+
+@receiver(post_delete, sender=Token)
+def token_deleted(sender, instance, **kwargs):
+    key = instance.key
+    transaction.on_commit(lambda: invalidate_token(key))
+    # Les LRU locaux des autres processus ne voient que la version
+    users_changed([instance.user_id])
@@ -1,3 +1,106 @@
+from django.core.cache import cache
 from django.test import TestCase
+from django.urls import reverse
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
 
-# Create your tests here.
+from . import authentication
+from .permissions import VIEW_USERS, MANAGE_USERS
+from .models import User, Role, UserRole, Permission, RolePermission
+
+
+class CachedTokenAuthenticationTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        authentication._local.clear()
+        self.user = User.objects.create_user(
+            email='tests@rohstore.com', password='motdepasse', first_name='Test', last_name='Test'
+        )
+        self.role = Role.objects.create(name='vendeur')
+        UserRole.objects.create(user=self.user, role=self.role)
+        self.token = Token.objects.create(user=self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+        self.url = reverse('user_profile')
+
+    def test_warm_cache_needs_no_query(self):
+        self.assertEqual(self.client.get(self.url).data['roles'], ['vendeur'])
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url)
+        self.assertEqual(response.data['email'], 'tests@rohstore.com')
+
+    def test_logout_invalidates_token(self):
+        self.client.get(self.url)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(self.client.post(reverse('logout')).status_code, 200)
+        self.assertEqual(self.client.get(self.url).status_code, 401)
+
+    def test_deleted_token_is_rejected_by_other_processes(self):
+        self.client.get(self.url)
+        key = self.token.key
+        # Entrée du LRU local, telle qu'un autre processus la garde encore
+        entry = authentication._local.get(key)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.token.delete()
+        authentication._local.set(key, *entry)
+        self.assertEqual(self.client.get(self.url).status_code, 401)
+
+    def test_role_change_is_visible_immediately(self):
+        self.client.get(self.url)
+        with self.captureOnCommitCallbacks(execute=True):
+            UserRole.objects.create(user=self.user, role=Role.objects.create(name='admin'))
+        self.assertEqual(self.client.get(self.url).data['roles'], ['admin', 'vendeur'])
+
+    def test_permission_codes_follow_role_permissions(self):
+        self.client.get(self.url)
+        with self.captureOnCommitCallbacks(execute=True):
+            RolePermission.objects.create(role=self.role, permission=Permission.objects.create(code='produits.view'))
+        user, _ = authentication.CachedTokenAuthentication().authenticate_credentials(self.token.key)
+        self.assertEqual(user.permission_codes, frozenset({'produits.view'}))
+
+    def test_deactivated_user_is_rejected(self):
+        self.client.get(self.url)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.is_active = False
+            self.user.save()
+        self.assertEqual(self.client.get(self.url).status_code, 401)
+
+
+class RolePermissionTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        authentication._local.clear()
+        self.user = User.objects.create_user(
+            email='support@rohstore.com', password='motdepasse', first_name='Test', last_name='Test'
+        )
+        self.role = Role.objects.create(name='Support')
+        UserRole.objects.create(user=self.user, role=self.role)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {Token.objects.create(user=self.user).key}')
+
+    def grant(self, code):
+        with self.captureOnCommitCallbacks(execute=True):
+            RolePermission.objects.create(role=self.role, permission=Permission.objects.create(code=code))
+
+    def test_codes_required_per_action(self):
+        url = reverse('user-list')
+        self.assertEqual(self.client.get(url).status_code, 403)
+        self.grant(VIEW_USERS)
+        self.assertEqual(self.client.get(url).status_code, 200)
+        detail = reverse('user-detail', args=[self.user.pk])
+        self.assertEqual(self.client.patch(detail, {'first_name': 'Awa'}, format='json').status_code, 403)
+        self.grant(MANAGE_USERS)
+        self.assertEqual(self.client.patch(detail, {'first_name': 'Awa'}, format='json').status_code, 200)
+
+    def test_own_profile_needs_no_code(self):
+        self.assertEqual(self.client.get(reverse('user-me')).status_code, 200)
+
+    def test_check_needs_no_query_once_cached(self):
+        self.grant(VIEW_USERS)
+        url = reverse('role-list')
+        self.assertEqual(self.client.get(url).status_code, 403)
+        # Le refus est décidé sans aucune requête
+        with self.assertNumQueries(0):
+            self.client.get(url)
@@ -12,6 +12,11 @@ from rest_framework import status
 from rest_framework.authtoken.models import Token
 from .serializers import LoginSerializer
 from rest_framework.permissions import AllowAny
+from storer.routers import pin_authorization
+from .authentication import get_roles, invalidate_users
+from .permissions import (
+    HasRolePermission, read_write, VIEW_USERS, MANAGE_USERS, VIEW_ROLES, MANAGE_ROLES
+)
 class LoginAPIView(APIView):
     permission_classes = [AllowAny]
     def post(self, request):
@@ -21,9 +26,11 @@ class LoginAPIView(APIView):
 
         # Création ou récupération du token
         token, created = Token.objects.get_or_create(user=user)
+        # Les requêtes suivantes, authentifiées par ce jeton, lisent la principale
+        pin_authorization(f'Token {token.key}')
 
-        # Renvoyer token et infos utilisateur (ex: rôles)
-        roles = user.user_roles.values_list('role__name', flat=True)
+        # Renvoyer token et infos utilisateur (ex: rôles, lus dans le cache d'identité)
+        roles = get_roles(user)
         return Response({
             'token': token.key,
             'user': {
@@ -43,7 +50,7 @@ from rest_framework.decorators import api_view, permission_classes
 @permission_classes([IsAuthenticated])
 def user_profile(request):
     user = request.user
-    roles = user.user_roles.values_list('role__name', flat=True)
+    roles = get_roles(user)
     data = {
         'email': user.email,
         'first_name': user.first_name,
@@ -57,15 +64,20 @@ class LogoutAPIView(APIView):
     def post(self, request):
         # Supprime le token pour déconnecter l’utilisateur
         Token.objects.filter(user=request.user).delete()
+        # Les autres processus ne doivent plus servir ce jeton depuis leur cache
+        invalidate_users([request.user.pk])
         return Response({"detail": "Déconnexion réussie"}, status=status.HTTP_200_OK)
 from django.db.models import Prefetch
 from rest_framework.decorators import action
-class UserViewSet(viewsets.ModelViewSet):
+from storer.metrics import InstrumentedViewMixin
+class UserViewSet(InstrumentedViewMixin, viewsets.ModelViewSet):
     queryset = User.objects.all().prefetch_related(
         Prefetch('user_roles', queryset=UserRole.objects.select_related('role'))
     )
     serializer_class = UserSerializer
-    permission_classes = [permissions.IsAuthenticated]
+    permission_classes = [permissions.IsAuthenticated, HasRolePermission]
+    required_permissions = read_write(VIEW_USERS, MANAGE_USERS)
+    keyset_ordering = ('date_joined', 'id')
     
     @action(detail=True, methods=['get'], url_path='roles')
     def roles(self, request, pk=None):
@@ -90,10 +102,13 @@ class UserViewSet(viewsets.ModelViewSet):
 class RoleViewSet(viewsets.ModelViewSet):
     queryset = Role.objects.all()
     serializer_class = RoleSerializer
-    permission_classes = [permissions.IsAuthenticated]
+    permission_classes = [permissions.IsAuthenticated, HasRolePermission]
+    required_permissions = read_write(VIEW_ROLES, MANAGE_ROLES)
 
 class UserRolesViewSet(viewsets.ReadOnlyModelViewSet):
     serializer_class = RoleSerializer
+    permission_classes = [permissions.IsAuthenticated, HasRolePermission]
+    required_permissions = VIEW_USERS
 
     def get_queryset(self):
         user_id = self.kwargs['id']
@@ -105,9 +120,11 @@ class UserRolesViewSet(viewsets.ReadOnlyModelViewSet):
 class PermissionViewSet(viewsets.ModelViewSet):
     queryset = Permission.objects.all()
     serializer_class = PermissionSerializer
-    permission_classes = [permissions.IsAuthenticated]
+    permission_classes = [permissions.IsAuthenticated, HasRolePermission]
+    required_permissions = read_write(VIEW_ROLES, MANAGE_ROLES)
 
 class RolePermissionViewSet(viewsets.ModelViewSet):
     queryset = RolePermission.objects.all()
     serializer_class = RolePermissionSerializer
-    permission_classes = [permissions.IsAuthenticated]
+    permission_classes = [permissions.IsAuthenticated, HasRolePermission]
+    required_permissions = read_write(VIEW_ROLES, MANAGE_ROLES)